@@ -0,0 +1,88 @@
+"""Benchmark the time taken to import the package and create a loader.
+
+Notes
+-----
+Each statement is timed in a fresh interpreter, as many times as asked, and
+the median is reported net of the interpreter startup, so that a module
+imported eagerly again by mistake shows up as a regression:
+
+```bash
+python benchmarks/import_time.py --repeat 20
+python benchmarks/import_time.py --top 15
+```
+
+With `--top`, the modules taking the most time to import the loader are
+listed from the output of `python -X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    ("interpreter", "pass"),
+    ("package", "import saleor_gql_loader"),
+    ("loader class", "from saleor_gql_loader import ETLDataLoader"),
+    ("loader", "from saleor_gql_loader import ETLDataLoader; ETLDataLoader('token')"),
+]
+
+
+def time_statement(statement, repeat):
+    """run `statement` in `repeat` fresh interpreters, return the seconds taken."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], env=env, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def get_top_modules(statement, top):
+    """get the `top` modules taking the most cumulated microseconds to import."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            env=env, check=True, stderr=subprocess.PIPE,
+                            universal_newlines=True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="interpreters started per statement, default to %(default)s.")
+    parser.add_argument("--top", type=int, default=0,
+                        help="number of modules to list by import time.")
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    print("{:<14} {:>10} {:>10}".format("statement", "median ms", "net ms"))
+    baseline = None
+    for name, statement in STATEMENTS:
+        median = statistics.median(time_statement(statement, args.repeat))
+        if baseline is None:
+            baseline = median
+        print("{:<14} {:>10.1f} {:>10.1f}".format(
+            name, median * 1000, (median - baseline) * 1000))
+
+    if args.top:
+        print()
+        print("{:>10}  {}".format("cumul. ms", "module"))
+        for cumulative, module in get_top_modules(STATEMENTS[-1][1], args.top):
+            print("{:>10.1f}  {}".format(cumulative / 1000, module))
+
+
+if __name__ == "__main__":
+    main()
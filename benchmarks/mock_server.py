@@ -0,0 +1,253 @@
+"""A local stand-in for the Saleor graphQL endpoint used by the benchmarks.
+
+Notes
+-----
+The server answers any document sent by the loaders without a database: each
+top level field (aliased or not) gets a payload generated from its selection
+set, with new ids, empty errors and as many `productVariants` as the
+variants sent. The images uploaded as multipart requests are read and
+discarded.
+
+To mimic a loaded Saleor it can wait a given latency before answering, growing
+linearly once more than `capacity` requests are in flight, and answer a share
+of the requests with 503 Service Unavailable:
+
+```bash
+python benchmarks/mock_server.py --port 8000 --latency 0.02 --capacity 8
+```
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PATTERN = re.compile(r'\.\.\.|\$?[_A-Za-z][_0-9A-Za-z]*|"[^"]*"|[{}():!\[\]=,]|-?\d[\d.]*')
+
+
+def tokenize(query):
+    """Split a graphQL document in tokens."""
+    return TOKEN_PATTERN.findall(query)
+
+
+def parse_selection(tokens, position):
+    """Parse the selection set starting after the `{` at `position`.
+
+    Returns
+    -------
+    fields : list
+        a (response key, field name, variables used, sub selection) tuple for
+        each field, the sub selection being None for the leaves.
+    position : int
+        the position after the closing `}`.
+    """
+    fields = []
+    while tokens[position] != "}":
+        name = tokens[position]
+        position += 1
+        key = name
+        if tokens[position] == ":":
+            name = tokens[position + 1]
+            position += 2
+
+        variables = []
+        if tokens[position] == "(":
+            depth = 0
+            while True:
+                token = tokens[position]
+                depth += {"(": 1, ")": -1}.get(token, 0)
+                if token.startswith("$"):
+                    variables.append(token[1:])
+                position += 1
+                if depth == 0:
+                    break
+
+        selection = None
+        if tokens[position] == "{":
+            selection, position = parse_selection(tokens, position + 1)
+        fields.append((key, name, variables, selection))
+    return fields, position + 1
+
+
+def parse_document(query):
+    """Get the top level fields of the operation of a graphQL document."""
+    tokens = tokenize(query)
+    return parse_selection(tokens, tokens.index("{") + 1)[0]
+
+
+class MockSaleor:
+    """generator of the responses of the mock endpoint.
+
+    Attributes
+    ----------
+    latency : float
+        seconds waited before answering a request.
+    capacity : int
+        number of requests in flight beyond which the latency grows linearly,
+        0 for no limit.
+    error_rate : float
+        share of the requests answered with 503, between 0 and 1.
+    requests : int
+        number of requests received.
+    """
+
+    def __init__(self, latency=0.0, capacity=0, error_rate=0.0):
+        self.latency = latency
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.requests = 0
+        self.in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._persisted_queries = {}
+
+    def handle(self, document):
+        """answer a graphQL request, return its status code and body."""
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            in_flight = self.in_flight
+        try:
+            if self.latency:
+                overload = in_flight / self.capacity if self.capacity else 1.0
+                time.sleep(self.latency * max(1.0, overload))
+            if self.error_rate and random.random() < self.error_rate:
+                return 503, {"errors": [{"message": "Service Unavailable"}]}
+            return 200, self.execute(document)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def execute(self, document):
+        """generate the response of a graphQL document."""
+        query = document.get("query")
+        persisted = (document.get("extensions") or {}).get("persistedQuery")
+        if persisted is not None:
+            if query is None:
+                query = self._persisted_queries.get(persisted["sha256Hash"])
+                if query is None:
+                    return {"errors": [{"message": "PersistedQueryNotFound"}]}
+            else:
+                self._persisted_queries[persisted["sha256Hash"]] = query
+
+        variables = document.get("variables") or {}
+        data = {}
+        for key, name, used, selection in parse_document(query):
+            arguments = {variable: variables.get(variable) for variable in used}
+            data[key] = self.resolve(name, selection, arguments)
+        return {"data": data}
+
+    def resolve(self, name, selection, arguments):
+        """generate the value of a field from its selection set."""
+        if name == "id":
+            return str(next(self._ids))
+        elif name == "count":
+            return sum(len(value) for value in arguments.values() if isinstance(value, list))
+        elif name == "hasNextPage":
+            return False
+        elif selection is None:
+            return None
+        elif name == "errors" or name.endswith("Errors") or name == "edges":
+            return []
+        elif name in ("privateMetadata", "metadata"):
+            return [{"key": "key", "value": "value"}]
+        elif name == "productVariants":
+            count = sum(len(value) for value in arguments.values() if isinstance(value, list))
+            return [self.resolve_object(selection, arguments) for _ in range(count)]
+        return self.resolve_object(selection, arguments)
+
+    def resolve_object(self, selection, arguments):
+        return {key: self.resolve(name, sub_selection, arguments)
+                for key, name, _, sub_selection in selection}
+
+
+class MockSaleorHandler(BaseHTTPRequestHandler):
+    """HTTP handler of the mock endpoint."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        content_type = self.headers["Content-Type"]
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser().parsebytes(
+                b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+            document = next(
+                json.loads(part.get_payload(decode=True))
+                for part in message.get_payload()
+                if part.get_param("name", header="content-disposition") == "operations")
+        else:
+            document = json.loads(body)
+
+        status_code, response = self.server.saleor.handle(document)
+        content = json.dumps(response).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        if status_code == 503:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class MockSaleorServer(ThreadingHTTPServer):
+    """threaded HTTP server of the mock endpoint.
+
+    Notes
+    -----
+    ```python
+    with MockSaleorServer(latency=0.02) as server:
+        server.start()
+        etl_data_loader = ETLDataLoader("token", server.url)
+    ```
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host="127.0.0.1", port=0, **kwargs):
+        super().__init__((host, port), MockSaleorHandler)
+        self.saleor = MockSaleor(**kwargs)
+
+    @property
+    def url(self):
+        """str: the url of the graphQL endpoint."""
+        return "http://{}:{}/graphql/".format(*self.server_address[:2])
+
+    def start(self):
+        """serve the requests in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock Saleor graphQL endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds waited before answering, default to %(default)s.")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="requests in flight beyond which the latency grows.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of the requests answered with 503.")
+    args = parser.parse_args(argv)
+
+    server = MockSaleorServer(args.host, args.port, latency=args.latency,
+                              capacity=args.capacity, error_rate=args.error_rate)
+    print("serving on {}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
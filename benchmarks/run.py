@@ -0,0 +1,224 @@
+"""Benchmark the loading paths against a local mock Saleor endpoint.
+
+Notes
+-----
+Measures the products, variants and images loaded per second by the
+sequential, threaded, async and batched paths of the loaders, against a
+`mock_server.MockSaleorServer` started in the same process, so that a
+regression or a tuning claim can be checked without a Saleor instance:
+
+```bash
+python benchmarks/run.py --count 1000 --latency 0.02 --capacity 16
+python benchmarks/run.py --only products --error-rate 0.05 --json results.json
+```
+
+The async paths are skipped when aiohttp is not installed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from saleor_gql_loader import ETLDataLoader, AsyncETLDataLoader  # noqa: E402
+from saleor_gql_loader.images import ImageUploader  # noqa: E402
+from saleor_gql_loader.retry import RetryPolicy  # noqa: E402
+
+from mock_server import MockSaleorServer  # noqa: E402
+
+try:
+    import aiohttp  # noqa: F401
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+def products_sequential(loader, count, args):
+    for i in range(count):
+        loader.create_product("product-type", name="product {}".format(i))
+    return 0
+
+
+def products_threaded(loader, count, args):
+    result = loader.create_products_bulk(
+        ({"product_type_id": "product-type", "name": "product {}".format(i)}
+         for i in range(count)), args.workers)
+    return len(result.errors)
+
+
+def products_batched(loader, count, args):
+    with loader.batch(args.batch_size) as batch:
+        results = [batch.create_product("product-type", name="product {}".format(i))
+                   for i in range(count)]
+    return sum(result.error() is not None for result in results)
+
+
+async def products_async(loader, count, args):
+    results = await asyncio.gather(*[
+        loader.create_product("product-type", name="product {}".format(i))
+        for i in range(count)], return_exceptions=True)
+    return sum(isinstance(result, Exception) for result in results)
+
+
+def variants_sequential(loader, count, args):
+    for i in range(count):
+        loader.create_product_variant("product", sku="sku-{}".format(i))
+    return 0
+
+
+def variants_threaded(loader, count, args):
+    result = loader.create_variants_bulk(
+        ({"product_id": "product", "sku": "sku-{}".format(i)} for i in range(count)),
+        args.workers)
+    return len(result.errors)
+
+
+def variants_native_bulk(loader, count, args):
+    result = loader.bulk_create_product_variants(
+        "product", [{"sku": "sku-{}".format(i)} for i in range(count)])
+    return len(result.errors)
+
+
+def variants_batched(loader, count, args):
+    with loader.batch(args.batch_size) as batch:
+        results = [batch.create_product_variant("product", sku="sku-{}".format(i))
+                   for i in range(count)]
+    return sum(result.error() is not None for result in results)
+
+
+async def variants_async(loader, count, args):
+    results = await asyncio.gather(*[
+        loader.create_product_variant("product", sku="sku-{}".format(i))
+        for i in range(count)], return_exceptions=True)
+    return sum(isinstance(result, Exception) for result in results)
+
+
+def images_sequential(loader, count, args):
+    for i in range(count):
+        loader.create_product_image("product", args.images[i % len(args.images)])
+    return 0
+
+
+def images_threaded(loader, count, args):
+    uploader = ImageUploader(loader, args.workers)
+    result = uploader.upload_many(
+        {"product_id": "product", "file_path": args.images[i % len(args.images)]}
+        for i in range(count))
+    return len(result.errors)
+
+
+async def images_async(loader, count, args):
+    results = await asyncio.gather(*[
+        loader.create_product_image("product", args.images[i % len(args.images)])
+        for i in range(count)], return_exceptions=True)
+    return sum(isinstance(result, Exception) for result in results)
+
+
+BENCHMARKS = {
+    "products": [
+        ("sequential", products_sequential),
+        ("threaded", products_threaded),
+        ("batched", products_batched),
+        ("async", products_async),
+    ],
+    "variants": [
+        ("sequential", variants_sequential),
+        ("threaded", variants_threaded),
+        ("native bulk", variants_native_bulk),
+        ("batched", variants_batched),
+        ("async", variants_async),
+    ],
+    "images": [
+        ("sequential", images_sequential),
+        ("threaded", images_threaded),
+        ("async", images_async),
+    ],
+}
+
+
+def run_benchmark(func, server, count, args):
+    """run a benchmark function, return its duration and number of errors."""
+    retry = RetryPolicy(backoff=0.01) if args.error_rate else None
+    start = time.perf_counter()
+    if asyncio.iscoroutinefunction(func):
+        async def run():
+            async with AsyncETLDataLoader("token", server.url, args.workers,
+                                          retry=retry) as loader:
+                return await func(loader, count, args)
+
+        errors = asyncio.run(run())
+    else:
+        with ETLDataLoader("token", server.url, pool_size=args.workers,
+                           retry=retry) as loader:
+            errors = func(loader, count, args)
+    return time.perf_counter() - start, errors
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--count", type=int, default=500,
+                        help="number of entities loaded per benchmark, default to %(default)s.")
+    parser.add_argument("--sequential-count", type=int, default=100,
+                        help="number of entities loaded by the sequential paths.")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append",
+                        help="entities to benchmark, all by default.")
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="seconds waited by the server per request, default to %(default)s.")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="requests in flight beyond which the server latency grows.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of the requests answered with 503 (then retried).")
+    parser.add_argument("--workers", type=int, default=16,
+                        help="threads or requests in flight of the parallel paths.")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="mutations per request of the batched paths.")
+    parser.add_argument("--image-size", type=int, default=200000,
+                        help="size in bytes of the images uploaded.")
+    parser.add_argument("--json", help="path of a JSON file receiving the results.")
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    server = MockSaleorServer(latency=args.latency, capacity=args.capacity,
+                              error_rate=args.error_rate).start()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        args.images = []
+        for i in range(4):
+            path = os.path.join(directory, "image-{}.jpg".format(i))
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.image_size))
+            args.images.append(path)
+
+        print("{:<10} {:<12} {:>7} {:>9} {:>10} {:>9} {:>7}".format(
+            "entity", "path", "count", "seconds", "per second", "requests", "errors"))
+        for entity in args.only or BENCHMARKS:
+            for path, func in BENCHMARKS[entity]:
+                if asyncio.iscoroutinefunction(func) and aiohttp is None:
+                    continue
+                count = args.sequential_count if path == "sequential" else args.count
+                requests = server.saleor.requests
+                seconds, errors = run_benchmark(func, server, count, args)
+                result = {
+                    "entity": entity, "path": path, "count": count,
+                    "seconds": seconds, "per_second": count / seconds,
+                    "requests": server.saleor.requests - requests, "errors": errors,
+                }
+                results.append(result)
+                print("{entity:<10} {path:<12} {count:>7} {seconds:>9.2f} "
+                      "{per_second:>10.1f} {requests:>9} {errors:>7}".format(**result))
+
+    server.shutdown()
+    server.server_close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,29 @@
-from .data_loader import ETLDataLoader
+"""Load data into Saleor through its graphQL API.
+
+Notes
+-----
+The public classes are imported on first access so that importing the package
+doesn't load the HTTP stack (requests, aiohttp) before it is needed, which
+matters for short lived processes.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "ETLDataLoader": ".data_loader",
+    "AsyncETLDataLoader": ".async_data_loader",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
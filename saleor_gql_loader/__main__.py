@@ -0,0 +1,262 @@
+"""Command line interface streaming a CSV/JSONL file into Saleor.
+
+Usage
+-----
+```bash
+python -m saleor_gql_loader catalog.jsonl --token LcLNVgUt8mu8yKJ0Wrh3nADnTT21uv \
+                                          --output results.jsonl
+```
+
+See `saleor_gql_loader.pipeline` for the format of the rows.
+"""
+import argparse
+import os
+import sys
+from functools import partial
+
+from .data_loader import ETLDataLoader
+from .images import ImageIndex
+from .journal import Journal
+from .metrics import Metrics
+from .concurrency import ConcurrencyLimiter
+from .resolver import IdResolver
+from .retry import RetryPolicy, RateLimiter
+from .pipeline import read_rows, run_pipeline
+from .preprocessing import ImagePreprocessor
+from .scheduler import run_graph
+from .sharding import run_shards
+from .sync import FingerprintIndex, run_sync
+from .utils import GQL_DEFAULT_ENDPOINT
+
+
+def get_parser():
+    """Get the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m saleor_gql_loader",
+        description="Load the entities described in a CSV/JSONL file into Saleor.")
+    parser.add_argument(
+        "input", help="path of the CSV (.csv) or JSON lines file to load.")
+    parser.add_argument(
+        "--token", default=os.environ.get("SALEOR_AUTH_TOKEN"),
+        help="token of the Saleor app, default to $SALEOR_AUTH_TOKEN.")
+    parser.add_argument(
+        "--endpoint", default=GQL_DEFAULT_ENDPOINT,
+        help="the graphQL endpoint url, default to %(default)s.")
+    parser.add_argument(
+        "--output", help="path of the JSON lines file receiving the result of each row.")
+    parser.add_argument(
+        "--timeout", type=float, help="seconds to wait for the server on each query.")
+    parser.add_argument(
+        "--retries", type=int, default=5,
+        help="number of times a query is sent when the endpoint is overloaded "
+             "(429, 502, 503, 504), default to %(default)s.")
+    parser.add_argument(
+        "--rate", type=float,
+        help="number of queries per second sent at first, then adapted to the "
+             "endpoint (no limit by default).")
+    parser.add_argument(
+        "--journal",
+        help="path of the journal recording the rows created, rerunning with the "
+             "same journal skips them.")
+    parser.add_argument(
+        "--image-index",
+        help="path of the index of the images uploaded by content hash, rerunning "
+             "with the same index skips the images already uploaded.")
+    parser.add_argument(
+        "--max-image-size", type=int,
+        help="resize the images to fit in this number of pixels and recompress "
+             "them before uploading them (requires Pillow).")
+    parser.add_argument(
+        "--image-quality", type=int, default=85,
+        help="quality of the recompressed JPEG/WebP images, default to %(default)s.")
+    parser.add_argument(
+        "--upsert", action="store_true",
+        help="reuse the existing categories, attributes and product types (by slug "
+             "or name) and products (by SKU) instead of creating them again.")
+    parser.add_argument(
+        "--workers", type=int,
+        help="load the rows concurrently with this number of workers, following "
+             "their references (the whole file is then kept in memory).")
+    parser.add_argument(
+        "--metrics",
+        help="path of the file receiving the metrics of the requests, as JSON "
+             "(.json) or in the Prometheus text format.")
+    parser.add_argument(
+        "--adaptive", action="store_true",
+        help="adapt the number of queries in flight to the latency of the "
+             "endpoint, up to --workers.")
+    parser.add_argument(
+        "--sync",
+        help="path of the index of the fingerprints of the rows loaded: only the "
+             "rows changed since the previous sync are sent, as creations or "
+             "updates, and the entities removed from the input are deleted "
+             "(rows are then loaded one by one).")
+    parser.add_argument(
+        "--no-delete", action="store_true",
+        help="with --sync, keep the entities removed from the input.")
+    parser.add_argument(
+        "--processes", type=int,
+        help="split the rows in shards loaded by this number of processes, each "
+             "with its own connections, --workers and --rate applying to each.")
+    parser.add_argument(
+        "--shard-count", type=int, default=1,
+        help="number of machines sharing the load, each run with its own "
+             "--shard-index and a copy of the --journal in which shard 0 "
+             "recorded the shared rows, default to %(default)s.")
+    parser.add_argument(
+        "--shard-index", type=int, default=0,
+        help="index of this machine among --shard-count, default to %(default)s.")
+    parser.add_argument(
+        "--shared-only", action="store_true",
+        help="only load the rows shared by the shards (categories, product "
+             "types...) in the --journal, to copy it to every machine.")
+    return parser
+
+
+def create_loader(args):
+    """Create the loader configured by the command line arguments `args`.
+
+    Returns
+    -------
+    loader : ETLDataLoader or IdResolver
+        the loader, measuring its requests in a new `Metrics`.
+    """
+    image_index = ImageIndex(Journal(args.image_index)) if args.image_index else None
+    rate_limiter = RateLimiter(args.rate) if args.rate else None
+    concurrency_limiter = None
+    if args.adaptive and args.workers:
+        concurrency_limiter = ConcurrencyLimiter(
+            min(4, args.workers), max_limit=args.workers)
+    preprocessor = None
+    if args.max_image_size:
+        preprocessor = ImagePreprocessor(args.max_image_size, args.image_quality)
+
+    loader = ETLDataLoader(args.token, args.endpoint,
+                           pool_size=max(args.workers or 0, 10),
+                           timeout=args.timeout, image_index=image_index,
+                           image_preprocessor=preprocessor,
+                           retry=RetryPolicy(args.retries),
+                           rate_limiter=rate_limiter,
+                           concurrency_limiter=concurrency_limiter,
+                           metrics=Metrics())
+    if args.upsert:
+        try:
+            loader = IdResolver(loader).warm()
+        except Exception:
+            close_loader(loader)
+            raise
+    return loader
+
+
+def close_loader(loader):
+    """Close the loader created by `create_loader` and its image index and
+    preprocessor."""
+    loader.close()
+    if loader.image_index is not None:
+        loader.image_index.journal.close()
+    if loader.image_preprocessor is not None:
+        loader.image_preprocessor.close()
+
+
+def main(argv=None):
+    """Run the command line interface, return the exit code."""
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.shard_count > 1 and not args.journal:
+        parser.error("--shard-count above 1 requires a --journal sharing the ids "
+                     "of the shared rows between machines")
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    if args.shared_only and (args.shard_index != 0 or not args.journal):
+        parser.error("--shared-only requires a --journal and --shard-index 0")
+    if args.sync and (args.processes or args.shard_count > 1 or args.shared_only):
+        parser.error("--sync loads the rows one by one, it can't be combined with "
+                     "--processes, --shard-count or --shared-only")
+    if args.adaptive and not args.workers:
+        parser.error("--adaptive requires --workers, the maximum number of queries "
+                     "in flight")
+    if not args.token:
+        print("error: a token must be provided with --token or $SALEOR_AUTH_TOKEN",
+              file=sys.stderr)
+        return 2
+
+    if args.sync:
+        return run_synced(args)
+    if args.processes or args.shard_count > 1 or args.shared_only:
+        return run_sharded(args)
+
+    loader = create_loader(args)
+    image_index = loader.image_index
+    metrics = loader.metrics
+    output = journal = None
+    try:
+        output = open(args.output, "w", encoding="utf-8") if args.output else None
+        journal = Journal(args.journal) if args.journal else None
+        if args.workers:
+            stats = run_graph(loader, read_rows(args.input), args.workers,
+                              output, journal=journal)
+        else:
+            stats = run_pipeline(loader, read_rows(args.input), output,
+                                 journal=journal)
+    finally:
+        close_loader(loader)
+        if output is not None:
+            output.close()
+        if journal is not None:
+            journal.close()
+
+    print("created: {created}, failed: {failed}, skipped: {skipped}".format(**stats))
+    if image_index is not None:
+        print("images skipped: {skipped}, bytes saved: {bytes_saved}".format(
+            **image_index.stats))
+    print(metrics.summary())
+    if args.metrics:
+        metrics.export(args.metrics)
+    return 0 if stats["failed"] == 0 else 1
+
+
+def run_synced(args):
+    """Synchronize Saleor with the input, see `sync.run_sync`."""
+    loader = create_loader(args)
+    output = None
+    try:
+        output = open(args.output, "w", encoding="utf-8") if args.output else None
+        with FingerprintIndex(args.sync) as index:
+            stats = run_sync(loader, read_rows(args.input), index, output,
+                             delete=not args.no_delete)
+    finally:
+        close_loader(loader)
+        if output is not None:
+            output.close()
+
+    print("created: {created}, updated: {updated}, unchanged: {unchanged}, "
+          "deleted: {deleted}, failed: {failed}".format(**stats))
+    print(loader.metrics.summary())
+    if args.metrics:
+        loader.metrics.export(args.metrics)
+    return 0 if stats["failed"] == 0 else 1
+
+
+def run_sharded(args):
+    """Load the input with several processes, see `sharding.run_shards`."""
+    metrics = Metrics()
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        stats = run_shards(partial(create_loader, args), args.input,
+                           args.processes, args.shard_index, args.shard_count,
+                           output, journal_path=args.journal,
+                           workers=args.workers, metrics=metrics,
+                           close_loader=close_loader, shared_only=args.shared_only)
+    finally:
+        if output is not None:
+            output.close()
+
+    print("created: {created}, failed: {failed}, skipped: {skipped}".format(**stats))
+    print(metrics.summary())
+    if args.metrics:
+        metrics.export(args.metrics)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
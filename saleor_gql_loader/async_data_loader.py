@@ -0,0 +1,434 @@
+"""Implements an asynchronous data loader that load data into Saleor through graphQL.
+
+Notes
+-----
+The loader sends the same mutations as `ETLDataLoader` but its methods are
+coroutines, many of them can be awaited concurrently from a single process
+(e.g. with `asyncio.gather`) while a semaphore bounds the number of queries in
+flight to the endpoint. The same `RateLimiter` and `ConcurrencyLimiter` as the
+`ETLDataLoader` adapt the rate and the number of queries in flight below it.
+
+It requires `aiohttp` which can be installed with the `async` extra:
+
+```bash
+pip install saleor-gql-loader[async]
+```
+"""
+import asyncio
+import os
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from . import operations
+from .retry import RETRY_STATUSES, get_retry_after
+from .serialization import get_default_serializer
+from .utils import handle_response, get_mime_type
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncETLDataLoader:
+    """asynchronous abstraction around several graphQL query to load data into Saleor.
+
+    Notes
+    -----
+    Same as `ETLDataLoader` this class requires a valid `auth_token` to be
+    provided during initialization. It must be used as an asynchronous context
+    manager so that its connections are closed when done:
+
+    ```python
+    async with AsyncETLDataLoader(auth_token, max_in_flight=100) as etl_data_loader:
+        product_ids = await asyncio.gather(*[
+            etl_data_loader.create_product(product_type_id, name=name)
+            for name in names
+        ])
+    ```
+
+    Attributes
+    ----------
+    headers : dict
+        the headers used to make graphQL queries.
+    endpoint_url : str
+        the graphQL endpoint url to query to.
+    max_in_flight : int
+        maximum number of queries sent concurrently to the endpoint.
+    timeout : float
+        seconds to wait for the server on each query, None waits forever.
+    minimal_selection : bool
+        whether the update methods only select the minimum of their payload.
+    retry : retry.RetryPolicy
+        policy retrying the queries rejected by an overloaded endpoint.
+    rate_limiter : retry.RateLimiter
+        limiter adapting the rate of the queries to the endpoint.
+    concurrency_limiter : concurrency.ConcurrencyLimiter
+        limiter adapting the number of queries in flight to the endpoint.
+    metrics : metrics.Metrics
+        recorder of the latency, bytes, retries and errors of the requests.
+    serializer : serialization.JSONSerializer
+        serializer encoding the requests and decoding the responses.
+    """
+
+    def __init__(self, auth_token, endpoint_url="http://localhost:8000/graphql/",
+                 max_in_flight=50, timeout=None, minimal_selection=False,
+                 retry=None, rate_limiter=None, concurrency_limiter=None,
+                 metrics=None, serializer=None):
+        """initialize the `AsyncETLDataLoader` with an auth_token and an url endpoint.
+
+        Parameters
+        ----------
+        auth_token : str
+            token used to identify called to the graphQL endpoint.
+        endpoint_url : str, optional
+            the graphQL endpoint to be used , by default "http://localhost:8000/graphql/"
+        max_in_flight : int, optional
+            maximum number of queries sent concurrently, by default 50.
+        timeout : float, optional
+            seconds to wait for the server on each query, by default None
+            (image uploads then wait up to 90 seconds).
+        minimal_selection : bool, optional
+            only select the minimum of the update payloads to shrink the
+            responses, by default False.
+        retry : retry.RetryPolicy, optional
+            retry the queries answered with 429, 502, 503 or 504, by default
+            None (no retry). The query does not hold its `max_in_flight` slot
+            while waiting to be retried.
+        rate_limiter : retry.RateLimiter, optional
+            space the queries out at a rate adapted to the endpoint, by
+            default None (no limit). It can be shared with other loaders.
+        concurrency_limiter : concurrency.ConcurrencyLimiter, optional
+            adapt the number of queries in flight to the latency of the
+            endpoint, up to `max_in_flight`, by default None (always
+            `max_in_flight`).
+        metrics : metrics.Metrics, optional
+            record the latency, bytes, retries and errors of the requests by
+            operation, by default None (nothing is measured).
+        serializer : serialization.JSONSerializer, optional
+            serializer encoding the requests and decoding the responses, by
+            default the fastest available (orjson when installed).
+
+        Raises
+        ------
+        ImportError
+            when aiohttp is not installed.
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncETLDataLoader requires aiohttp, install it with "
+                "`pip install saleor-gql-loader[async]`.")
+
+        self.headers = {"Authorization": "Bearer {}".format(auth_token)}
+        self._json_headers = dict(self.headers, **{"Content-Type": "application/json"})
+        self.endpoint_url = endpoint_url
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.minimal_selection = minimal_selection
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.metrics = metrics
+        self.serializer = get_default_serializer() if serializer is None else serializer
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """close the connections kept alive by the loader."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """get the session of the loader, created inside the running loop."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_in_flight))
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def _execute(self, operation):
+        """send an `operation` to the graphQL endpoint and return its result.
+
+        Parameters
+        ----------
+        operation : operations.Operation
+            the mutation to send.
+
+        Returns
+        -------
+        result : object
+            the result of the mutation.
+
+        Raises
+        ------
+        Exception
+            when the response status is not 200, the response is not JSON or
+            the errors of the mutation is not an empty list.
+        """
+        try:
+            return operation.parse(await self._send(operation))
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record_error(operation.field)
+            raise
+
+    async def _send(self, operation):
+        """send an `operation`, retrying it if needed, and return the parsed response."""
+        session = self._get_session()
+        payload = self.serializer.dumps({
+            "query": operation.get_query(self.minimal_selection),
+            "variables": operation.variables,
+        })
+
+        request_bytes = len(payload) + sum(
+            os.path.getsize(path) for path in operation.files.values())
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            if self.concurrency_limiter is not None:
+                await self.concurrency_limiter.acquire_async()
+            start = time.monotonic()
+            try:
+                async with self._semaphore:
+                    start = time.monotonic()
+                    status_code, content, headers = await self._post(
+                        session, operation, payload)
+            except Exception:
+                self._record_request(operation, time.monotonic() - start, None,
+                                     request_bytes, 0, attempt)
+                raise
+            except BaseException:
+                # a cancelled query gives its slot back without being measured.
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.record(time.monotonic() - start)
+                raise
+            self._record_request(operation, time.monotonic() - start, status_code,
+                                 request_bytes, len(content), attempt)
+            if self.retry is None or not self.retry.should_retry(status_code, attempt):
+                break
+            await asyncio.sleep(self.retry.get_delay(attempt, get_retry_after(headers)))
+
+        try:
+            parsed_response = self.serializer.loads(content)
+        except ValueError:
+            raise Exception("{}: {}".format(
+                status_code, content[:200].decode("utf-8", "replace").strip()))
+        return handle_response(status_code, parsed_response)
+
+    def _record_request(self, operation, latency, status_code, request_bytes,
+                        response_bytes, attempt):
+        """inform the limiters and the metrics of the outcome of a try, the
+        `status_code` being None when no response was received."""
+        throttled = status_code is None or status_code in RETRY_STATUSES
+        for limiter in (self.concurrency_limiter, self.rate_limiter):
+            if limiter is not None:
+                limiter.record(latency, throttled)
+        if self.metrics is not None:
+            self.metrics.record_request(operation.field, latency, status_code,
+                                        request_bytes, response_bytes, attempt)
+
+    async def _post(self, session, operation, payload):
+        """post the `payload` of an `operation`, return the status, body and headers."""
+        with ExitStack() as stack:
+            if operation.files:
+                data = aiohttp.FormData()
+                # bytes would be sent as files, the graphQL fields are text.
+                data.add_field("operations", payload.decode("utf-8"))
+                data.add_field("map", self.serializer.dumps({
+                    str(i): ["variables.{}".format(path)]
+                    for i, path in enumerate(operation.files)}).decode("utf-8"))
+                for i, file_path in enumerate(operation.files.values()):
+                    data.add_field(
+                        str(i), stack.enter_context(open(file_path, "rb")),
+                        filename=Path(file_path).name,
+                        content_type=get_mime_type(file_path))
+                timeout = 90 if self.timeout is None else self.timeout
+                request = session.post(
+                    self.endpoint_url, data=data, headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout))
+            else:
+                request = session.post(
+                    self.endpoint_url, data=payload,
+                    headers=self._json_headers,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+            async with request as response:
+                return response.status, await response.read(), response.headers
+
+    async def update_shop_settings(self, **kwargs):
+        """update shop settings, see `ETLDataLoader.update_shop_settings`."""
+        return await self._execute(operations.update_shop_settings(**kwargs))
+
+    async def update_shop_domain(self, **kwargs):
+        """update shop domain, see `ETLDataLoader.update_shop_domain`."""
+        return await self._execute(operations.update_shop_domain(**kwargs))
+
+    async def update_shop_address(self, **kwargs):
+        """update shop address, see `ETLDataLoader.update_shop_address`."""
+        return await self._execute(operations.update_shop_address(**kwargs))
+
+    async def create_warehouse(self, **kwargs):
+        """create a warehouse, see `ETLDataLoader.create_warehouse`."""
+        return await self._execute(operations.create_warehouse(**kwargs))
+
+    async def update_warehouse(self, warehouse_id, **kwargs):
+        """update a warehouse, see `ETLDataLoader.update_warehouse`."""
+        return await self._execute(
+            operations.update_warehouse(warehouse_id, **kwargs))
+
+    async def delete_warehouse(self, warehouse_id):
+        """delete a warehouse, see `ETLDataLoader.delete_warehouse`."""
+        return await self._execute(operations.delete_warehouse(warehouse_id))
+
+    async def create_shipping_zone(self, **kwargs):
+        """create a shippingZone, see `ETLDataLoader.create_shipping_zone`."""
+        return await self._execute(operations.create_shipping_zone(**kwargs))
+
+    async def update_shipping_zone(self, shipping_zone_id, **kwargs):
+        """update a shippingZone, see `ETLDataLoader.update_shipping_zone`."""
+        return await self._execute(
+            operations.update_shipping_zone(shipping_zone_id, **kwargs))
+
+    async def delete_shipping_zone(self, shipping_zone_id):
+        """delete a shippingZone, see `ETLDataLoader.delete_shipping_zone`."""
+        return await self._execute(operations.delete_shipping_zone(shipping_zone_id))
+
+    async def create_attribute(self, **kwargs):
+        """create a product attribute, see `ETLDataLoader.create_attribute`."""
+        return await self._execute(operations.create_attribute(**kwargs))
+
+    async def update_attribute(self, attribute_id, **kwargs):
+        """update a product attribute, see `ETLDataLoader.update_attribute`."""
+        return await self._execute(
+            operations.update_attribute(attribute_id, **kwargs))
+
+    async def delete_attribute(self, attribute_id):
+        """delete a product attribute, see `ETLDataLoader.delete_attribute`."""
+        return await self._execute(operations.delete_attribute(attribute_id))
+
+    async def create_attribute_value(self, attribute_id, **kwargs):
+        """create a product attribute value, see `ETLDataLoader.create_attribute_value`."""
+        return await self._execute(
+            operations.create_attribute_value(attribute_id, **kwargs))
+
+    async def update_attribute_value(self, attribute_value_id, **kwargs):
+        """update a product attribute value, see `ETLDataLoader.update_attribute_value`."""
+        return await self._execute(
+            operations.update_attribute_value(attribute_value_id, **kwargs))
+
+    async def delete_attribute_value(self, attribute_value_id):
+        """delete a product attribute value, see `ETLDataLoader.delete_attribute_value`."""
+        return await self._execute(operations.delete_attribute_value(attribute_value_id))
+
+    async def create_product_type(self, **kwargs):
+        """create a product type, see `ETLDataLoader.create_product_type`."""
+        return await self._execute(operations.create_product_type(**kwargs))
+
+    async def update_product_type(self, product_type_id, **kwargs):
+        """update a product type, see `ETLDataLoader.update_product_type`."""
+        return await self._execute(
+            operations.update_product_type(product_type_id, **kwargs))
+
+    async def delete_product_type(self, product_type_id):
+        """delete a product type, see `ETLDataLoader.delete_product_type`."""
+        return await self._execute(operations.delete_product_type(product_type_id))
+
+    async def create_category(self, **kwargs):
+        """create a category, see `ETLDataLoader.create_category`."""
+        return await self._execute(operations.create_category(**kwargs))
+
+    async def update_category(self, category_id, **kwargs):
+        """update a category, see `ETLDataLoader.update_category`."""
+        return await self._execute(
+            operations.update_category(category_id, **kwargs))
+
+    async def delete_category(self, category_id):
+        """delete a category, see `ETLDataLoader.delete_category`."""
+        return await self._execute(operations.delete_category(category_id))
+
+    async def create_product(self, product_type_id, **kwargs):
+        """create a product, see `ETLDataLoader.create_product`."""
+        return await self._execute(
+            operations.create_product(product_type_id, **kwargs))
+
+    async def update_product(self, product_id, **kwargs):
+        """update a product, see `ETLDataLoader.update_product`."""
+        return await self._execute(
+            operations.update_product(product_id, **kwargs))
+
+    async def delete_product(self, product_id):
+        """delete a product, see `ETLDataLoader.delete_product`."""
+        return await self._execute(operations.delete_product(product_id))
+
+    async def create_product_variant(self, product_id, **kwargs):
+        """create a product variant, see `ETLDataLoader.create_product_variant`."""
+        return await self._execute(
+            operations.create_product_variant(product_id, **kwargs))
+
+    async def update_product_variant(self, variant_id, **kwargs):
+        """update a product variant, see `ETLDataLoader.update_product_variant`."""
+        return await self._execute(
+            operations.update_product_variant(variant_id, **kwargs))
+
+    async def delete_product_variant(self, variant_id):
+        """delete a product variant, see `ETLDataLoader.delete_product_variant`."""
+        return await self._execute(operations.delete_product_variant(variant_id))
+
+    async def create_product_image(self, product_id, file_path):
+        """create a product image, see `ETLDataLoader.create_product_image`."""
+        return await self._execute(
+            operations.create_product_image(product_id, file_path))
+
+    async def update_product_image(self, image_id, **kwargs):
+        """update a product image, see `ETLDataLoader.update_product_image`."""
+        return await self._execute(
+            operations.update_product_image(image_id, **kwargs))
+
+    async def delete_product_image(self, image_id):
+        """delete a product image, see `ETLDataLoader.delete_product_image`."""
+        return await self._execute(operations.delete_product_image(image_id))
+
+    async def create_customer_account(self, **kwargs):
+        """create a customer, see `ETLDataLoader.create_customer_account`."""
+        return await self._execute(
+            operations.create_customer_account(**kwargs))
+
+    async def update_customer_account(self, customer_id, **kwargs):
+        """update a customer, see `ETLDataLoader.update_customer_account`."""
+        return await self._execute(
+            operations.update_customer_account(customer_id, **kwargs))
+
+    async def delete_customer_account(self, customer_id):
+        """delete a customer, see `ETLDataLoader.delete_customer_account`."""
+        return await self._execute(operations.delete_customer_account(customer_id))
+
+    async def update_private_meta(self, item_id, input_list):
+        """update private meta, see `ETLDataLoader.update_private_meta`."""
+        meta = await self._execute(
+            operations.update_private_meta(item_id, input_list))
+
+        if len(meta) > 0:
+            return item_id
+        else:
+            return None
+
+    async def update_metadata(self, item_id, input_list):
+        """update public meta, see `ETLDataLoader.update_metadata`."""
+        meta = await self._execute(
+            operations.update_metadata(item_id, input_list))
+
+        if len(meta) > 0:
+            return item_id
+        else:
+            return None
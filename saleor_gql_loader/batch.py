@@ -0,0 +1,358 @@
+"""Module to send many mutations in a single graphQL request.
+
+Notes
+-----
+Saleor accepts documents made of several aliased mutation fields e.g.
+`m0: productCreate(...) m1: productCreate(...)`. Sending N mutations in one
+document divides the number of requests, and thus of round-trips, by N. The
+payload of each alias is then read back as if the mutation was sent alone.
+
+The metadata set on an item with `set_metadata` or `set_private_metadata`
+are coalesced until the batch is sent: all the keys of an item are written
+by a single `updateMetadata` or `updatePrivateMetadata` alias, sent along
+with the other mutations of the batch.
+"""
+from itertools import islice
+
+from . import operations
+
+
+class PendingResult:
+    """result of a mutation queued in a `MutationBatch`.
+
+    Attributes
+    ----------
+    done : bool
+        whether the batch holding the mutation has been flushed.
+    """
+
+    def __init__(self, batch=None):
+        self.done = False
+        self._value = None
+        self._error = None
+        self._batch = batch
+
+    def __repr__(self):
+        if not self.done:
+            return "<PendingResult pending>"
+        elif self._error is not None:
+            return "<PendingResult error={!r}>".format(self._error)
+        else:
+            return "<PendingResult value={!r}>".format(self._value)
+
+    def result(self):
+        """get the result of the mutation.
+
+        Returns
+        -------
+        result : object
+            the result of the mutation, usually the id of the entity created.
+
+        Raises
+        ------
+        Exception
+            when the batch was not flushed yet or the mutation failed.
+        """
+        if not self.done:
+            raise Exception("the batch holding the mutation was not flushed yet.")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def error(self):
+        """get the exception raised by the mutation, None if it succeeded."""
+        return self._error
+
+    def _resolve(self, value=None, error=None):
+        self.done = True
+        self._value = value
+        self._error = error
+
+
+class MutationBatch:
+    """queue of mutations sent as aliased fields of a single document.
+
+    Notes
+    -----
+    The batch exposes the create_*/update_*/delete_* methods of the
+    `operations` module with the same parameters as the `ETLDataLoader`
+    methods. Instead of the id of the entity they return a `PendingResult`
+    resolved once the batch is flushed, which happens every `batch_size`
+    mutations, when leaving the `with` block or when calling `flush`.
+    `update_private_meta` results in the private metadata of the item rather
+    than its id. `create_product_image` goes through the `image_index` and the
+    `image_preprocessor` of the loader as when it is called unbatched.
+
+    The metadata of the items are coalesced per item by `set_metadata` and
+    `set_private_metadata`, the item being either an id or the pending result
+    of its creation in the batch:
+
+    ```python
+    with etl_data_loader.batch() as batch:
+        for product in products:
+            product_id = batch.create_product(product_type_id, **product)
+            batch.set_private_metadata(product_id, {"erp_id": product["sku"]})
+            batch.set_metadata(product_id, {"origin": "erp"})
+    ```
+
+    The metadata of an item created by the batch are sent once the item is
+    created, with the mutations queued after it: they fill the following
+    documents instead of adding requests.
+
+    Attributes
+    ----------
+    loader : ETLDataLoader
+        the loader used to send the batched documents.
+    batch_size : int
+        maximum number of mutations sent in a single request.
+    """
+
+    def __init__(self, loader, batch_size=50):
+        self.loader = loader
+        self.batch_size = batch_size
+        self._queue = []
+        self._metadata = {}
+        self._ready = {}
+        self._uploads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self):
+        return len(self._queue) + len(self._metadata)
+
+    def __getattr__(self, name):
+        builder = getattr(operations, name, None)
+        if builder is None or not name.startswith(("create_", "update_", "delete_")):
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+        def queue(*args, **kwargs):
+            return self.add(builder(*args, **kwargs))
+
+        return queue
+
+    def add(self, operation):
+        """queue an `operation`, flushing the batch when it is full.
+
+        Parameters
+        ----------
+        operation : operations.Operation
+            the mutation to queue.
+
+        Returns
+        -------
+        result : PendingResult
+            the result of the mutation, resolved when the batch is flushed.
+        """
+        result = PendingResult(self)
+        self._queue.append((operation, result))
+        self._flush_full()
+        return result
+
+    def create_product_image(self, product_id, file_path):
+        """queue the upload of an image, see `ETLDataLoader.create_product_image`.
+
+        Notes
+        -----
+        An image already uploaded to the product according to the
+        `image_index` of the loader is resolved at once without being queued,
+        the others are processed by its `image_preprocessor` before being
+        queued and recorded in its index once uploaded.
+
+        Returns
+        -------
+        result : PendingResult
+            the id of the image, resolved when the batch is flushed.
+        """
+        image_index = self.loader.image_index
+        content_hash = None
+        if image_index is not None:
+            content_hash, id = image_index.find(product_id, file_path)
+            if id is not None:
+                result = PendingResult(self)
+                result._resolve(id)
+                return result
+
+        upload_path = file_path
+        if self.loader.image_preprocessor is not None:
+            upload_path = self.loader.image_preprocessor.preprocess(file_path)
+
+        result = self.add(operations.create_product_image(product_id, upload_path))
+        if image_index is not None:
+            self._uploads.append((product_id, content_hash, result))
+            self._record_uploads()
+        return result
+
+    def set_metadata(self, item, metadata, private=False):
+        """queue `metadata` to set on an `item`, coalesced with the metadata
+        already queued for it.
+
+        Parameters
+        ----------
+        item : str or PendingResult
+            the id of the item or the result of its creation, either resolved
+            or queued in this batch. Its model must have metadata.
+        metadata : dict
+            the value of each metadata key, a key set twice keeps its last
+            value.
+        private : bool, optional
+            whether to set the private metadata of the item rather than its
+            public metadata, by default False.
+
+        Returns
+        -------
+        result : PendingResult
+            the metadata of the item once updated, shared by all the metadata
+            coalesced in the same mutation. It fails when the item fails to
+            be created.
+
+        Raises
+        ------
+        Exception
+            when `item` is the pending result of a mutation queued in another
+            batch, its metadata would never be sent.
+        """
+        if isinstance(item, PendingResult) and not item.done and item._batch is not self:
+            raise Exception(
+                "the item is queued in another batch, flush it before setting "
+                "the metadata of the item.")
+        key = (item, private)
+        if key not in self._metadata:
+            self._metadata[key] = ({}, PendingResult(self))
+        values, result = self._metadata[key]
+        values.update(metadata)
+        if not isinstance(item, PendingResult) or item.done:
+            self._ready[key] = None
+        self._flush_full()
+        return result
+
+    def set_private_metadata(self, item, metadata):
+        """queue private `metadata` to set on an `item`, see `set_metadata`."""
+        return self.set_metadata(item, metadata, private=True)
+
+    def flush(self):
+        """send the queued mutations and resolve their results.
+
+        Notes
+        -----
+        The mutations are sent `batch_size` at a time, the metadata of the
+        items created by a request being sent by the following one.
+
+        Errors are not raised but stored in the result of each mutation: the
+        errors of a mutation payload only affect its own result while a failed
+        request affects all the mutations of the batch.
+        """
+        while self._queue or self._ready:
+            self._send()
+
+    def _flush_full(self):
+        """send the queued mutations while they fill a whole document."""
+        while len(self._queue) + len(self._ready) >= self.batch_size:
+            self._send()
+
+    def _pop_metadata(self, count):
+        """get the mutations of at most `count` items whose metadata are ready."""
+        queue = []
+        for key in list(islice(self._ready, count)):
+            del self._ready[key]
+            values, result = self._metadata.pop(key)
+            item, private = key
+            if isinstance(item, PendingResult):
+                if item.error() is not None:
+                    result._resolve(error=Exception(
+                        "the item was not created: {}".format(item.error())))
+                    continue
+                item = item.result()
+            input_list = [{"key": k, "value": v} for k, v in values.items()]
+            if private:
+                queue.append((operations.update_private_meta(item, input_list), result))
+            else:
+                queue.append((operations.update_metadata(item, input_list), result))
+        return queue
+
+    def _update_ready(self):
+        """mark the metadata of the items created or failed as ready."""
+        for key in self._metadata:
+            if key not in self._ready and key[0].done:
+                self._ready[key] = None
+
+    def _send(self):
+        """send a document of at most `batch_size` mutations, the metadata of
+        the items already created first."""
+        queue = self._pop_metadata(self.batch_size)
+        count = self.batch_size - len(queue)
+        queue.extend(self._queue[:count])
+        del self._queue[:count]
+        try:
+            self._send_queue(queue)
+        finally:
+            if self._metadata:
+                self._update_ready()
+            if self._uploads:
+                self._record_uploads()
+
+    def _record_uploads(self):
+        """record the images uploaded in the image index of the loader."""
+        pending = []
+        for product_id, content_hash, result in self._uploads:
+            if not result.done:
+                pending.append((product_id, content_hash, result))
+            elif result.error() is None:
+                self.loader.image_index.record(product_id, content_hash, result.result())
+        self._uploads = pending
+
+    def _send_queue(self, queue):
+        """send the mutations of `queue` in a single request and resolve their
+        results."""
+        if not queue:
+            return
+
+        aliased_operations = {
+            "m{}".format(i): operation for i, (operation, _) in enumerate(queue)}
+        query, variables, files = operations.build_query(
+            "Batch", aliased_operations, self.loader.minimal_selection)
+
+        try:
+            response = self.loader._send(query, variables, files, name="batch")
+        except Exception as error:
+            for _, result in queue:
+                result._resolve(error=error)
+            self._record_errors(queue)
+            return
+
+        # the errors are matched to their alias by the first key of their
+        # path, those without path concern every mutation.
+        messages, unlocated = {}, []
+        for error in response.get("errors") or []:
+            path = error.get("path")
+            if path:
+                messages.setdefault(path[0], []).append(error["message"])
+            else:
+                unlocated.append(error["message"])
+
+        data = response.get("data") or {}
+        for alias, (operation, result) in zip(aliased_operations, queue):
+            payload = data.get(alias)
+            if payload is None:
+                alias_messages = messages.get(alias, []) + unlocated
+                result._resolve(error=Exception(
+                    "\n".join(alias_messages) or "no payload returned for the mutation."))
+                continue
+
+            try:
+                result._resolve(operation.parse_payload(payload))
+            except Exception as error:
+                result._resolve(error=error)
+        self._record_errors(queue)
+
+    def _record_errors(self, queue):
+        """record the mutations that failed in the metrics of the loader."""
+        if self.loader.metrics is not None:
+            for operation, result in queue:
+                if result.error() is not None:
+                    self.loader.metrics.record_error(operation.field)
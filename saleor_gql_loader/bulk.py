@@ -0,0 +1,155 @@
+"""Module to load many entities at once, concurrently or in chunks.
+
+Notes
+-----
+A failing call does not abort the others: its exception is kept in the result
+at the index of its input so that a single bad row doesn't kill a long run.
+
+`concurrent.futures` is imported when a bulk load starts rather than by the
+module, which is imported by the loaders, to keep the package fast to import.
+"""
+import json
+
+
+class BulkResult:
+    """results of a bulk call in the order of its inputs.
+
+    Attributes
+    ----------
+    ids : list
+        the value returned for each input (usually the id of the entity
+        created), None for the inputs that failed.
+    errors : dict
+        the exception raised for each input that failed by input index.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.errors = {}
+
+    def __repr__(self):
+        return "<BulkResult succeeded={} failed={}>".format(
+            len(self.ids) - len(self.errors), len(self.errors))
+
+
+def run_bulk(func, items, max_workers=10):
+    """Call `func` with each kwargs dict of `items` over a pool of threads.
+
+    Notes
+    -----
+    `items` is consumed lazily, at most twice `max_workers` calls are pending
+    at any time so that large generators are not loaded in memory.
+
+    Parameters
+    ----------
+    func : callable
+        the function to call e.g. `ETLDataLoader.create_product`.
+    items : iterable
+        an iterable of dict each one corresponding to the keyword arguments of
+        one call to `func`.
+    max_workers : int, optional
+        number of threads calling `func` concurrently, default is 10.
+
+    Returns
+    -------
+    result : BulkResult
+        the value returned or the exception raised by each call in the order
+        of `items`.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, ALL_COMPLETED
+
+    result = BulkResult()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for index, kwargs in enumerate(items):
+            result.ids.append(None)
+            pending[executor.submit(func, **kwargs)] = index
+            if len(pending) >= 2 * max_workers:
+                _collect(result, pending, FIRST_COMPLETED)
+        _collect(result, pending, ALL_COMPLETED)
+
+    return result
+
+
+def _collect(result, pending, return_when):
+    """move the completed `pending` futures into `result`."""
+    from concurrent.futures import wait
+
+    done, _ = wait(pending, return_when=return_when)
+    for future in done:
+        index = pending.pop(future)
+        try:
+            result.ids[index] = future.result()
+        except Exception as error:
+            result.errors[index] = error
+
+
+def iter_chunks(items, max_items, max_bytes=None):
+    """Split `items` in chunks small enough to be sent in a single request.
+
+    Parameters
+    ----------
+    items : iterable
+        the items to split, consumed lazily.
+    max_items : int
+        maximum number of items in a chunk.
+    max_bytes : int, optional
+        maximum size of the JSON encoded items of a chunk, an item bigger than
+        `max_bytes` is sent alone in its chunk. Default is None (no limit).
+
+    Yields
+    ------
+    start : int
+        index in `items` of the first item of the chunk.
+    chunk : list
+        the items of the chunk.
+    """
+    chunk, chunk_bytes, start = [], 0, 0
+    for index, item in enumerate(items):
+        item_bytes = len(json.dumps(item, default=str)) if max_bytes else 0
+        if chunk and (len(chunk) >= max_items
+                      or (max_bytes and chunk_bytes + item_bytes > max_bytes)):
+            yield start, chunk
+            chunk, chunk_bytes, start = [], 0, index
+        chunk.append(item)
+        chunk_bytes += item_bytes
+
+    if chunk:
+        yield start, chunk
+
+
+def map_bulk_errors(result, errors, start, size):
+    """Store the errors of a Saleor bulk mutation sent for a chunk in `result`.
+
+    Notes
+    -----
+    Saleor bulk mutations are atomic: when any item fails nothing is created,
+    the items without error of the chunk are then also marked as failed.
+
+    Parameters
+    ----------
+    result : BulkResult
+        the result in which to store the errors.
+    errors : list
+        the errors of the bulk mutation, each error must be a dict with at
+        least the keys `field`, `message` and `index` (index in the chunk,
+        None for errors affecting the whole chunk).
+    start : int
+        index of the first item of the chunk in the bulk input.
+    size : int
+        number of items in the chunk.
+    """
+    errors_by_offset = {}
+    for error in errors:
+        offsets = range(size) if error.get("index") is None else [error["index"]]
+        for offset in offsets:
+            errors_by_offset.setdefault(offset, []).append(error)
+
+    for offset in range(size):
+        if offset in errors_by_offset:
+            message = "\n".join(
+                "{field} : {message}".format(**error)
+                for error in errors_by_offset[offset])
+        else:
+            message = "not created as another item of the same bulk mutation failed."
+        result.errors[start + offset] = Exception(message)
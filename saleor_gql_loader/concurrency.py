@@ -0,0 +1,146 @@
+"""Module to adapt the number of queries in flight to the endpoint.
+
+Notes
+-----
+Too few concurrent queries waste time, too many overload the database behind
+Saleor: its latency then rises without the throughput rising. A
+`ConcurrencyLimiter` measures the latency of each query and raises the number
+of queries allowed in flight while the latency stays close to the lowest one
+seen, lowering it as soon as the latency rises or the endpoint throttles.
+"""
+import threading
+
+
+class ConcurrencyLimiter:
+    """adaptive limit of the number of queries in flight.
+
+    Notes
+    -----
+    The limit follows an additive increase, multiplicative decrease scheme
+    evaluated on each window of `limit` queries answered, i.e. about once per
+    round-trip: the limit grows by one when it was reached during the window
+    and the average latency of the window stays below `tolerance` times the
+    lowest average seen, and is multiplied by `decrease` when a query of the
+    window is throttled or its average latency exceeds it.
+
+    Threads beyond the limit wait in `acquire`, so the limiter is shared by as
+    many threads as `max_limit` e.g. through the loader. Coroutines wait in
+    `acquire_async` instead, without blocking their event loop:
+
+    ```python
+    limiter = ConcurrencyLimiter(initial=4, max_limit=32)
+    etl_data_loader = ETLDataLoader(auth_token, pool_size=32,
+                                    concurrency_limiter=limiter)
+    result = etl_data_loader.create_products_bulk(items, max_workers=32)
+    ```
+
+    Attributes
+    ----------
+    min_limit : int
+        the limit is never lowered below.
+    max_limit : int
+        the limit is never raised above.
+    in_flight : int
+        number of queries currently in flight.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, tolerance=2.0,
+                 decrease=0.7):
+        """initialize the `ConcurrencyLimiter`.
+
+        Parameters
+        ----------
+        initial : int, optional
+            number of queries allowed in flight at first, by default 4.
+        min_limit : int, optional
+            minimum limit, by default 1.
+        max_limit : int, optional
+            maximum limit, by default 64.
+        tolerance : float, optional
+            how many times the lowest latency the average latency may reach
+            before lowering the limit, by default 2.
+        decrease : float, optional
+            factor applied to the limit when lowering it, by default 0.7.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.in_flight = 0
+        self._limit = initial
+        self._condition = threading.Condition()
+        self._min_latency = None
+        self._window = {"count": 0, "latency": 0.0, "throttled": False, "saturated": False}
+        self._waiters = []
+
+    def __repr__(self):
+        return "<ConcurrencyLimiter limit={} in_flight={}>".format(
+            self.limit, self.in_flight)
+
+    @property
+    def limit(self):
+        """int: the number of queries currently allowed in flight."""
+        return self._limit
+
+    def acquire(self):
+        """wait until a query can be sent, then count it in flight."""
+        with self._condition:
+            while self.in_flight >= self._limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """wait until a query can be sent without blocking the event loop, then
+        count it in flight."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < self._limit:
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            await waiter
+
+    def record(self, latency, throttled=False):
+        """count a query out of flight and adapt the limit to its outcome.
+
+        Parameters
+        ----------
+        latency : float
+            seconds the query took.
+        throttled : bool, optional
+            whether the endpoint rejected the query as overloaded or the
+            query failed to reach it.
+        """
+        with self._condition:
+            window = self._window
+            window["saturated"] |= self.in_flight >= self._limit
+            window["throttled"] |= throttled
+            window["count"] += 1
+            window["latency"] += latency
+            self.in_flight -= 1
+
+            if window["count"] >= self._limit:
+                avg_latency = window["latency"] / window["count"]
+                if self._min_latency is None or avg_latency < self._min_latency:
+                    self._min_latency = avg_latency
+                if window["throttled"] or avg_latency > self.tolerance * self._min_latency:
+                    self._limit = max(self.min_limit, int(self._limit * self.decrease))
+                elif window["saturated"]:
+                    self._limit = min(self.max_limit, self._limit + 1)
+                self._window = {
+                    "count": 0, "latency": 0.0, "throttled": False, "saturated": False}
+
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter):
+    """wake up a coroutine waiting in `ConcurrencyLimiter.acquire_async`."""
+    if not waiter.done():
+        waiter.set_result(None)
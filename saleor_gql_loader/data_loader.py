@@ -10,7 +10,16 @@ requires a lot of dev better redo the project as a django app inside saleor
 project for easier testing.
 
 """
-from .utils import graphql_request, graphql_multipart_request, override_dict, handle_errors, get_payload
+import hashlib
+from functools import partial
+
+from . import operations
+from .batch import MutationBatch
+from .bulk import BulkResult, run_bulk, iter_chunks, map_bulk_errors
+from .serialization import get_default_serializer
+from .utils import graphql_request, graphql_multipart_request, open_multipart_payload, get_session
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
 
 
 class ETLDataLoader:
@@ -40,19 +49,58 @@ class ETLDataLoader:
                                     --permission checkout.manage_checkouts
     ```
 
+    The loader keeps its connections to the graphQL endpoint alive between
+    queries, it can be used as a context manager to release them when done:
+
+    ```python
+    with ETLDataLoader(auth_token) as etl_data_loader:
+        warehouse_id = etl_data_loader.create_warehouse()
+    ```
+
     Attributes
     ----------
     headers : dict
         the headers used to make graphQL queries.
     endpoint_url : str
         the graphQL endpoint url to query to.
+    session : requests.Session
+        the session holding the pool of connections used by every query.
+    timeout : float
+        seconds to wait for the server on each query, None waits forever.
+    pool_size : int
+        maximum number of connections kept alive, also the default number of
+        threads used by the bulk methods.
+    minimal_selection : bool
+        whether the update methods only select the minimum of their payload,
+        the shop updates then return a near empty result.
+    persisted_queries : bool
+        whether to send queries as persisted query hashes.
+    image_index : images.ImageIndex
+        index of the images uploaded by content hash, None to always upload.
+    image_preprocessor : preprocessing.ImagePreprocessor
+        shrinks the images before they are uploaded, None to upload them as is.
+    retry : retry.RetryPolicy
+        policy retrying the queries rejected by an overloaded endpoint.
+    rate_limiter : retry.RateLimiter
+        limiter adapting the rate of the queries to the endpoint.
+    concurrency_limiter : concurrency.ConcurrencyLimiter
+        limiter adapting the number of queries in flight to the endpoint.
+    metrics : metrics.Metrics
+        recorder of the latency, bytes, retries and errors of the requests.
+    serializer : serialization.JSONSerializer
+        serializer encoding the requests and decoding the responses.
 
     Methods
     -------
 
     """
 
-    def __init__(self, auth_token, endpoint_url="http://localhost:8000/graphql/"):
+    def __init__(self, auth_token, endpoint_url="http://localhost:8000/graphql/",
+                 pool_size=10, max_retries=0, timeout=None,
+                 minimal_selection=False, persisted_queries=False,
+                 image_index=None, image_preprocessor=None, retry=None,
+                 rate_limiter=None, concurrency_limiter=None, metrics=None,
+                 serializer=None):
         """initialize the `DataLoader` with an auth_token and an url endpoint.
 
         Parameters
@@ -61,63 +109,368 @@ class ETLDataLoader:
             token used to identify called to the graphQL endpoint.
         endpoint_url : str, optional
             the graphQL endpoint to be used , by default "http://localhost:8000/graphql/"
+        pool_size : int, optional
+            maximum number of connections kept alive to the endpoint, by default 10.
+        max_retries : int, optional
+            number of retries on connection failures, by default 0.
+        timeout : float, optional
+            seconds to wait for the server on each query, by default None
+            (image uploads then wait up to 90 seconds).
+        minimal_selection : bool, optional
+            only select the minimum of the update payloads to shrink the
+            responses, by default False.
+        persisted_queries : bool, optional
+            send the hash of the queries instead of the queries themselves once
+            the endpoint knows them (Automatic Persisted Queries protocol, the
+            endpoint must support it), by default False.
+        image_index : images.ImageIndex, optional
+            skip the upload of the images whose content was already uploaded
+            for the same product, by default None (always upload).
+        image_preprocessor : preprocessing.ImagePreprocessor, optional
+            resize and recompress the images before uploading them, by default
+            None (upload the original images).
+        retry : retry.RetryPolicy, optional
+            retry the queries answered with 429, 502, 503 or 504, by default
+            None (no retry).
+        rate_limiter : retry.RateLimiter, optional
+            space out the queries, slowing down when the endpoint is
+            overloaded, by default None (no limit).
+        concurrency_limiter : concurrency.ConcurrencyLimiter, optional
+            adapt the number of queries in flight across the threads sharing
+            the loader to the latency of the endpoint, by default None (as
+            many as threads). `pool_size` should be at least its `max_limit`.
+        metrics : metrics.Metrics, optional
+            record the latency, bytes, retries and errors of the requests by
+            operation, by default None (nothing is measured).
+        serializer : serialization.JSONSerializer, optional
+            serializer encoding the requests and decoding the responses, by
+            default the fastest available (orjson when installed).
         """
         self.headers = {"Authorization": "Bearer {}".format(auth_token)}
         self.endpoint_url = endpoint_url
+        self.pool_size = pool_size
+        self.session = get_session(pool_size, max_retries)
+        self.timeout = timeout
+        self.minimal_selection = minimal_selection
+        self.persisted_queries = persisted_queries
+        self.image_index = image_index
+        self.image_preprocessor = image_preprocessor
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.metrics = metrics
+        self.serializer = get_default_serializer() if serializer is None else serializer
+        self._persisted_hashes = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """close the connections kept alive by the loader."""
+        self.session.close()
+
+    def _send(self, query, variables, files=None, progress=None, name="query"):
+        """send a graphQL `query` to the endpoint, uploading `files` if any.
 
-    def update_shop_settings(self, **kwargs):
-        """update shop settings.
+        Parameters
+        ----------
+        query : str
+            docstring representing a graphQL query.
+        variables : dict
+            dictionary corresponding to the input(s) of the `query`.
+        files : dict, optional
+            path of the file to upload for each variable of type Upload given
+            as a dotted path inside `variables`.
+        progress : callable, optional
+            called with the number of bytes sent and the total size of the
+            body as the `files` are uploaded.
+        name : str, optional
+            name of the operation under which the request is measured, by
+            default "query".
+
+        Returns
+        -------
+        response : dict
+            a dictionary corresponding to the parsed JSON graphQL response.
+        """
+        if files:
+            timeout = 90 if self.timeout is None else self.timeout
+            with open_multipart_payload(query, variables, files, self.serializer) as body:
+                return graphql_multipart_request(
+                    body, self.headers, self.endpoint_url,
+                    timeout=timeout, progress=progress,
+                    **self._get_request_options(name))
+        elif self.persisted_queries:
+            return self._send_persisted(query, variables, name)
+        else:
+            return graphql_request(
+                query, variables, self.headers, self.endpoint_url,
+                timeout=self.timeout, **self._get_request_options(name))
+
+    def _send_persisted(self, query, variables, name="query"):
+        """send a graphQL `query` as a persisted query hash.
+
+        Notes
+        -----
+        The first time a query is sent it is sent along with its hash so that
+        the endpoint registers it, afterwards only the hash is sent. When the
+        endpoint answers that it doesn't know the hash (e.g. its cache was
+        evicted) the query is sent again along with its hash.
+        """
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+
+        if query_hash in self._persisted_hashes:
+            try:
+                response = graphql_request(
+                    None, variables, self.headers, self.endpoint_url,
+                    timeout=self.timeout, extensions=extensions,
+                    **self._get_request_options(name))
+            except Exception as error:
+                if PERSISTED_QUERY_NOT_FOUND not in str(error):
+                    raise
+            else:
+                messages = [error.get("message") for error in response.get("errors", [])]
+                if PERSISTED_QUERY_NOT_FOUND not in messages:
+                    return response
+
+        response = graphql_request(
+            query, variables, self.headers, self.endpoint_url,
+            timeout=self.timeout, extensions=extensions,
+            **self._get_request_options(name))
+        self._persisted_hashes.add(query_hash)
+        return response
+
+    def _get_request_options(self, name="query"):
+        """get the keyword arguments shared by the requests to the endpoint."""
+        def record_response(response, latency, attempt):
+            if response is None:
+                self.metrics.record_request(name, latency, attempt=attempt)
+            else:
+                self.metrics.record_request(
+                    name, latency, response.status_code,
+                    int(response.request.headers.get("Content-Length", 0)),
+                    len(response.content), attempt)
+
+        on_response = record_response if self.metrics is not None else None
+        return {
+            "session": self.session,
+            "retry": self.retry,
+            "rate_limiter": self.rate_limiter,
+            "concurrency_limiter": self.concurrency_limiter,
+            "on_response": on_response,
+            "serializer": self.serializer,
+        }
+
+    def _execute(self, operation, progress=None):
+        """send an `operation` to the graphQL endpoint and return its result.
 
         Parameters
         ----------
-        **kwargs : dict, optional
-            overrides the default value set to update the shop settings refer to the
-            ShopSettingsInput graphQL type to know what can be overriden.
+        operation : operations.Operation
+            the mutation to send.
+        progress : callable, optional
+            called with the number of bytes sent and the total size of the
+            body as the files of the `operation` are uploaded.
+
+        Returns
+        -------
+        result : object
+            the result of the mutation.
 
         Raises
         ------
         Exception
-            when shopErrors is not an empty list
+            when the errors of the mutation is not an empty list.
         """
+        try:
+            response = self._send(
+                operation.get_query(self.minimal_selection), operation.variables,
+                operation.files, progress, operation.field)
+            return operation.parse(response)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record_error(operation.field)
+            raise
+
+    def _iter_connection(self, field, selection, page_size=100, filter=None,
+                         filter_type=None, prefetch=False):
+        """iterate over the nodes of a Relay connection page by page.
 
-        variables = {
-            "input": kwargs
-        }
+        Parameters
+        ----------
+        field : str
+            name of the connection field e.g. `categories`.
+        selection : str
+            selection set of each node e.g. `id slug`.
+        page_size : int, optional
+            number of nodes read per query, by default 100 (Saleor maximum).
+        filter : dict, optional
+            the `filter` argument of the connection, by default None.
+        filter_type : str, optional
+            graphQL type of the `filter` argument e.g. `CategoryFilterInput`,
+            required with `filter`.
+        prefetch : bool, optional
+            query the next page in a background thread while the nodes of the
+            current one are consumed, by default False.
+
+        Yields
+        ------
+        node : dict
+            each node of the connection.
 
-        query = """
-            mutation ShopSettingsUpdate($input: ShopSettingsInput!) {
-              shopSettingsUpdate(input: $input) {
-                shop {
-                    headerText
-                    description
-                    includeTaxesInPrices
-                    displayGrossPrices
-                    chargeTaxesOnShipping
-                    trackInventoryByDefault
-                    defaultWeightUnit
-                    automaticFulfillmentDigitalProducts
-                    defaultDigitalMaxDownloads
-                    defaultDigitalUrlValidDays
-                    defaultMailSenderName
-                    defaultMailSenderAddress
-                    customerSetPasswordUrl
-                }
-                shopErrors {
-                    field
-                    message
-                    code
-                }
-              }
-            }
+        Raises
+        ------
+        Exception
+            when the query returns errors instead of data.
         """
+        query = operations.build_connection_query(
+            field, selection, None if filter is None else filter_type)
+
+        def get_page(after):
+            variables = {"first": page_size, "after": after}
+            if filter is not None:
+                variables["filter"] = filter
+            response = self._send(query, variables, name=field)
+            if response.get("data") is None:
+                raise Exception("\n".join(
+                    error["message"] for error in response.get("errors", [])))
+            return response["data"][field]
+
+        executor = None
+        if prefetch:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            connection = get_page(None)
+            while True:
+                next_page = None
+                if connection["pageInfo"]["hasNextPage"]:
+                    after = connection["pageInfo"]["endCursor"]
+                    if executor is None:
+                        next_page = partial(get_page, after)
+                    else:
+                        next_page = executor.submit(get_page, after).result
+
+                for edge in connection["edges"]:
+                    yield edge["node"]
+
+                if next_page is None:
+                    break
+                connection = next_page()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def iter_products(self, selection=operations.PRODUCT_SELECTION, page_size=100,
+                      filter=None, prefetch=False):
+        """iterate over the products page by page.
+
+        Notes
+        -----
+        The products are read lazily, one query per page, so that millions of
+        them can be walked in constant memory. With `prefetch` the next page
+        is read while the current one is processed:
+
+        ```python
+        skus = {variant["sku"]: product["id"]
+                for product in etl_data_loader.iter_products(prefetch=True)
+                for variant in product["variants"]}
+        ```
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+        Parameters
+        ----------
+        selection : str, optional
+            selection set of each product, by default its id, name, slug,
+            product type, category and variants.
+        page_size : int, optional
+            number of products read per query, by default 100 (Saleor maximum).
+        filter : dict, optional
+            a ProductFilterInput graphQL type e.g. `{"search": "shirt"}`, by
+            default None (all the products).
+        prefetch : bool, optional
+            read the next page in a background thread, by default False.
+
+        Yields
+        ------
+        product : dict
+            each product with the fields of `selection`.
 
-        errors = response["data"]["shopSettingsUpdate"]["shopErrors"]
-        handle_errors(errors)
+        Raises
+        ------
+        Exception
+            when the query returns errors instead of data.
+        """
+        return self._iter_connection("products", selection, page_size, filter,
+                                     "ProductFilterInput", prefetch)
+
+    def iter_categories(self, selection=operations.CATEGORY_SELECTION, page_size=100,
+                        filter=None, prefetch=False):
+        """iterate over the categories page by page, see `iter_products`.
+
+        Parameters
+        ----------
+        selection : str, optional
+            selection set of each category, by default its id, name, slug,
+            description and parent.
+        page_size : int, optional
+            number of categories read per query, by default 100.
+        filter : dict, optional
+            a CategoryFilterInput graphQL type, by default None.
+        prefetch : bool, optional
+            read the next page in a background thread, by default False.
+
+        Yields
+        ------
+        category : dict
+            each category with the fields of `selection`.
+        """
+        return self._iter_connection("categories", selection, page_size, filter,
+                                     "CategoryFilterInput", prefetch)
 
-        return response["data"]["shopSettingsUpdate"]["shop"]
+    def iter_customers(self, selection=operations.CUSTOMER_SELECTION, page_size=100,
+                       filter=None, prefetch=False):
+        """iterate over the customers page by page, see `iter_products`.
+
+        Parameters
+        ----------
+        selection : str, optional
+            selection set of each customer, by default its id, email, first
+            and last names and whether it is active.
+        page_size : int, optional
+            number of customers read per query, by default 100.
+        filter : dict, optional
+            a CustomerFilterInput graphQL type, by default None.
+        prefetch : bool, optional
+            read the next page in a background thread, by default False.
+
+        Yields
+        ------
+        customer : dict
+            each customer with the fields of `selection`.
+        """
+        return self._iter_connection("customers", selection, page_size, filter,
+                                     "CustomerFilterInput", prefetch)
+
+    def update_shop_settings(self, **kwargs):
+        """update shop settings.
+
+        Parameters
+        ----------
+        **kwargs : dict, optional
+            overrides the default value set to update the shop settings refer to the
+            ShopSettingsInput graphQL type to know what can be overriden.
+
+        Raises
+        ------
+        Exception
+            when shopErrors is not an empty list
+        """
+        return self._execute(operations.update_shop_settings(**kwargs))
 
     def update_shop_domain(self, **kwargs):
         """update shop domain.
@@ -133,37 +486,7 @@ class ETLDataLoader:
         Exception
             when shopErrors is not an empty list
         """
-
-        variables = {
-            "siteDomainInput": kwargs
-        }
-
-        query = """
-            mutation ShopDomainUpdate($siteDomainInput: SiteDomainInput!) {
-              shopDomainUpdate(input: $siteDomainInput) {
-                shop {
-                    domain {
-                        host
-                        sslEnabled
-                        url
-                    }
-                }
-                shopErrors {
-                    field
-                    message
-                    code
-                }
-              }
-            }
-        """
-
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
-
-        errors = response["data"]["shopDomainUpdate"]["shopErrors"]
-        handle_errors(errors)
-
-        return response["data"]["shopSettingsUpdate"]["shop"]["domain"]
+        return self._execute(operations.update_shop_domain(**kwargs))
 
     def update_shop_address(self, **kwargs):
         """update shop address.
@@ -179,51 +502,7 @@ class ETLDataLoader:
         Exception
             when shopErrors is not an empty list
         """
-
-        variables = {
-            "addressInput": kwargs
-        }
-
-        query = """
-            mutation ShopAddressUpdate($addressInput: AddressInput!) {
-              shopAddressUpdate(input: $addressInput) {
-                shop {
-                    companyAddress {
-                        id
-                        firstName
-                        lastName
-                        companyName
-                        streetAddress1
-                        streetAddress2
-                        city
-                        cityArea
-                        postalCode
-                        country {
-                            code
-                            country
-                        }
-                        countryArea
-                        phone
-                        isDefaultShippingAddress
-                        isDefaultBillingAddress
-                    }
-                }
-                shopErrors {
-                    field
-                    message
-                    code
-                }
-              }
-            }
-        """
-
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
-
-        errors = response["data"]["shopAddressUpdate"]["shopErrors"]
-        handle_errors(errors)
-
-        return response["data"]["shopAddressUpdate"]["shop"]["companyAddress"]
+        return self._execute(operations.update_shop_address(**kwargs))
 
     def create_warehouse(self, **kwargs):
         """create a warehouse.
@@ -244,46 +523,50 @@ class ETLDataLoader:
         Exception
             when warehouseErrors is not an empty list
         """
-        default_kwargs = {
-            "companyName": "The Fake Company",
-            "email": "fake@example.com",
-            "name": "fake warehouse",
-            "address": {
-                "streetAddress1": "a fake street adress",
-                "city": "Fake City",
-                "postalCode": "1024",
-                "country": "CH"
-            }
-        }
+        return self._execute(operations.create_warehouse(**kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_warehouse(self, warehouse_id, **kwargs):
+        """update a warehouse.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        warehouse_id : str
+            id of the warehouse to update.
+        **kwargs : dict, optional
+            the fields to update refer to the WarehouseUpdateInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        query = """
-            mutation createWarehouse($input: WarehouseCreateInput!) {
-                createWarehouse(input: $input) {
-                    warehouse {
-                        id
-                    }
-                    warehouseErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Returns
+        -------
+        id : str
+            the id of the warehouse updated.
+
+        Raises
+        ------
+        Exception
+            when warehouseErrors is not an empty list.
         """
+        return self._execute(operations.update_warehouse(warehouse_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_warehouse(self, warehouse_id):
+        """delete a warehouse.
 
-        errors = response["data"]["createWarehouse"]["warehouseErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        warehouse_id : str
+            id of the warehouse to delete.
 
-        return response["data"]["createWarehouse"]["warehouse"]["id"]
+        Returns
+        -------
+        id : str
+            the id of the warehouse deleted.
+
+        Raises
+        ------
+        Exception
+            when warehouseErrors is not an empty list.
+        """
+        return self._execute(operations.delete_warehouse(warehouse_id))
 
     def create_shipping_zone(self, **kwargs):
         """create a shippingZone.
@@ -305,42 +588,50 @@ class ETLDataLoader:
         Exception
             when shippingErrors is not an empty list.
         """
-        default_kwargs = {
-            "name": "CH",
-            "countries": [
-                "CH"
-            ],
-            "default": False,
-        }
+        return self._execute(operations.create_shipping_zone(**kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_shipping_zone(self, shipping_zone_id, **kwargs):
+        """update a shippingZone.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        shipping_zone_id : str
+            id of the shippingZone to update.
+        **kwargs : dict, optional
+            the fields to update refer to the ShippingZoneUpdateInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        query = """
-            mutation createShippingZone($input: ShippingZoneCreateInput!) {
-                shippingZoneCreate(input: $input) {
-                    shippingZone {
-                        id
-                    }
-                    shippingErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Returns
+        -------
+        id : str
+            the id of the shippingZone updated.
+
+        Raises
+        ------
+        Exception
+            when shippingErrors is not an empty list.
         """
+        return self._execute(operations.update_shipping_zone(shipping_zone_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_shipping_zone(self, shipping_zone_id):
+        """delete a shippingZone.
 
-        errors = response["data"]["shippingZoneCreate"]["shippingErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        shipping_zone_id : str
+            id of the shippingZone to delete.
+
+        Returns
+        -------
+        id : str
+            the id of the shippingZone deleted.
 
-        return response["data"]["shippingZoneCreate"]["shippingZone"]["id"]
+        Raises
+        ------
+        Exception
+            when shippingErrors is not an empty list.
+        """
+        return self._execute(operations.delete_shipping_zone(shipping_zone_id))
 
     def create_attribute(self, **kwargs):
         """create a product attribute.
@@ -362,39 +653,50 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "inputType": "DROPDOWN",
-            "name": "default"
-        }
+        return self._execute(operations.create_attribute(**kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_attribute(self, attribute_id, **kwargs):
+        """update a product attribute.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        attribute_id : str
+            id of the product attribute to update.
+        **kwargs : dict, optional
+            the fields to update refer to the AttributeUpdateInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        query = """
-            mutation createAttribute($input: AttributeCreateInput!) {
-                attributeCreate(input: $input) {
-                    attribute {
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Returns
+        -------
+        id : str
+            the id of the product attribute updated.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_attribute(attribute_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_attribute(self, attribute_id):
+        """delete a product attribute along with its values.
+
+        Parameters
+        ----------
+        attribute_id : str
+            id of the product attribute to delete.
 
-        errors = response["data"]["attributeCreate"]["productErrors"]
-        handle_errors(errors)
+        Returns
+        -------
+        id : str
+            the id of the product attribute deleted.
 
-        return response["data"]["attributeCreate"]["attribute"]["id"]
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_attribute(attribute_id))
 
     def create_attribute_value(self, attribute_id, **kwargs):
         """create a product attribute value.
@@ -411,46 +713,57 @@ class ETLDataLoader:
         Returns
         -------
         id : str
-            the id of the attribute on which the value was created.
+            the id of the attribute value created.
 
         Raises
         ------
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "name": "default"
-        }
+        return self._execute(operations.create_attribute_value(attribute_id, **kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_attribute_value(self, attribute_value_id, **kwargs):
+        """update a product attribute value.
 
-        variables = {
-            "attribute": attribute_id,
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        attribute_value_id : str
+            id of the product attribute value to update.
+        **kwargs : dict, optional
+            the fields to update refer to the AttributeValueCreateInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        query = """
-            mutation createAttributeValue($input: AttributeValueCreateInput!, $attribute: ID!) {
-                attributeValueCreate(input: $input, attribute: $attribute) {
-                    attribute{
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Returns
+        -------
+        id : str
+            the id of the product attribute value updated.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_attribute_value(attribute_value_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_attribute_value(self, attribute_value_id):
+        """delete a product attribute value.
+
+        Parameters
+        ----------
+        attribute_value_id : str
+            id of the product attribute value to delete.
 
-        errors = response["data"]["attributeValueCreate"]["productErrors"]
-        handle_errors(errors)
+        Returns
+        -------
+        id : str
+            the id of the product attribute value deleted.
 
-        return response["data"]["attributeValueCreate"]["attribute"]["id"]
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_attribute_value(attribute_value_id))
 
     def create_product_type(self, **kwargs):
         """create a product type.
@@ -472,42 +785,50 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "name": "default",
-            "hasVariants": False,
-            "productAttributes": [],
-            "variantAttributes": [],
-            "isDigital": "false",
-        }
+        return self._execute(operations.create_product_type(**kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_product_type(self, product_type_id, **kwargs):
+        """update a product type.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        product_type_id : str
+            id of the product type to update.
+        **kwargs : dict, optional
+            the fields to update refer to the ProductTypeInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        query = """
-            mutation createProductType($input: ProductTypeInput!) {
-                productTypeCreate(input: $input) {
-                    productType {
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Returns
+        -------
+        id : str
+            the id of the product type updated.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_product_type(product_type_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_product_type(self, product_type_id):
+        """delete a product type along with its products.
 
-        errors = response["data"]["productTypeCreate"]["productErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        product_type_id : str
+            id of the product type to delete.
 
-        return response["data"]["productTypeCreate"]["productType"]["id"]
+        Returns
+        -------
+        id : str
+            the id of the product type deleted.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_product_type(product_type_id))
 
     def create_category(self, **kwargs):
         """create a category.
@@ -529,38 +850,50 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "name": "default"
-        }
+        return self._execute(operations.create_category(**kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_category(self, category_id, **kwargs):
+        """update a category.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        category_id : str
+            id of the category to update.
+        **kwargs : dict, optional
+            the fields to update refer to the CategoryInput graphQL type to know
+            what can be updated, the other fields are left as is.
+
+        Returns
+        -------
+        id : str
+            the id of the category updated.
 
-        query = """
-            mutation createCategory($input: CategoryInput!) {
-                categoryCreate(input: $input) {
-                    category {
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_category(category_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_category(self, category_id):
+        """delete a category along with its subcategories and products.
+
+        Parameters
+        ----------
+        category_id : str
+            id of the category to delete.
 
-        errors = response["data"]["categoryCreate"]["productErrors"]
-        handle_errors(errors)
+        Returns
+        -------
+        id : str
+            the id of the category deleted.
 
-        return response["data"]["categoryCreate"]["category"]["id"]
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_category(category_id))
 
     def create_product(self, product_type_id, **kwargs):
         """create a product.
@@ -584,42 +917,50 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "name": "default",
-            "description": "default",
-            "productType": product_type_id,
-            "basePrice": 0.0,
-            "sku": "default"
-        }
+        return self._execute(operations.create_product(product_type_id, **kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_product(self, product_id, **kwargs):
+        """update a product.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        product_id : str
+            id of the product to update.
+        **kwargs : dict, optional
+            the fields to update refer to the ProductInput graphQL type to know
+            what can be updated, the other fields are left as is.
+
+        Returns
+        -------
+        id : str
+            the id of the product updated.
 
-        query = """
-            mutation createProduct($input: ProductCreateInput!) {
-                productCreate(input: $input) {
-                    product {
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_product(product_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_product(self, product_id):
+        """delete a product along with its variants and images.
+
+        Parameters
+        ----------
+        product_id : str
+            id of the product to delete.
 
-        errors = response["data"]["productCreate"]["productErrors"]
-        handle_errors(errors)
+        Returns
+        -------
+        id : str
+            the id of the product deleted.
 
-        return response["data"]["productCreate"]["product"]["id"]
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_product(product_id))
 
     def create_product_variant(self, product_id, **kwargs):
         """create a product variant.
@@ -643,50 +984,70 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        default_kwargs = {
-            "product": product_id,
-            "sku": "0",
-            "attributes": []
-        }
+        return self._execute(operations.create_product_variant(product_id, **kwargs))
 
-        override_dict(default_kwargs, kwargs)
+    def update_product_variant(self, variant_id, **kwargs):
+        """update a product variant.
 
-        variables = {
-            "input": default_kwargs
-        }
+        Parameters
+        ----------
+        variant_id : str
+            id of the product variant to update.
+        **kwargs : dict, optional
+            the fields to update refer to the ProductVariantInput graphQL type to know
+            what can be updated, the other fields are left as is.
+
+        Returns
+        -------
+        id : str
+            the id of the product variant updated.
 
-        query = """
-            mutation createProductVariant($input: ProductVariantCreateInput!) {
-                productVariantCreate(input: $input) {
-                    productVariant {
-                        id
-                    }
-                    productErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
         """
+        return self._execute(operations.update_product_variant(variant_id, **kwargs))
 
-        response = graphql_request(
-            query, variables, self.headers, self.endpoint_url)
+    def delete_product_variant(self, variant_id):
+        """delete a product variant.
 
-        errors = response["data"]["productVariantCreate"]["productErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        variant_id : str
+            id of the product variant to delete.
 
-        return response["data"]["productVariantCreate"]["productVariant"]["id"]
+        Returns
+        -------
+        id : str
+            the id of the product variant deleted.
 
-    def create_product_image(self, product_id, file_path):
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.delete_product_variant(variant_id))
+
+    def create_product_image(self, product_id, file_path, progress=None):
         """create a product image.
 
+        Notes
+        -----
+        When the loader has an `image_index` and an image with the same content
+        was already uploaded for the product, its id is returned without
+        uploading the image again. When the loader has an `image_preprocessor`
+        the processed image is uploaded in place of the original one.
+
         Parameters
         ----------
         product_id : str
             id for which the product image will be created.
         file_path : str
             path to the image to upload.
+        progress : callable, optional
+            called with the number of bytes sent and the total size of the
+            request as the image is uploaded.
 
         Returns
         -------
@@ -698,15 +1059,67 @@ class ETLDataLoader:
         Exception
             when productErrors is not an empty list.
         """
-        body = get_payload(product_id, file_path)
+        if self.image_index is not None:
+            content_hash, id = self.image_index.find(product_id, file_path)
+            if id is not None:
+                return id
+
+        upload_path = file_path
+        if self.image_preprocessor is not None:
+            upload_path = self.image_preprocessor.preprocess(file_path)
+
+        id = self._execute(
+            operations.create_product_image(product_id, upload_path), progress)
+
+        if self.image_index is not None:
+            self.image_index.record(product_id, content_hash, id)
+        return id
+
+    def update_product_image(self, image_id, **kwargs):
+        """update a product image.
+
+        Parameters
+        ----------
+        image_id : str
+            id of the product image to update.
+        **kwargs : dict, optional
+            the fields to update refer to the ProductImageUpdateInput graphQL type to know
+            what can be updated, the other fields are left as is.
+
+        Returns
+        -------
+        id : str
+            the id of the product image updated.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self._execute(operations.update_product_image(image_id, **kwargs))
 
-        response = graphql_multipart_request(
-            body, self.headers, self.endpoint_url)
+    def delete_product_image(self, image_id):
+        """delete a product image.
 
-        errors = response["data"]["productImageCreate"]["productErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        image_id : str
+            id of the product image to delete.
 
-        return response["data"]["productImageCreate"]["image"]["id"]
+        Returns
+        -------
+        id : str
+            the id of the product image deleted.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        id = self._execute(operations.delete_product_image(image_id))
+        if self.image_index is not None:
+            self.image_index.forget(image_id)
+        return id
 
     def create_customer_account(self, **kwargs):
         """
@@ -719,38 +1132,50 @@ class ETLDataLoader:
         -------
 
         """
-        default_kwargs = {
-            "firstName": "default",
-            "lastName": "default",
-            "email": "default@default.com",
-            "isActive": False,
-        }
+        return self._execute(operations.create_customer_account(**kwargs))
+
+    def update_customer_account(self, customer_id, **kwargs):
+        """update a customer.
 
-        override_dict(default_kwargs, kwargs)
+        Parameters
+        ----------
+        customer_id : str
+            id of the customer to update.
+        **kwargs : dict, optional
+            the fields to update refer to the CustomerInput graphQL type to know
+            what can be updated, the other fields are left as is.
 
-        variables = {"input": default_kwargs}
+        Returns
+        -------
+        id : str
+            the id of the customer updated.
 
-        query = """
-            mutation customerCreate($input: UserCreateInput !) {
-                customerCreate(input: $input) {
-                    user {
-                        id
-                    }
-                    accountErrors {
-                        field
-                        message
-                        code
-                    }
-                }
-            }
+        Raises
+        ------
+        Exception
+            when accountErrors is not an empty list.
         """
+        return self._execute(operations.update_customer_account(customer_id, **kwargs))
 
-        response = graphql_request(query, variables, self.headers, self.endpoint_url)
+    def delete_customer_account(self, customer_id):
+        """delete a customer.
 
-        errors = response["data"]["customerCreate"]["accountErrors"]
-        handle_errors(errors)
+        Parameters
+        ----------
+        customer_id : str
+            id of the customer to delete.
 
-        return response["data"]["customerCreate"]["user"]["id"]
+        Returns
+        -------
+        id : str
+            the id of the customer deleted.
+
+        Raises
+        ------
+        Exception
+            when accountErrors is not an empty list.
+        """
+        return self._execute(operations.delete_customer_account(customer_id))
 
     def update_private_meta(self, item_id, input_list):
         """
@@ -763,33 +1188,259 @@ class ETLDataLoader:
         -------
 
         """
+        meta = self._execute(operations.update_private_meta(item_id, input_list))
 
-        variables = {"id": item_id, "input": input_list}
+        if len(meta) > 0:
+            return item_id
+        else:
+            return None
+
+    def update_metadata(self, item_id, input_list):
+        """update the public metadata of an item.
 
-        query = """
-                    mutation updatePrivateMetadata($id: ID!, $input: [MetadataInput!]!) {
-                        updatePrivateMetadata(id: $id, input: $input) {
-                            item {
-                                privateMetadata {
-                                    key
-                                    value
-                                }
-                            }
-                            metadataErrors {
-                                field
-                                message
-                                code
-                            }
-                        }
-                    }
-                """
+        Notes
+        -----
+        To set metadata on many items use a batch, see `batch`: the keys set
+        on the same item are coalesced into a single mutation.
+
+        Parameters
+        ----------
+        item_id : str
+            ID of the item to update, its model must have metadata.
+        input_list : list
+            the metadata to set, each one a dict with its `key` and `value`.
 
-        response = graphql_request(query, variables, self.headers, self.endpoint_url)
+        Returns
+        -------
+        id : str
+            the ID of the item, None if it has no metadata.
+        """
+        meta = self._execute(operations.update_metadata(item_id, input_list))
 
-        if (
-            len(response["data"]["updatePrivateMetadata"]["item"]["privateMetadata"])
-            > 0
-        ):
+        if len(meta) > 0:
             return item_id
         else:
             return None
+
+    def bulk(self, method, items, max_workers=None):
+        """call a loader `method` for each kwargs dict of `items` concurrently.
+
+        Parameters
+        ----------
+        method : str
+            name of the loader method to call e.g. "create_product".
+        items : iterable
+            an iterable of dict each one corresponding to the keyword arguments
+            of one call to `method`, mandatory parameters included e.g.
+            `{"product_type_id": "UHJvZHVjdFR5cGU6MQ==", "name": "a product"}`.
+        max_workers : int, optional
+            number of threads calling `method` concurrently, by default
+            `pool_size`.
+
+        Returns
+        -------
+        result : bulk.BulkResult
+            the ids returned in the order of `items` and the exception raised
+            by each call that failed by index.
+        """
+        if max_workers is None:
+            max_workers = self.pool_size
+        return run_bulk(getattr(self, method), items, max_workers)
+
+    def create_products_bulk(self, items, max_workers=None):
+        """create many products concurrently, see `bulk` and `create_product`."""
+        return self.bulk("create_product", items, max_workers)
+
+    def create_variants_bulk(self, items, max_workers=None):
+        """create many product variants concurrently, see `bulk` and `create_product_variant`."""
+        return self.bulk("create_product_variant", items, max_workers)
+
+    def create_product_images_bulk(self, items, max_workers=None):
+        """create many product images concurrently, see `bulk` and `create_product_image`."""
+        return self.bulk("create_product_image", items, max_workers)
+
+    def create_customer_accounts_bulk(self, items, max_workers=None):
+        """create many customers concurrently, see `bulk` and `create_customer_account`."""
+        return self.bulk("create_customer_account", items, max_workers)
+
+    def bulk_create_product_variants(self, product_id, variants, chunk_size=100,
+                                     max_payload_size=2000000):
+        """create many variants of a product with Saleor productVariantBulkCreate.
+
+        Notes
+        -----
+        The variants are sent in chunks of at most `chunk_size` variants and
+        `max_payload_size` bytes, each chunk being a single request. A chunk
+        is created atomically by Saleor: if any of its variants fails none of
+        them is created.
+
+        Parameters
+        ----------
+        product_id : str
+            id for which the product variants will be created.
+        variants : iterable
+            an iterable of dict each one corresponding to a
+            ProductVariantBulkCreateInput graphQL type.
+        chunk_size : int, optional
+            maximum number of variants sent in a single request, by default 100.
+        max_payload_size : int, optional
+            maximum size in bytes of the variants sent in a single request, by
+            default 2000000 (below Django's default maximum request size).
+
+        Returns
+        -------
+        result : bulk.BulkResult
+            the ids of the variants created in the order of `variants` and the
+            exception of each variant that failed by index.
+        """
+        result = BulkResult()
+        for start, chunk in iter_chunks(variants, chunk_size, max_payload_size):
+            result.ids.extend([None] * len(chunk))
+            try:
+                payload = self._execute(
+                    operations.bulk_create_product_variants(product_id, chunk))
+            except Exception as error:
+                for index in range(start, start + len(chunk)):
+                    result.errors[index] = error
+                continue
+
+            if payload["bulkProductErrors"]:
+                map_bulk_errors(
+                    result, payload["bulkProductErrors"], start, len(chunk))
+            else:
+                for offset, variant in enumerate(payload["productVariants"]):
+                    result.ids[start + offset] = variant["id"]
+
+        return result
+
+    def bulk_delete(self, entity, ids, chunk_size=500):
+        """delete many entities with the Saleor bulk delete mutation of `entity`.
+
+        Notes
+        -----
+        The ids are sent in chunks of at most `chunk_size` ids, each chunk
+        being a single request, so deleting 100k entities takes 200 requests:
+
+        ```python
+        count = etl_data_loader.bulk_delete("category", category_ids)
+        ```
+
+        Parameters
+        ----------
+        entity : str
+            name of the entity e.g. "product", see
+            `operations.BULK_DELETE_MUTATIONS`.
+        ids : iterable
+            the ids of the entities to delete.
+        chunk_size : int, optional
+            maximum number of ids sent in a single request, by default 500.
+
+        Returns
+        -------
+        count : int
+            the number of entities deleted.
+
+        Raises
+        ------
+        Exception
+            when the entity has no bulk delete mutation or the errors of a
+            chunk is not an empty list, the previous chunks being deleted.
+        """
+        if entity not in operations.BULK_DELETE_MUTATIONS:
+            raise Exception("'{}' entities can't be deleted in bulk.".format(entity))
+        field, errors_key = operations.BULK_DELETE_MUTATIONS[entity]
+        count = 0
+        for _, chunk in iter_chunks(ids, chunk_size):
+            count += self._execute(operations.bulk_delete(field, chunk, errors_key))
+            if entity == "product_image" and self.image_index is not None:
+                for id in chunk:
+                    self.image_index.forget(id)
+        return count
+
+    def bulk_delete_products(self, ids, chunk_size=500):
+        """delete many products with Saleor productBulkDelete.
+
+        Parameters
+        ----------
+        ids : iterable
+            the ids of the products to delete.
+        chunk_size : int, optional
+            maximum number of ids sent in a single request, by default 500.
+
+        Returns
+        -------
+        count : int
+            the number of products deleted.
+
+        Raises
+        ------
+        Exception
+            when productErrors is not an empty list.
+        """
+        return self.bulk_delete("product", ids, chunk_size)
+
+    def bulk_delete_product_variants(self, ids, chunk_size=500):
+        """delete many variants with Saleor productVariantBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("product_variant", ids, chunk_size)
+
+    def bulk_delete_product_images(self, ids, chunk_size=500):
+        """delete many images with Saleor productImageBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("product_image", ids, chunk_size)
+
+    def bulk_delete_product_types(self, ids, chunk_size=500):
+        """delete many product types with Saleor productTypeBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("product_type", ids, chunk_size)
+
+    def bulk_delete_categories(self, ids, chunk_size=500):
+        """delete many categories with Saleor categoryBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("category", ids, chunk_size)
+
+    def bulk_delete_attributes(self, ids, chunk_size=500):
+        """delete many attributes with Saleor attributeBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("attribute", ids, chunk_size)
+
+    def bulk_delete_attribute_values(self, ids, chunk_size=500):
+        """delete many attribute values with Saleor attributeValueBulkDelete, see
+        `bulk_delete`."""
+        return self.bulk_delete("attribute_value", ids, chunk_size)
+
+    def bulk_delete_shipping_zones(self, ids, chunk_size=500):
+        """delete many shipping zones with Saleor shippingZoneBulkDelete, see
+        `bulk_delete`."""
+        return self.bulk_delete("shipping_zone", ids, chunk_size)
+
+    def bulk_delete_customer_accounts(self, ids, chunk_size=500):
+        """delete many customers with Saleor customerBulkDelete, see `bulk_delete`."""
+        return self.bulk_delete("customer_account", ids, chunk_size)
+
+    def batch(self, batch_size=50):
+        """queue mutations to send them as aliased fields of a single document.
+
+        Notes
+        -----
+        The returned batch exposes the same create_*/update_*/delete_* methods
+        as the loader, they return a `batch.PendingResult` resolved once the
+        batch is flushed. The batch is flushed every `batch_size` mutations and
+        when leaving the `with` block:
+
+        ```python
+        with etl_data_loader.batch(batch_size=100) as batch:
+            results = [batch.create_attribute_value(year_attribute_id, name=year)
+                       for year in possible_year_values]
+        ids = [result.result() for result in results]
+        ```
+
+        The metadata set with `set_metadata` and `set_private_metadata` are
+        coalesced per item and sent with the other mutations of the batch.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            maximum number of mutations sent in a single request, by default 50.
+
+        Returns
+        -------
+        batch : batch.MutationBatch
+            the batch of mutations sent through this loader.
+        """
+        return MutationBatch(self, batch_size)
@@ -0,0 +1,221 @@
+"""Module to upload many product images in parallel.
+
+Notes
+-----
+Each image is streamed from disk in a multipart request, its file being closed
+as soon as it is sent, while a pool of threads uploads several images at once.
+The progress of each upload can be followed through a callback and the
+uploader keeps the overall throughput.
+
+An `ImageIndex` given to the loader skips the upload of an image whose content
+was already uploaded for the same product, e.g. when a load is run again.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .bulk import run_bulk
+from .journal import Journal
+from .utils import hash_file
+
+
+class ImageIndex:
+    """local index of the product images uploaded by content hash.
+
+    Notes
+    -----
+    The index is backed by a `journal.Journal`, in memory by default or in a
+    SQLite file to skip the images uploaded by previous runs:
+
+    ```python
+    image_index = ImageIndex(Journal("images.journal"))
+    etl_data_loader = ETLDataLoader(auth_token, image_index=image_index)
+    image_id = etl_data_loader.create_product_image(product_id, "tshirt.png")
+    print(image_index.stats)
+    ```
+
+    Attributes
+    ----------
+    journal : journal.Journal
+        the journal recording the id of each image uploaded by product and
+        content hash.
+    stats : dict
+        the number of uploads `skipped` and the `bytes_saved` by skipping them.
+    """
+
+    def __init__(self, journal=None):
+        self.journal = Journal(":memory:") if journal is None else journal
+        self.stats = {"skipped": 0, "bytes_saved": 0}
+        self._lock = threading.Lock()
+
+    def find(self, product_id, file_path):
+        """find an image with the same content already uploaded for the product.
+
+        Parameters
+        ----------
+        product_id : str
+            id of the product of the image.
+        file_path : str
+            path to the image to upload.
+
+        Returns
+        -------
+        content_hash : str
+            the sha256 hash of the image content.
+        id : str
+            the id of the product image already uploaded, None if not found.
+        """
+        content_hash = hash_file(file_path)
+        id = self.journal.get(self._get_key(product_id, content_hash))
+        if id is not None:
+            with self._lock:
+                self.stats["skipped"] += 1
+                self.stats["bytes_saved"] += os.path.getsize(file_path)
+        return content_hash, id
+
+    def record(self, product_id, content_hash, id):
+        """record the id of an image uploaded for a product."""
+        self.journal.record(
+            self._get_key(product_id, content_hash), "product_image", id)
+
+    def forget(self, id):
+        """forget a product image deleted so that its content is uploaded again."""
+        self.journal.forget(id)
+
+    def _get_key(self, product_id, content_hash):
+        return "{}:{}".format(product_id, content_hash)
+
+
+class UploadProgress(namedtuple(
+        "UploadProgress", ["file_path", "bytes_sent", "total_bytes", "elapsed", "done"])):
+    """progress of an image upload.
+
+    Attributes
+    ----------
+    file_path : str
+        path of the image uploaded.
+    bytes_sent : int
+        number of bytes of the request sent so far.
+    total_bytes : int
+        total size of the request (the image and the mutation).
+    elapsed : float
+        seconds since the upload started.
+    done : bool
+        whether the image is created.
+    """
+
+    @property
+    def bytes_per_second(self):
+        """float: the upload speed of the image."""
+        return self.bytes_sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class ImageUploader:
+    """upload product images in parallel through a loader.
+
+    Notes
+    -----
+    The loader should keep at least `max_workers` connections alive (see the
+    `pool_size` of `ETLDataLoader`):
+
+    ```python
+    def report(progress):
+        if progress.done:
+            print("{} uploaded at {:.0f} kB/s".format(
+                progress.file_path, progress.bytes_per_second / 1000))
+
+    uploader = ImageUploader(etl_data_loader, max_workers=8, progress=report)
+    result = uploader.upload_many(
+        {"product_id": product_id, "file_path": path} for path in paths)
+    print(uploader.stats)
+    ```
+
+    Attributes
+    ----------
+    loader : ETLDataLoader
+        the loader used to upload the images.
+    max_workers : int
+        number of images uploaded concurrently.
+    progress : callable
+        called with an `UploadProgress` as each image is uploaded.
+    stats : dict
+        the number of `images` uploaded, the `bytes` sent for them, the
+        `seconds` elapsed since the first upload started and the number of
+        images `skipped` as already uploaded (see `ImageIndex`).
+    """
+
+    def __init__(self, loader, max_workers=4, progress=None):
+        self.loader = loader
+        self.max_workers = max_workers
+        self.progress = progress
+        self.stats = {"images": 0, "bytes": 0, "seconds": 0.0, "skipped": 0}
+        self._lock = threading.Lock()
+        self._started_at = None
+
+    @property
+    def bytes_per_second(self):
+        """float: the overall upload speed of the images uploaded so far."""
+        with self._lock:
+            seconds = self.stats["seconds"]
+            return self.stats["bytes"] / seconds if seconds > 0 else 0.0
+
+    def upload(self, product_id, file_path):
+        """upload an image, see `ETLDataLoader.create_product_image`.
+
+        Parameters
+        ----------
+        product_id : str
+            id for which the product image will be created.
+        file_path : str
+            path to the image to upload.
+
+        Returns
+        -------
+        id : str
+            the id of the product image created.
+        """
+        start = time.monotonic()
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = start
+
+        sent = {"bytes": 0, "total": os.path.getsize(file_path), "uploaded": False}
+
+        def on_progress(bytes_sent, total_bytes):
+            sent["bytes"], sent["total"] = bytes_sent, total_bytes
+            sent["uploaded"] = True
+            if self.progress is not None:
+                self.progress(UploadProgress(
+                    file_path, bytes_sent, total_bytes,
+                    time.monotonic() - start, False))
+
+        id = self.loader.create_product_image(
+            product_id, file_path, progress=on_progress)
+
+        end = time.monotonic()
+        with self._lock:
+            self.stats["images" if sent["uploaded"] else "skipped"] += 1
+            self.stats["bytes"] += sent["bytes"]
+            self.stats["seconds"] = end - self._started_at
+        if self.progress is not None:
+            self.progress(UploadProgress(
+                file_path, sent["bytes"], sent["total"], end - start, True))
+        return id
+
+    def upload_many(self, items):
+        """upload many images in parallel.
+
+        Parameters
+        ----------
+        items : iterable
+            an iterable of dict with the keys `product_id` and `file_path`,
+            consumed lazily.
+
+        Returns
+        -------
+        result : bulk.BulkResult
+            the ids of the images created in the order of `items` and the
+            exception of each upload that failed by index.
+        """
+        return run_bulk(self.upload, items, self.max_workers)
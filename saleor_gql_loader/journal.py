@@ -0,0 +1,147 @@
+"""Module to record the entities created in a local journal to resume failed loads.
+
+Notes
+-----
+The journal is a SQLite database mapping the external key of each entity
+created to its Saleor id. Each entry is committed as soon as the entity is
+created so that, when a load dies, rerunning it with the same journal skips
+the entities already created instead of creating duplicates.
+"""
+import sqlite3
+import threading
+
+
+class Journal:
+    """local SQLite journal of the entities created by external key.
+
+    Notes
+    -----
+    The journal can be shared between threads and used as a context manager
+    to close its database when done:
+
+    ```python
+    with Journal("load.journal") as journal:
+        product_id = journal.load(
+            "tshirt-1", "product", etl_data_loader.create_product,
+            product_type_id, name="a t-shirt")
+    ```
+
+    Attributes
+    ----------
+    path : str
+        path of the SQLite database of the journal.
+    """
+
+    def __init__(self, path):
+        """open the journal stored at `path`, creating it if needed.
+
+        Parameters
+        ----------
+        path : str
+            path of the SQLite database of the journal.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                "key TEXT PRIMARY KEY, entity TEXT, id TEXT NOT NULL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM entities").fetchone()[0]
+
+    def close(self):
+        """close the database of the journal."""
+        self._connection.close()
+
+    def get(self, key):
+        """get the id of the entity created with the external `key`.
+
+        Parameters
+        ----------
+        key : str
+            the external key of the entity.
+
+        Returns
+        -------
+        id : str
+            the Saleor id of the entity, None if it was not created.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM entities WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def record(self, key, entity, id):
+        """record that the entity with the external `key` was created.
+
+        Parameters
+        ----------
+        key : str
+            the external key of the entity.
+        entity : str
+            the name of the entity e.g. "product".
+        id : str
+            the Saleor id of the entity.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entities (key, entity, id) VALUES (?, ?, ?)",
+                (key, entity, id))
+
+    def forget(self, id):
+        """remove the entries recording the entity with the Saleor `id`, e.g.
+        once it is deleted."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entities WHERE id = ?", (id,))
+
+    def ids(self):
+        """get the id of every entity recorded by external key.
+
+        Returns
+        -------
+        ids : dict
+            the Saleor id of each entity by external key.
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT key, id FROM entities"))
+
+    def load(self, key, entity, method, *args, **kwargs):
+        """create an entity with `method` unless it was already recorded.
+
+        Parameters
+        ----------
+        key : str
+            the external key of the entity.
+        entity : str
+            the name of the entity e.g. "product".
+        method : callable
+            the loader method creating the entity e.g.
+            `ETLDataLoader.create_product`.
+        *args, **kwargs
+            the arguments of `method`.
+
+        Returns
+        -------
+        id : str
+            the Saleor id of the entity, created or recorded.
+        """
+        id = self.get(key)
+        if id is None:
+            id = method(*args, **kwargs)
+            self.record(key, entity, id)
+        return id
@@ -0,0 +1,285 @@
+"""Module to measure where the time of a load goes.
+
+Notes
+-----
+A `Metrics` object given to the loader records, for each operation (the
+mutation or query field e.g. `productCreate`), the latency of every request
+in a histogram, the bytes sent and received, the requests retried and the
+errors. It prints a summary at the end of a run and exports its values as
+JSON or in the Prometheus text format.
+"""
+import json
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class OperationStats:
+    """measures of the requests sent for an operation.
+
+    Attributes
+    ----------
+    requests : int
+        number of requests sent, retries included.
+    retries : int
+        number of requests that were retries of a previous request.
+    http_errors : int
+        number of requests that failed or were not answered with 200.
+    errors : int
+        number of operations that failed, e.g. because of their errors.
+    latency : float
+        total seconds spent waiting for the responses.
+    request_bytes : int
+        total size of the request bodies.
+    response_bytes : int
+        total size of the response bodies.
+    bucket_counts : list
+        number of requests whose latency is lower or equal to each bucket,
+        the last count being for the latencies above the last bucket.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests = 0
+        self.retries = 0
+        self.http_errors = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+    def get_quantile(self, quantile):
+        """estimate a quantile of the latency from the histogram.
+
+        Parameters
+        ----------
+        quantile : float
+            the quantile to estimate between 0 and 1 e.g. 0.95.
+
+        Returns
+        -------
+        latency : float
+            the estimated latency in seconds, interpolated inside its bucket,
+            None when no request was recorded.
+        """
+        if self.requests == 0:
+            return None
+        rank = quantile * self.requests
+        seen = 0
+        for i, count in enumerate(self.bucket_counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def to_dict(self):
+        """get the measures as a JSON serializable dict."""
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "http_errors": self.http_errors,
+            "errors": self.errors,
+            "latency_seconds": self.latency,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_p50": self.get_quantile(0.5),
+            "latency_p95": self.get_quantile(0.95),
+            "latency_p99": self.get_quantile(0.99),
+            "latency_buckets": dict(zip(
+                [str(bucket) for bucket in self.buckets] + ["+Inf"],
+                self.bucket_counts)),
+        }
+
+
+class Metrics:
+    """thread safe recorder of the requests sent by a loader.
+
+    Notes
+    -----
+    ```python
+    metrics = Metrics()
+    etl_data_loader = ETLDataLoader(auth_token, metrics=metrics)
+    etl_data_loader.create_products_bulk(items)
+    print(metrics.summary())
+    metrics.export("metrics.prom")
+    ```
+
+    Attributes
+    ----------
+    operations : dict
+        the `OperationStats` of each operation by name.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_stats(self, operation):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats(self.buckets)
+        return stats
+
+    def record_request(self, operation, latency, status_code=None,
+                       request_bytes=0, response_bytes=0, attempt=1):
+        """record a request sent for an operation.
+
+        Parameters
+        ----------
+        operation : str
+            name of the operation e.g. `productCreate`.
+        latency : float
+            seconds waited for the response.
+        status_code : int, optional
+            HTTP status of the response, None when no response was received.
+        request_bytes : int, optional
+            size of the request body.
+        response_bytes : int, optional
+            size of the response body.
+        attempt : int, optional
+            number of times the request was sent, starting at 1.
+        """
+        with self._lock:
+            stats = self._get_stats(operation)
+            stats.requests += 1
+            stats.latency += latency
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            if attempt > 1:
+                stats.retries += 1
+            if status_code != 200:
+                stats.http_errors += 1
+            for i, bucket in enumerate(self.buckets):
+                if latency <= bucket:
+                    stats.bucket_counts[i] += 1
+                    break
+            else:
+                stats.bucket_counts[-1] += 1
+
+    def record_error(self, operation):
+        """record an operation that failed."""
+        with self._lock:
+            self._get_stats(operation).errors += 1
+
+    def merge(self, other):
+        """add the measures recorded by `other`, e.g. in another process.
+
+        Parameters
+        ----------
+        other : Metrics
+            the metrics to add, with the same buckets.
+        """
+        with self._lock:
+            for name, other_stats in other.operations.items():
+                stats = self._get_stats(name)
+                for attribute in ("requests", "retries", "http_errors", "errors",
+                                  "latency", "request_bytes", "response_bytes"):
+                    setattr(stats, attribute,
+                            getattr(stats, attribute) + getattr(other_stats, attribute))
+                stats.bucket_counts = [
+                    count + other_count for count, other_count in zip(
+                        stats.bucket_counts, other_stats.bucket_counts)]
+
+    def to_dict(self):
+        """get the measures of each operation as a JSON serializable dict."""
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in sorted(self.operations.items())}
+
+    def to_prometheus(self, prefix="saleor_gql_loader"):
+        """get the measures in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            prefix of the metric names, by default "saleor_gql_loader".
+
+        Returns
+        -------
+        text : str
+            the metrics, labelled by operation.
+        """
+        counters = [
+            ("requests_total", "requests", "requests sent, retries included"),
+            ("retries_total", "retries", "requests retried"),
+            ("http_errors_total", "http_errors", "requests failed or not answered with 200"),
+            ("errors_total", "errors", "operations failed"),
+            ("request_bytes_total", "request_bytes", "bytes of the request bodies"),
+            ("response_bytes_total", "response_bytes", "bytes of the response bodies"),
+        ]
+        with self._lock:
+            operations = sorted(self.operations.items())
+            lines = []
+            for metric, attribute, help in counters:
+                name = "{}_{}".format(prefix, metric)
+                lines.append("# HELP {} {}".format(name, help))
+                lines.append("# TYPE {} counter".format(name))
+                for operation, stats in operations:
+                    lines.append('{}{{operation="{}"}} {}'.format(
+                        name, operation, getattr(stats, attribute)))
+
+            name = "{}_request_latency_seconds".format(prefix)
+            lines.append("# HELP {} latency of the requests".format(name))
+            lines.append("# TYPE {} histogram".format(name))
+            for operation, stats in operations:
+                cumulated = 0
+                for bucket, count in zip(
+                        [str(bucket) for bucket in self.buckets] + ["+Inf"],
+                        stats.bucket_counts):
+                    cumulated += count
+                    lines.append('{}_bucket{{operation="{}",le="{}"}} {}'.format(
+                        name, operation, bucket, cumulated))
+                lines.append('{}_sum{{operation="{}"}} {}'.format(
+                    name, operation, stats.latency))
+                lines.append('{}_count{{operation="{}"}} {}'.format(
+                    name, operation, stats.requests))
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """write the measures to a file, as JSON when `path` ends with `.json`
+        and in the Prometheus text format otherwise."""
+        with open(path, "w", encoding="utf-8") as f:
+            if str(path).endswith(".json"):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def summary(self):
+        """get a table summing up the measures of each operation.
+
+        Returns
+        -------
+        summary : str
+            one line per operation with its number of requests, retries,
+            failed requests and failed operations, its latency quantiles in
+            milliseconds and its bytes.
+        """
+        row = "{:<32} {:>8} {:>7} {:>8} {:>7} {:>8} {:>8} {:>8} {:>10} {:>10}"
+        header = row.format(
+            "operation", "requests", "retries", "http err", "errors", "p50 ms",
+            "p95 ms", "p99 ms", "sent kB", "recv kB")
+        lines = [header]
+        with self._lock:
+            for name, stats in sorted(self.operations.items()):
+                quantiles = [stats.get_quantile(q) for q in (0.5, 0.95, 0.99)]
+                lines.append(row.format(
+                    name, stats.requests, stats.retries, stats.http_errors,
+                    stats.errors,
+                    *["-" if q is None else "{:.0f}".format(q * 1000)
+                      for q in quantiles],
+                    "{:.1f}".format(stats.request_bytes / 1000),
+                    "{:.1f}".format(stats.response_bytes / 1000)))
+        return "\n".join(lines)
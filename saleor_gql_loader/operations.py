@@ -0,0 +1,752 @@
+"""Defines the graphQL mutations used to load data into Saleor.
+
+Notes
+-----
+Each function of this module builds an `Operation` holding everything needed
+to send one mutation and to read its result, independently of how it is sent.
+This way the synchronous and asynchronous loaders share the same mutations and
+default values.
+
+The functions are named after the `ETLDataLoader` method using them, refer to
+the methods documentation for the meaning of their parameters.
+
+The graphQL documents are rendered once per shape (mutations, aliases and
+selection sets) and cached, with their whitespace compacted so that sending a
+mutation neither rebuilds nor ships a formatted document.
+"""
+from functools import lru_cache
+
+from .utils import override_dict, handle_errors, compact_query
+
+ERRORS_SELECTION = "field message code"
+
+BULK_ERRORS_SELECTION = "bulkProductErrors { field message code index }"
+
+FIELD_TEMPLATE = "{field}({arguments}) {{ {selection} }}"
+
+PRODUCT_SELECTION = """id name slug productType { id name } category { id name }
+    variants { id sku }"""
+
+CATEGORY_SELECTION = "id name slug description parent { id }"
+
+CUSTOMER_SELECTION = "id email firstName lastName isActive"
+
+CONNECTION_TEMPLATE = """
+query {name}($first: Int!, $after: String{filter_variable}) {{
+    {field}(first: $first, after: $after{filter_argument}) {{
+        edges {{
+            node {{
+                {selection}
+            }}
+        }}
+        pageInfo {{
+            hasNextPage
+            endCursor
+        }}
+    }}
+}}
+"""
+
+
+class Operation:
+    """a single graphQL mutation ready to be sent.
+
+    Attributes
+    ----------
+    field : str
+        name of the mutation field e.g. `productCreate`.
+    arguments : dict
+        graphQL type of each argument of the mutation by argument name, the
+        variables are named after the arguments.
+    variables : dict
+        values of the arguments.
+    selection : str
+        selection set of the mutation payload, errors excluded.
+    errors_key : str
+        name of the errors field of the payload e.g. `productErrors`, None if
+        the errors must not be checked.
+    result_path : tuple
+        keys to follow in the payload to reach the result of the mutation.
+    files : dict
+        path of the file to upload for each variable of type `Upload` given as
+        a dotted path inside the variables e.g. `input.image`.
+    minimal_selection : str
+        smaller selection set used instead of `selection` when only the
+        success of the mutation matters, None if `selection` is already
+        minimal.
+    """
+
+    def __init__(self, field, arguments, variables, selection, errors_key,
+                 result_path, files=None, minimal_selection=None):
+        self.field = field
+        self.arguments = arguments
+        self.variables = variables
+        self.selection = selection
+        self.errors_key = errors_key
+        self.result_path = result_path
+        self.files = files or {}
+        self.minimal_selection = minimal_selection
+
+    @property
+    def query(self):
+        """str: the graphQL document of the mutation."""
+        return self.get_query()
+
+    def get_query(self, minimal=False):
+        """get the graphQL document of the mutation.
+
+        Parameters
+        ----------
+        minimal : bool, optional
+            whether to use the minimal selection set, default is False.
+
+        Returns
+        -------
+        query : str
+            the cached graphQL document of the mutation.
+        """
+        name = self.field[0].upper() + self.field[1:]
+        return build_query(name, {None: self}, minimal)[0]
+
+    def get_signature(self, minimal=False):
+        """get what defines the graphQL document of the mutation.
+
+        Parameters
+        ----------
+        minimal : bool, optional
+            whether to use the minimal selection set, default is False.
+
+        Returns
+        -------
+        signature : tuple
+            the field, arguments, selection set and errors key of the mutation,
+            operations with the same signature share the same document.
+        """
+        selection = self.selection
+        if minimal and self.minimal_selection is not None:
+            selection = self.minimal_selection
+        return (self.field, tuple(self.arguments.items()), selection,
+                self.errors_key)
+
+    def get_variables(self, alias=None):
+        """get the variables of the mutation prefixed as in `render_field`."""
+        prefix = "" if alias is None else alias + "_"
+        return {prefix + name: value for name, value in self.variables.items()}
+
+    def get_files(self, alias=None):
+        """get the files of the mutation with paths prefixed as in `render_field`."""
+        prefix = "" if alias is None else alias + "_"
+        return {prefix + path: file_path for path, file_path in self.files.items()}
+
+    def parse(self, response):
+        """extract the result of the mutation from the graphQL `response`.
+
+        Parameters
+        ----------
+        response : dict
+            the parsed JSON graphQL response.
+
+        Returns
+        -------
+        result : object
+            the value found in the mutation payload at `result_path`.
+
+        Raises
+        ------
+        Exception
+            when the errors of the payload is not an empty list.
+        """
+        return self.parse_payload(response["data"][self.field])
+
+    def parse_payload(self, payload):
+        """extract the result of the mutation from its `payload`.
+
+        Parameters
+        ----------
+        payload : dict
+            the value of the mutation field in the graphQL response data.
+
+        Returns
+        -------
+        result : object
+            the value found in the `payload` at `result_path`.
+
+        Raises
+        ------
+        Exception
+            when the errors of the payload is not an empty list.
+        """
+        if self.errors_key is not None:
+            handle_errors(payload[self.errors_key])
+
+        result = payload
+        for key in self.result_path:
+            result = result[key]
+        return result
+
+
+def render_field(alias, field, arguments, selection, errors_key):
+    """Render a mutation field and the definitions of its variables.
+
+    Parameters
+    ----------
+    alias : str
+        alias of the field in the document, the variables are then prefixed
+        with it so that several mutations can live in the same document. None
+        to render the field without alias.
+    field, arguments, selection, errors_key
+        the signature of the mutation, see `Operation.get_signature`.
+
+    Returns
+    -------
+    definitions : list
+        the definition of each variable used by the field.
+    field : str
+        the mutation field with its selection set.
+    """
+    prefix = "" if alias is None else alias + "_"
+    definitions = [
+        "${}{}: {}".format(prefix, name, type_) for name, type_ in arguments]
+    arguments = ", ".join(
+        "{0}: ${1}{0}".format(name, prefix) for name, _ in arguments)
+    if errors_key is not None:
+        selection = "{} {} {{ {} }}".format(selection, errors_key, ERRORS_SELECTION)
+    if alias is not None:
+        field = "{}: {}".format(alias, field)
+
+    return definitions, FIELD_TEMPLATE.format(
+        field=field, arguments=arguments, selection=selection)
+
+
+@lru_cache(maxsize=1024)
+def render_document(name, aliased_signatures):
+    """Render a mutation document, cached by shape.
+
+    Parameters
+    ----------
+    name : str
+        name of the graphQL operation.
+    aliased_signatures : tuple
+        the alias and signature of each mutation of the document.
+
+    Returns
+    -------
+    query : str
+        the compacted graphQL document.
+    """
+    definitions, fields = [], []
+    for alias, signature in aliased_signatures:
+        field_definitions, field = render_field(alias, *signature)
+        definitions.extend(field_definitions)
+        fields.append(field)
+
+    return compact_query("mutation {}({}) {{ {} }}".format(
+        name, ", ".join(definitions), " ".join(fields)))
+
+
+def build_query(name, aliased_operations, minimal=False):
+    """Build a single graphQL document sending several mutations.
+
+    Parameters
+    ----------
+    name : str
+        name of the graphQL operation.
+    aliased_operations : dict
+        the `Operation` to send by alias, a single operation can be sent
+        without alias using None as key.
+    minimal : bool, optional
+        whether to use the minimal selection set of the operations, default
+        is False.
+
+    Returns
+    -------
+    query : str
+        docstring representing the graphQL query.
+    variables : dict
+        the variables of all the mutations.
+    files : dict
+        the files to upload of all the mutations.
+    """
+    aliased_signatures, variables, files = [], {}, {}
+    for alias, operation in aliased_operations.items():
+        aliased_signatures.append((alias, operation.get_signature(minimal)))
+        variables.update(operation.get_variables(alias))
+        files.update(operation.get_files(alias))
+
+    query = render_document(name, tuple(aliased_signatures))
+    return query, variables, files
+
+
+@lru_cache(maxsize=None)
+def build_connection_query(field, selection, filter_type=None):
+    """Build a query reading a page of a Relay connection.
+
+    Parameters
+    ----------
+    field : str
+        name of the connection field e.g. `categories`.
+    selection : str
+        selection set of each node of the connection.
+    filter_type : str, optional
+        graphQL type of the `filter` argument of the connection e.g.
+        `CategoryFilterInput`, by default None (the query can't filter).
+
+    Returns
+    -------
+    query : str
+        docstring representing the graphQL query, its variables are `first`
+        (the page size), `after` (the cursor of the previous page) and
+        `filter` when `filter_type` is given.
+    """
+    filter_variable = filter_argument = ""
+    if filter_type is not None:
+        filter_variable = ", $filter: {}".format(filter_type)
+        filter_argument = ", filter: $filter"
+    return compact_query(CONNECTION_TEMPLATE.format(
+        name=field[0].upper() + field[1:], field=field, selection=selection,
+        filter_variable=filter_variable, filter_argument=filter_argument))
+
+
+def build_update(field, input_type, result_field, errors_key, id, kwargs):
+    """build an update mutation e.g. `productUpdate`, its result being the id."""
+    return Operation(
+        field, {"id": "ID!", "input": input_type}, {"id": id, "input": kwargs},
+        "{} {{ id }}".format(result_field), errors_key, (result_field, "id"))
+
+
+def build_delete(field, result_field, errors_key, id):
+    """build a delete mutation e.g. `productDelete`, its result being the id."""
+    return Operation(
+        field, {"id": "ID!"}, {"id": id}, "{} {{ id }}".format(result_field),
+        errors_key, (result_field, "id"))
+
+
+def update_shop_settings(**kwargs):
+    """build the `shopSettingsUpdate` mutation."""
+    return Operation(
+        "shopSettingsUpdate", {"input": "ShopSettingsInput!"}, {"input": kwargs},
+        """shop {
+            headerText
+            description
+            includeTaxesInPrices
+            displayGrossPrices
+            chargeTaxesOnShipping
+            trackInventoryByDefault
+            defaultWeightUnit
+            automaticFulfillmentDigitalProducts
+            defaultDigitalMaxDownloads
+            defaultDigitalUrlValidDays
+            defaultMailSenderName
+            defaultMailSenderAddress
+            customerSetPasswordUrl
+        }""",
+        "shopErrors", ("shop",), minimal_selection="shop { __typename }")
+
+
+def update_shop_domain(**kwargs):
+    """build the `shopDomainUpdate` mutation."""
+    return Operation(
+        "shopDomainUpdate", {"input": "SiteDomainInput!"}, {"input": kwargs},
+        """shop {
+            domain {
+                host
+                sslEnabled
+                url
+            }
+        }""",
+        "shopErrors", ("shop", "domain"),
+        minimal_selection="shop { domain { host } }")
+
+
+def update_shop_address(**kwargs):
+    """build the `shopAddressUpdate` mutation."""
+    return Operation(
+        "shopAddressUpdate", {"input": "AddressInput!"}, {"input": kwargs},
+        """shop {
+            companyAddress {
+                id
+                firstName
+                lastName
+                companyName
+                streetAddress1
+                streetAddress2
+                city
+                cityArea
+                postalCode
+                country {
+                    code
+                    country
+                }
+                countryArea
+                phone
+                isDefaultShippingAddress
+                isDefaultBillingAddress
+            }
+        }""",
+        "shopErrors", ("shop", "companyAddress"),
+        minimal_selection="shop { companyAddress { id } }")
+
+
+def create_warehouse(**kwargs):
+    """build the `createWarehouse` mutation."""
+    default_kwargs = {
+        "companyName": "The Fake Company",
+        "email": "fake@example.com",
+        "name": "fake warehouse",
+        "address": {
+            "streetAddress1": "a fake street adress",
+            "city": "Fake City",
+            "postalCode": "1024",
+            "country": "CH"
+        }
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "createWarehouse", {"input": "WarehouseCreateInput!"},
+        {"input": default_kwargs}, "warehouse { id }", "warehouseErrors",
+        ("warehouse", "id"))
+
+
+def update_warehouse(warehouse_id, **kwargs):
+    """build the `updateWarehouse` mutation."""
+    return build_update(
+        "updateWarehouse", "WarehouseUpdateInput!", "warehouse",
+        "warehouseErrors", warehouse_id, kwargs)
+
+
+def delete_warehouse(warehouse_id):
+    """build the `deleteWarehouse` mutation."""
+    return build_delete(
+        "deleteWarehouse", "warehouse", "warehouseErrors", warehouse_id)
+
+
+def create_shipping_zone(**kwargs):
+    """build the `shippingZoneCreate` mutation."""
+    default_kwargs = {
+        "name": "CH",
+        "countries": [
+            "CH"
+        ],
+        "default": False,
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "shippingZoneCreate", {"input": "ShippingZoneCreateInput!"},
+        {"input": default_kwargs}, "shippingZone { id }", "shippingErrors",
+        ("shippingZone", "id"))
+
+
+def update_shipping_zone(shipping_zone_id, **kwargs):
+    """build the `shippingZoneUpdate` mutation."""
+    return build_update(
+        "shippingZoneUpdate", "ShippingZoneUpdateInput!", "shippingZone",
+        "shippingErrors", shipping_zone_id, kwargs)
+
+
+def delete_shipping_zone(shipping_zone_id):
+    """build the `shippingZoneDelete` mutation."""
+    return build_delete(
+        "shippingZoneDelete", "shippingZone", "shippingErrors", shipping_zone_id)
+
+
+def create_attribute(**kwargs):
+    """build the `attributeCreate` mutation."""
+    default_kwargs = {
+        "inputType": "DROPDOWN",
+        "name": "default"
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "attributeCreate", {"input": "AttributeCreateInput!"},
+        {"input": default_kwargs}, "attribute { id }", "productErrors",
+        ("attribute", "id"))
+
+
+def update_attribute(attribute_id, **kwargs):
+    """build the `attributeUpdate` mutation."""
+    return build_update(
+        "attributeUpdate", "AttributeUpdateInput!", "attribute",
+        "productErrors", attribute_id, kwargs)
+
+
+def delete_attribute(attribute_id):
+    """build the `attributeDelete` mutation."""
+    return build_delete(
+        "attributeDelete", "attribute", "productErrors", attribute_id)
+
+
+def create_attribute_value(attribute_id, **kwargs):
+    """build the `attributeValueCreate` mutation."""
+    default_kwargs = {
+        "name": "default"
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "attributeValueCreate",
+        {"input": "AttributeValueCreateInput!", "attribute": "ID!"},
+        {"input": default_kwargs, "attribute": attribute_id},
+        "attributeValue { id }", "productErrors", ("attributeValue", "id"))
+
+
+def update_attribute_value(attribute_value_id, **kwargs):
+    """build the `attributeValueUpdate` mutation."""
+    return build_update(
+        "attributeValueUpdate", "AttributeValueCreateInput!", "attributeValue",
+        "productErrors", attribute_value_id, kwargs)
+
+
+def delete_attribute_value(attribute_value_id):
+    """build the `attributeValueDelete` mutation."""
+    return build_delete(
+        "attributeValueDelete", "attributeValue", "productErrors", attribute_value_id)
+
+
+def create_product_type(**kwargs):
+    """build the `productTypeCreate` mutation."""
+    default_kwargs = {
+        "name": "default",
+        "hasVariants": False,
+        "productAttributes": [],
+        "variantAttributes": [],
+        "isDigital": "false",
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "productTypeCreate", {"input": "ProductTypeInput!"},
+        {"input": default_kwargs}, "productType { id }", "productErrors",
+        ("productType", "id"))
+
+
+def update_product_type(product_type_id, **kwargs):
+    """build the `productTypeUpdate` mutation."""
+    return build_update(
+        "productTypeUpdate", "ProductTypeInput!", "productType",
+        "productErrors", product_type_id, kwargs)
+
+
+def delete_product_type(product_type_id):
+    """build the `productTypeDelete` mutation."""
+    return build_delete(
+        "productTypeDelete", "productType", "productErrors", product_type_id)
+
+
+def create_category(**kwargs):
+    """build the `categoryCreate` mutation."""
+    default_kwargs = {
+        "name": "default"
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "categoryCreate", {"input": "CategoryInput!"},
+        {"input": default_kwargs}, "category { id }", "productErrors",
+        ("category", "id"))
+
+
+def update_category(category_id, **kwargs):
+    """build the `categoryUpdate` mutation."""
+    return build_update(
+        "categoryUpdate", "CategoryInput!", "category",
+        "productErrors", category_id, kwargs)
+
+
+def delete_category(category_id):
+    """build the `categoryDelete` mutation."""
+    return build_delete(
+        "categoryDelete", "category", "productErrors", category_id)
+
+
+def create_product(product_type_id, **kwargs):
+    """build the `productCreate` mutation."""
+    default_kwargs = {
+        "name": "default",
+        "description": "default",
+        "productType": product_type_id,
+        "basePrice": 0.0,
+        "sku": "default"
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "productCreate", {"input": "ProductCreateInput!"},
+        {"input": default_kwargs}, "product { id }", "productErrors",
+        ("product", "id"))
+
+
+def update_product(product_id, **kwargs):
+    """build the `productUpdate` mutation."""
+    return build_update(
+        "productUpdate", "ProductInput!", "product",
+        "productErrors", product_id, kwargs)
+
+
+def delete_product(product_id):
+    """build the `productDelete` mutation."""
+    return build_delete(
+        "productDelete", "product", "productErrors", product_id)
+
+
+def create_product_variant(product_id, **kwargs):
+    """build the `productVariantCreate` mutation."""
+    default_kwargs = {
+        "product": product_id,
+        "sku": "0",
+        "attributes": []
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "productVariantCreate", {"input": "ProductVariantCreateInput!"},
+        {"input": default_kwargs}, "productVariant { id }", "productErrors",
+        ("productVariant", "id"))
+
+
+def update_product_variant(variant_id, **kwargs):
+    """build the `productVariantUpdate` mutation."""
+    return build_update(
+        "productVariantUpdate", "ProductVariantInput!", "productVariant",
+        "productErrors", variant_id, kwargs)
+
+
+def delete_product_variant(variant_id):
+    """build the `productVariantDelete` mutation."""
+    return build_delete(
+        "productVariantDelete", "productVariant", "productErrors", variant_id)
+
+
+def create_product_image(product_id, file_path):
+    """build the `productImageCreate` mutation uploading `file_path`."""
+    return Operation(
+        "productImageCreate", {"input": "ProductImageCreateInput!"},
+        {"input": {"product": product_id, "image": None, "alt": ""}},
+        "image { id }", "productErrors", ("image", "id"),
+        files={"input.image": file_path})
+
+
+def update_product_image(image_id, **kwargs):
+    """build the `productImageUpdate` mutation."""
+    return build_update(
+        "productImageUpdate", "ProductImageUpdateInput!", "image",
+        "productErrors", image_id, kwargs)
+
+
+def delete_product_image(image_id):
+    """build the `productImageDelete` mutation."""
+    return build_delete(
+        "productImageDelete", "image", "productErrors", image_id)
+
+
+def create_customer_account(**kwargs):
+    """build the `customerCreate` mutation."""
+    default_kwargs = {
+        "firstName": "default",
+        "lastName": "default",
+        "email": "default@default.com",
+        "isActive": False,
+    }
+
+    override_dict(default_kwargs, kwargs)
+
+    return Operation(
+        "customerCreate", {"input": "UserCreateInput!"},
+        {"input": default_kwargs}, "user { id }", "accountErrors",
+        ("user", "id"))
+
+
+def update_customer_account(customer_id, **kwargs):
+    """build the `customerUpdate` mutation."""
+    return build_update(
+        "customerUpdate", "CustomerInput!", "user",
+        "accountErrors", customer_id, kwargs)
+
+
+def delete_customer_account(customer_id):
+    """build the `customerDelete` mutation."""
+    return build_delete(
+        "customerDelete", "user", "accountErrors", customer_id)
+
+
+def update_private_meta(item_id, input_list):
+    """build the `updatePrivateMetadata` mutation."""
+    return Operation(
+        "updatePrivateMetadata", {"id": "ID!", "input": "[MetadataInput!]!"},
+        {"id": item_id, "input": input_list},
+        """item {
+            privateMetadata {
+                key
+                value
+            }
+        }""",
+        None, ("item", "privateMetadata"),
+        minimal_selection="item { privateMetadata { key } }")
+
+
+def update_metadata(item_id, input_list):
+    """build the `updateMetadata` mutation."""
+    return Operation(
+        "updateMetadata", {"id": "ID!", "input": "[MetadataInput!]!"},
+        {"id": item_id, "input": input_list},
+        """item {
+            metadata {
+                key
+                value
+            }
+        }""",
+        None, ("item", "metadata"),
+        minimal_selection="item { metadata { key } }")
+
+
+def bulk_create_product_variants(product_id, variants):
+    """build the `productVariantBulkCreate` mutation.
+
+    Notes
+    -----
+    The errors are not checked as they need to be mapped back to the index of
+    the variant in error, the result is the whole payload.
+    """
+    default_variants = []
+    for variant in variants:
+        default_kwargs = {
+            "attributes": []
+        }
+        override_dict(default_kwargs, variant)
+        default_variants.append(default_kwargs)
+
+    return Operation(
+        "productVariantBulkCreate",
+        {"product": "ID!", "variants": "[ProductVariantBulkCreateInput]!"},
+        {"product": product_id, "variants": default_variants},
+        "count productVariants { id } " + BULK_ERRORS_SELECTION,
+        None, ())
+
+
+BULK_DELETE_MUTATIONS = {
+    "shipping_zone": ("shippingZoneBulkDelete", "shippingErrors"),
+    "attribute": ("attributeBulkDelete", "productErrors"),
+    "attribute_value": ("attributeValueBulkDelete", "productErrors"),
+    "product_type": ("productTypeBulkDelete", "productErrors"),
+    "category": ("categoryBulkDelete", "productErrors"),
+    "product": ("productBulkDelete", "productErrors"),
+    "product_variant": ("productVariantBulkDelete", "productErrors"),
+    "product_image": ("productImageBulkDelete", "productErrors"),
+    "customer_account": ("customerBulkDelete", "accountErrors"),
+}
+
+
+def bulk_delete(field, ids, errors_key="productErrors"):
+    """build a bulk delete mutation e.g. `productBulkDelete`."""
+    return Operation(
+        field, {"ids": "[ID]!"}, {"ids": ids}, "count", errors_key, ("count",))
@@ -0,0 +1,280 @@
+"""Module to stream rows from CSV/JSONL files into Saleor.
+
+Notes
+-----
+Each row describes one entity to create:
+
+- `entity` is the name of the entity e.g. `category`, `product_type`,
+  `product`, `product_variant` or `product_image`, the row is loaded by the
+  corresponding `ETLDataLoader.create_<entity>` method.
+- `key` is an optional external key identifying the entity in the source.
+- every other field is a keyword argument of the `create_<entity>` method.
+  A string value `@<key>` is replaced by the id of the entity created from
+  the row with that key, e.g. `{"entity": "product", "product_type_id":
+  "@tshirt", "name": "a t-shirt"}`. A value starting with `@@` is kept as is
+  without its first `@`.
+
+In CSV files empty cells are ignored and dotted columns are nested, e.g. the
+columns `address.city` and `address.country` give the `address` argument of a
+warehouse.
+
+The rows are read, loaded and their result written one at a time so memory
+stays constant whatever the size of the input, only the ids of the keyed
+entities are kept to resolve the references.
+
+When a `journal.Journal` is provided each row created is recorded in it by
+key, or by position for the rows without key, and the rows already recorded
+are skipped. A failed load can then be resumed by running it again with the
+same journal.
+"""
+import csv
+import json
+from pathlib import Path
+
+REFERENCE_PREFIX = "@"
+
+
+def read_rows(path):
+    """Read the rows of a CSV or JSONL file lazily.
+
+    Parameters
+    ----------
+    path : str
+        path of the file, `.csv` files are read as CSV any other file as JSON
+        lines.
+
+    Yields
+    ------
+    row : dict
+        a row of the file.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if Path(path).suffix.lower() == ".csv":
+            for row in csv.DictReader(f):
+                yield nest_row(row)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def nest_row(row):
+    """Nest the dotted keys of a flat CSV `row` and drop its empty values.
+
+    Parameters
+    ----------
+    row : dict
+        a row read from a CSV file.
+
+    Returns
+    -------
+    row : dict
+        the row with `{"a.b": value}` turned into `{"a": {"b": value}}`.
+    """
+    nested = {}
+    for column, value in row.items():
+        if value is None or value == "":
+            continue
+        *parents, name = column.split(".")
+        target = nested
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = value
+    return nested
+
+
+def resolve_references(value, ids):
+    """Replace the `@<key>` references found in `value` by their id.
+
+    Parameters
+    ----------
+    value : object
+        a value of a row, dict and list are resolved recursively.
+    ids : dict
+        the id of each entity created by external key.
+
+    Returns
+    -------
+    value : object
+        the value with its references resolved.
+
+    Raises
+    ------
+    Exception
+        when a reference is not a key of `ids`.
+    """
+    if isinstance(value, dict):
+        return {k: resolve_references(v, ids) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [resolve_references(v, ids) for v in value]
+    elif isinstance(value, str) and value.startswith(REFERENCE_PREFIX):
+        if value.startswith(REFERENCE_PREFIX * 2):
+            return value[1:]
+        key = value[1:]
+        if key not in ids:
+            raise Exception("unknown reference '{}'.".format(value))
+        return ids[key]
+    return value
+
+
+def find_references(value):
+    """Find the keys referenced in `value`.
+
+    Parameters
+    ----------
+    value : object
+        a value of a row, dict and list are searched recursively.
+
+    Yields
+    ------
+    key : str
+        the key of each `@<key>` reference.
+    """
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from find_references(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from find_references(v)
+    elif (isinstance(value, str) and value.startswith(REFERENCE_PREFIX)
+          and not value.startswith(REFERENCE_PREFIX * 2)):
+        yield value[1:]
+
+
+def prepare_row(loader, row, ids):
+    """Get the loader method and arguments creating the entity of a `row`.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to create the entity.
+    row : dict
+        the row describing the entity, see the module notes.
+    ids : dict
+        the id of each entity created by external key, used to resolve the
+        references of the row.
+
+    Returns
+    -------
+    method : callable
+        the `create_<entity>` method of the loader.
+    kwargs : dict
+        the keyword arguments of `method` with their references resolved.
+
+    Raises
+    ------
+    Exception
+        when the entity is unknown or a reference can't be resolved.
+    """
+    kwargs = dict(row)
+    entity = kwargs.pop("entity", None)
+    kwargs.pop("key", None)
+    method = getattr(loader, "create_{}".format(entity), None)
+    if entity is None or method is None:
+        raise Exception("unknown entity '{}'.".format(entity))
+
+    return method, resolve_references(kwargs, ids)
+
+
+def load_row(loader, row, ids):
+    """Load a single `row` with the `loader`.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to create the entity.
+    row : dict
+        the row describing the entity, see the module notes.
+    ids : dict
+        the id of each entity created by external key, used to resolve the
+        references of the row.
+
+    Returns
+    -------
+    id : str
+        the id of the entity created.
+
+    Raises
+    ------
+    Exception
+        when the entity is unknown, a reference can't be resolved or the
+        creation failed.
+    """
+    method, kwargs = prepare_row(loader, row, ids)
+    return method(**kwargs)
+
+
+def get_journal_key(row, index):
+    """Get the key recording the `row` at `index` of the input in a journal.
+
+    Returns
+    -------
+    key : str
+        the key of the row, `#<index>` for the rows without key.
+    """
+    key = row.get("key")
+    return "#{}".format(index) if key is None else key
+
+
+def run_pipeline(loader, rows, output=None, ids=None, journal=None):
+    """Load the `rows` one by one, writing their result as they are loaded.
+
+    Notes
+    -----
+    A failing row doesn't stop the pipeline, its error is written to
+    `output` and the rows referencing it fail in turn.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to create the entities.
+    rows : iterable
+        the rows to load, see the module notes, e.g. from `read_rows`.
+    output : file, optional
+        a text file in which a JSON line is written for each row with its
+        `entity`, `key` and either the `id` created or the `error`.
+    ids : dict, optional
+        the id of the entities already created by external key, updated with
+        the entities created by the pipeline.
+    journal : journal.Journal, optional
+        the journal recording the rows created, the rows already recorded are
+        skipped and written to `output` with `"skipped": true`.
+
+    Returns
+    -------
+    stats : dict
+        the number of rows `created`, `failed` and `skipped`.
+    """
+    if ids is None:
+        ids = {}
+    if journal is not None:
+        ids.update(journal.ids())
+
+    stats = {"created": 0, "failed": 0, "skipped": 0}
+    for index, row in enumerate(rows):
+        result = {"entity": row.get("entity"), "key": row.get("key")}
+        journal_key = get_journal_key(row, index)
+        recorded_id = None if journal is None else journal.get(journal_key)
+        if recorded_id is not None:
+            result.update(id=recorded_id, skipped=True)
+            stats["skipped"] += 1
+            if output is not None:
+                output.write(json.dumps(result) + "\n")
+            continue
+
+        try:
+            result["id"] = load_row(loader, row, ids)
+        except Exception as error:
+            result["error"] = str(error)
+            stats["failed"] += 1
+        else:
+            if result["key"] is not None:
+                ids[result["key"]] = result["id"]
+            if journal is not None:
+                journal.record(journal_key, result["entity"], result["id"])
+            stats["created"] += 1
+
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+
+    return stats
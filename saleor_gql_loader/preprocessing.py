@@ -0,0 +1,204 @@
+"""Module to shrink product images before uploading them.
+
+Notes
+-----
+Saleor generates its own thumbnails from the uploaded images, sending originals
+of several megabytes wastes bandwidth and server time. An `ImagePreprocessor`
+given to the loader resizes each image to a maximum dimension and recompresses
+it in a pool of processes before it is uploaded. The processed images are
+cached on disk by content hash so that running the load again reuses them,
+the images that don't shrink are recorded by an empty marker file so that they
+are not processed again either.
+
+It requires `Pillow` which can be installed with the `images` extra:
+
+```bash
+pip install saleor-gql-loader[images]
+```
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import hash_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "saleor-gql-loader-images")
+
+ORIGINAL_MARKER_SUFFIX = ".original"
+
+
+def process_image(file_path, output_path, max_size, quality):
+    """Resize an image to fit in `max_size` and recompress it.
+
+    Notes
+    -----
+    The image keeps its format and is rotated according to its EXIF
+    orientation. When the processed image is not smaller than the original, the
+    original is kept. The output is written atomically so that a cached image
+    is never read half written.
+
+    Parameters
+    ----------
+    file_path : str
+        path of the image to process.
+    output_path : str
+        path where the processed image is written.
+    max_size : int
+        maximum width and height of the processed image in pixels.
+    quality : int
+        quality of the lossy formats (JPEG, WebP) from 1 to 95.
+
+    Returns
+    -------
+    path : str
+        `output_path`, or `file_path` when processing does not shrink the image.
+        The original is then recorded by an empty file named after
+        `output_path` and `ORIGINAL_MARKER_SUFFIX`.
+    """
+    with Image.open(file_path) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        tmp_path = "{}.{}.tmp".format(output_path, os.getpid())
+        options = {"optimize": True}
+        if image_format in ("JPEG", "WEBP"):
+            options["quality"] = quality
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+        image.save(tmp_path, format=image_format, **options)
+
+    if os.path.getsize(tmp_path) >= os.path.getsize(file_path):
+        os.remove(tmp_path)
+        open(output_path + ORIGINAL_MARKER_SUFFIX, "w").close()
+        return file_path
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class ImagePreprocessor:
+    """resize and recompress images in a pool of processes, caching the results.
+
+    Notes
+    -----
+    The preprocessor can be given to the loader to process every image before
+    it is uploaded, including the images uploaded by an `ImageUploader` or by a
+    pipeline:
+
+    ```python
+    with ImagePreprocessor(max_size=2000, quality=85) as preprocessor:
+        etl_data_loader = ETLDataLoader(auth_token, image_preprocessor=preprocessor)
+        image_id = etl_data_loader.create_product_image(product_id, "tshirt.jpg")
+    ```
+
+    `preprocess` can be called from many threads at once, the images are then
+    processed in parallel by the pool of processes.
+
+    Attributes
+    ----------
+    max_size : int
+        maximum width and height of the processed images in pixels.
+    quality : int
+        quality of the lossy formats (JPEG, WebP) from 1 to 95.
+    cache_dir : str
+        directory where the processed images are cached.
+    max_workers : int
+        number of processes, None for the number of processors.
+    """
+
+    def __init__(self, max_size=2048, quality=85, cache_dir=DEFAULT_CACHE_DIR,
+                 max_workers=None):
+        """initialize the `ImagePreprocessor`.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            maximum width and height of the processed images, by default 2048.
+        quality : int, optional
+            quality of the lossy formats, by default 85.
+        cache_dir : str, optional
+            directory where the processed images are cached, by default a
+            directory of the system temporary directory.
+        max_workers : int, optional
+            number of processes, by default the number of processors.
+
+        Raises
+        ------
+        ImportError
+            when Pillow is not installed.
+        """
+        if Image is None:
+            raise ImportError(
+                "ImagePreprocessor requires Pillow, install it with "
+                "`pip install saleor-gql-loader[images]`.")
+
+        self.max_size = max_size
+        self.quality = quality
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """stop the pool of processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def get_cache_path(self, file_path):
+        """get the path of the processed image in the cache.
+
+        Parameters
+        ----------
+        file_path : str
+            path of the image to process.
+
+        Returns
+        -------
+        path : str
+            the cache path, named after the image content hash and the
+            processing parameters.
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        return os.path.join(self.cache_dir, "{}-{}-{}{}".format(
+            hash_file(file_path), self.max_size, self.quality, extension))
+
+    def preprocess(self, file_path):
+        """process an image, or get it from the cache.
+
+        Parameters
+        ----------
+        file_path : str
+            path of the image to process.
+
+        Returns
+        -------
+        path : str
+            the path of the image to upload in place of `file_path`.
+        """
+        cache_path = self.get_cache_path(file_path)
+        if os.path.exists(cache_path):
+            return cache_path
+        if os.path.exists(cache_path + ORIGINAL_MARKER_SUFFIX):
+            return file_path
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            future = self._executor.submit(
+                process_image, file_path, cache_path, self.max_size, self.quality)
+        return future.result()
@@ -0,0 +1,168 @@
+"""Module to get or create entities without duplicating the existing ones.
+
+Notes
+-----
+`IdResolver` wraps an `ETLDataLoader` so that creating a category, an
+attribute, a product type or a product first looks for an existing entity in
+a local index: categories, attributes and product types by slug (or name when
+no slug is given) and products by SKU. The index is warmed with a few
+paginated queries listing the existing entities, after which each lookup is
+resolved locally instead of sending a query per entity.
+"""
+import threading
+from collections import defaultdict
+
+from .bulk import run_bulk
+
+INDEXED_ENTITIES = {
+    "category": ("categories", "id name slug"),
+    "attribute": ("attributes", "id name slug"),
+    "product_type": ("productTypes", "id name slug"),
+    "product": ("productVariants", "sku product { id }"),
+}
+
+
+class IdResolver:
+    """loader getting the existing entities from a local index before creating them.
+
+    Notes
+    -----
+    The resolver exposes every method of the wrapped loader, `create_category`,
+    `create_attribute`, `create_product_type` and `create_product` returning
+    the id of the existing entity when found. It can be used in place of the
+    loader anywhere e.g. in `run_pipeline`:
+
+    ```python
+    resolver = IdResolver(etl_data_loader)
+    resolver.warm()
+    category_id = resolver.create_category(name="Shirts")  # created
+    category_id = resolver.create_category(name="Shirts")  # found in the index
+    ```
+
+    The resolver can be shared between threads: concurrent calls for the same
+    entity create it only once. Mutations queued in a `batch` are not resolved.
+
+    Attributes
+    ----------
+    loader : ETLDataLoader
+        the loader used to read and create the entities.
+    index : dict
+        the id of each known entity by lookup key, by entity name.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.index = {entity: {} for entity in INDEXED_ENTITIES}
+        self._lock = threading.Lock()
+        self._key_locks = defaultdict(threading.Lock)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def warm(self, entities=tuple(INDEXED_ENTITIES), page_size=100):
+        """fill the index with the existing entities.
+
+        Parameters
+        ----------
+        entities : iterable, optional
+            the entities to index among "category", "attribute",
+            "product_type" and "product", by default all of them.
+        page_size : int, optional
+            number of entities read per query, by default 100.
+
+        Returns
+        -------
+        resolver : IdResolver
+            the resolver itself, to chain calls.
+        """
+        for entity in entities:
+            field, selection = INDEXED_ENTITIES[entity]
+            for node in self.loader._iter_connection(field, selection, page_size):
+                if entity == "product":
+                    self._register(entity, ("sku", node["sku"]), node["product"]["id"])
+                else:
+                    self._register(entity, ("slug", node["slug"]), node["id"])
+                    self._register(entity, ("name", node["name"]), node["id"])
+        return self
+
+    def get(self, entity, **kwargs):
+        """get the id of an existing entity from the index.
+
+        Parameters
+        ----------
+        entity : str
+            the entity to look for e.g. "category".
+        **kwargs : dict
+            the arguments the entity would be created with.
+
+        Returns
+        -------
+        id : str
+            the id of the entity, None if not found.
+        """
+        lookup = self._get_lookup(entity, kwargs)
+        if lookup is None:
+            return None
+        with self._lock:
+            return self.index[entity].get(lookup)
+
+    def create_category(self, **kwargs):
+        """get or create a category, see `ETLDataLoader.create_category`."""
+        return self._get_or_create("category", self.loader.create_category, kwargs)
+
+    def create_attribute(self, **kwargs):
+        """get or create an attribute, see `ETLDataLoader.create_attribute`."""
+        return self._get_or_create("attribute", self.loader.create_attribute, kwargs)
+
+    def create_product_type(self, **kwargs):
+        """get or create a product type, see `ETLDataLoader.create_product_type`."""
+        return self._get_or_create(
+            "product_type", self.loader.create_product_type, kwargs)
+
+    def create_product(self, product_type_id, **kwargs):
+        """get or create a product by SKU, see `ETLDataLoader.create_product`."""
+        kwargs["product_type_id"] = product_type_id
+        return self._get_or_create("product", self.loader.create_product, kwargs)
+
+    def bulk(self, method, items, max_workers=None):
+        """call a resolver `method` concurrently, see `ETLDataLoader.bulk`."""
+        if max_workers is None:
+            max_workers = self.loader.pool_size
+        return run_bulk(getattr(self, method), items, max_workers)
+
+    def create_products_bulk(self, items, max_workers=None):
+        """get or create many products concurrently, see `bulk` and `create_product`."""
+        return self.bulk("create_product", items, max_workers)
+
+    def _get_lookup(self, entity, kwargs):
+        """get the index key of an entity from its creation arguments."""
+        if entity == "product":
+            return ("sku", kwargs["sku"]) if "sku" in kwargs else None
+        elif "slug" in kwargs:
+            return ("slug", kwargs["slug"])
+        elif "name" in kwargs:
+            return ("name", kwargs["name"])
+        return None
+
+    def _register(self, entity, lookup, id):
+        """add an entity to the index."""
+        with self._lock:
+            self.index[entity][lookup] = id
+
+    def _get_or_create(self, entity, method, kwargs):
+        """get the entity from the index or create it with `method`."""
+        lookup = self._get_lookup(entity, kwargs)
+        if lookup is None:
+            return method(**kwargs)
+
+        with self._lock:
+            key_lock = self._key_locks[(entity, lookup)]
+
+        with key_lock:
+            id = self.get(entity, **kwargs)
+            if id is None:
+                id = method(**kwargs)
+                self._register(entity, lookup, id)
+                if entity != "product" and lookup[0] == "slug" and "name" in kwargs:
+                    self._register(entity, ("name", kwargs["name"]), id)
+        return id
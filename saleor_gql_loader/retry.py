@@ -0,0 +1,220 @@
+"""Module to retry the queries rejected by an overloaded endpoint.
+
+Notes
+-----
+Under load Saleor (or the proxy in front of it) answers 429 Too Many Requests,
+502 Bad Gateway, 503 Service Unavailable or 504 Gateway Timeout. A
+`RetryPolicy` sends the query again after an exponential backoff with jitter,
+or after the delay asked by the `Retry-After` header. A `RateLimiter` spaces
+the queries out and adapts their rate to the endpoint: it slows down when
+queries are throttled or their latency rises and speeds up again while they
+succeed, keeping the throughput near the capacity of the endpoint.
+"""
+import random
+import threading
+import time
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def get_retry_after(headers):
+    """Get the delay asked by the `Retry-After` header of a response.
+
+    Parameters
+    ----------
+    headers : dict
+        the headers of the response.
+
+    Returns
+    -------
+    delay : float
+        seconds to wait before retrying, None when the header is missing or
+        invalid.
+    """
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class RetryPolicy:
+    """how many times and how long after a rejected query is sent again.
+
+    Notes
+    -----
+    Only the responses with a status among `statuses` are retried: the
+    endpoint did not process the query or failed before answering. Connection
+    errors are left to the `max_retries` of the session since a mutation whose
+    response was lost may have been applied.
+
+    Attributes
+    ----------
+    attempts : int
+        maximum number of times a query is sent, including the first one.
+    backoff : float
+        seconds to wait before the first retry, doubled at each retry.
+    max_backoff : float
+        maximum number of seconds to wait before a retry.
+    jitter : bool
+        whether to wait a random delay up to the backoff ("full jitter") so
+        that the clients rejected together do not retry together.
+    statuses : tuple
+        the HTTP status codes retried.
+    """
+
+    def __init__(self, attempts=5, backoff=0.5, max_backoff=30.0, jitter=True,
+                 statuses=RETRY_STATUSES):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+
+    def __repr__(self):
+        return "<RetryPolicy attempts={} backoff={}>".format(self.attempts, self.backoff)
+
+    def should_retry(self, status_code, attempt):
+        """whether a response with `status_code` to the `attempt`-th try is retried."""
+        return status_code in self.statuses and attempt < self.attempts
+
+    def get_delay(self, attempt, retry_after=None):
+        """get the seconds to wait after the `attempt`-th try of a query.
+
+        Parameters
+        ----------
+        attempt : int
+            number of times the query was sent, starting at 1.
+        retry_after : float, optional
+            delay asked by the endpoint, waited at least.
+
+        Returns
+        -------
+        delay : float
+            seconds to wait before sending the query again.
+        """
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class RateLimiter:
+    """adaptive limit of the number of queries sent per second.
+
+    Notes
+    -----
+    The rate follows an additive increase, multiplicative decrease scheme: it
+    grows by about `increase` queries per second every second while the
+    queries succeed, and is multiplied by `decrease` when a query is throttled
+    or when the average latency exceeds `latency_factor` times the lowest
+    latency seen, at most once per second (or per average latency when
+    longer). The limiter can be shared between threads.
+
+    Attributes
+    ----------
+    rate : float
+        the current number of queries allowed per second.
+    min_rate : float
+        the rate is never lowered below.
+    max_rate : float
+        the rate is never raised above, None for no limit.
+    """
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=None, increase=1.0,
+                 decrease=0.5, latency_factor=3.0):
+        """initialize the `RateLimiter`.
+
+        Parameters
+        ----------
+        rate : float, optional
+            number of queries per second allowed at first, by default 10.
+        min_rate : float, optional
+            minimum rate, by default 0.5.
+        max_rate : float, optional
+            maximum rate, by default None (no limit).
+        increase : float, optional
+            queries per second added every second of success, by default 1.
+        decrease : float, optional
+            factor applied to the rate when slowing down, by default 0.5.
+        latency_factor : float, optional
+            how many times the lowest latency the average latency may reach
+            before slowing down, by default 3.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+        self._min_latency = None
+        self._avg_latency = None
+        self._last_decrease = 0.0
+
+    def __repr__(self):
+        return "<RateLimiter rate={:.1f}/s>".format(self.rate)
+
+    def _reserve(self):
+        """reserve the next slot, return the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        return slot - now
+
+    def acquire(self):
+        """wait until a query can be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """wait until a query can be sent, without blocking the event loop."""
+        import asyncio
+
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, latency, throttled=False):
+        """adapt the rate to the outcome of a query.
+
+        Parameters
+        ----------
+        latency : float
+            seconds the query took.
+        throttled : bool, optional
+            whether the endpoint rejected the query as overloaded.
+        """
+        with self._lock:
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+            if self._avg_latency is None:
+                self._avg_latency = latency
+            else:
+                self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+            slow = self._avg_latency > self.latency_factor * self._min_latency
+            if throttled or slow:
+                # decrease at most once per period so that the responses to
+                # the queries sent at the old rate don't collapse the rate.
+                now = time.monotonic()
+                if now - self._last_decrease > max(self._avg_latency, 1.0):
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+            else:
+                self.rate += self.increase / self.rate
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
@@ -0,0 +1,161 @@
+"""Module to load a whole catalog concurrently while respecting its dependencies.
+
+Notes
+-----
+The catalog is described with the same rows as `saleor_gql_loader.pipeline`.
+The `@<key>` references of the rows define a dependency graph (a product
+depends on its product type, a variant on its product, ...): a row is loaded
+as soon as every row it references is loaded, independently of the others.
+The variants of a product are thus loaded while the next products are still
+being created instead of waiting for a whole level of the catalog.
+
+Unlike the pipeline the whole catalog is kept in memory to build the graph.
+"""
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .pipeline import find_references, prepare_row, get_journal_key
+
+
+def run_graph(loader, rows, max_workers=None, output=None, ids=None,
+              journal=None):
+    """Load the `rows` concurrently, each row once all its references are loaded.
+
+    Notes
+    -----
+    A failing row doesn't stop the others, its error is written to `output`
+    and the rows depending on it fail without being sent. Rows part of a
+    circular reference fail as well.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to create the entities.
+    rows : iterable
+        the rows describing the catalog, see `saleor_gql_loader.pipeline`.
+    max_workers : int, optional
+        number of rows loaded concurrently, by default the `pool_size` of the
+        loader.
+    output : file, optional
+        a text file in which a JSON line is written for each row, as soon as
+        it is loaded, with its `entity`, `key` and either the `id` created or
+        the `error`.
+    ids : dict, optional
+        the id of the entities already created by external key, updated with
+        the entities created.
+    journal : journal.Journal, optional
+        the journal recording the rows created, the rows already recorded are
+        skipped and written to `output` with `"skipped": true`.
+
+    Returns
+    -------
+    stats : dict
+        the number of rows `created`, `failed` and `skipped`.
+
+    Raises
+    ------
+    Exception
+        when two rows have the same key.
+    """
+    if ids is None:
+        ids = {}
+    if max_workers is None:
+        max_workers = loader.pool_size
+    if journal is not None:
+        ids.update(journal.ids())
+
+    rows = list(rows)
+    index_by_key = {}
+    for index, row in enumerate(rows):
+        key = row.get("key")
+        if key is None:
+            continue
+        if key in index_by_key:
+            raise Exception("duplicated key '{}'.".format(key))
+        index_by_key[key] = index
+
+    dependents = [[] for _ in rows]
+    remaining = [0] * len(rows)
+    for index, row in enumerate(rows):
+        arguments = {k: v for k, v in row.items() if k not in ("entity", "key")}
+        for key in set(find_references(arguments)):
+            if key in index_by_key and key not in ids:
+                dependents[index_by_key[key]].append(index)
+                remaining[index] += 1
+
+    stats = {"created": 0, "failed": 0, "skipped": 0}
+    finished = [False] * len(rows)
+    ready = deque(index for index, count in enumerate(remaining) if count == 0)
+
+    def finish(index, id=None, error=None, skipped=False):
+        """record the result of a row and release or fail its dependents."""
+        row = rows[index]
+        result = {"entity": row.get("entity"), "key": row.get("key")}
+        finished[index] = True
+        if skipped:
+            result.update(id=id, skipped=True)
+            stats["skipped"] += 1
+        elif error is None:
+            result["id"] = id
+            if result["key"] is not None:
+                ids[result["key"]] = id
+            if journal is not None:
+                journal.record(get_journal_key(row, index), result["entity"], id)
+            stats["created"] += 1
+        else:
+            result["error"] = str(error)
+            stats["failed"] += 1
+
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+
+        for dependent in dependents[index]:
+            if finished[dependent]:
+                continue
+            if error is None:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+            else:
+                finish(dependent, error=Exception(
+                    "dependency '{}' failed.".format(result["key"])))
+
+    if journal is not None:
+        for index, row in enumerate(rows):
+            recorded_id = journal.get(get_journal_key(row, index))
+            if recorded_id is not None:
+                finish(index, recorded_id, skipped=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        while ready or pending:
+            while ready:
+                index = ready.popleft()
+                if finished[index]:
+                    continue
+                try:
+                    method, kwargs = prepare_row(loader, rows[index], ids)
+                except Exception as error:
+                    finish(index, error=error)
+                    continue
+                pending[executor.submit(method, **kwargs)] = index
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    id = future.result()
+                except Exception as error:
+                    finish(index, error=error)
+                else:
+                    finish(index, id)
+
+    for index in range(len(rows)):
+        if not finished[index]:
+            finish(index, error=Exception("circular reference."))
+
+    return stats
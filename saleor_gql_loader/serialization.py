@@ -0,0 +1,146 @@
+"""Module to encode the request bodies and decode the responses as JSON.
+
+Notes
+-----
+Loading millions of small mutations makes the JSON serialization measurable.
+The serializers encode straight to bytes and decode straight from the bytes
+of the responses, skipping their decoding to str. `get_serializer` picks the
+`orjson` based serializer when it is installed, imported on first use:
+
+```bash
+pip install saleor-gql-loader[fast]
+```
+
+Decimals, dates, times, durations and UUIDs are encoded the same way by all
+the serializers, by `JSONEncoder`, in the format of Django's
+`DjangoJSONEncoder` without importing Django. A custom serializer is any
+object with the same `dumps` and `loads` methods.
+"""
+import datetime
+import json
+import sys
+from functools import lru_cache
+
+
+STRING_CLASSES = (
+    ("decimal", "Decimal"),
+    ("uuid", "UUID"),
+    ("django.utils.functional", "Promise"),
+)
+
+
+class JSONEncoder(json.JSONEncoder):
+    """JSON encoder of decimals, dates, times, durations and UUIDs.
+
+    Notes
+    -----
+    The values are encoded as by `django.core.serializers.json.DjangoJSONEncoder`:
+    datetimes and times in ISO 8601 truncated to milliseconds (UTC as `Z`),
+    durations in ISO 8601 and decimals and UUIDs as strings. Django lazy
+    translation strings are encoded as strings when Django is loaded.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            r = o.isoformat()
+            if o.microsecond:
+                r = r[:23] + r[26:]
+            if r.endswith("+00:00"):
+                r = r[:-6] + "Z"
+            return r
+        elif isinstance(o, datetime.date):
+            return o.isoformat()
+        elif isinstance(o, datetime.time):
+            if o.utcoffset() is not None:
+                raise ValueError("JSON can't represent timezone-aware times.")
+            r = o.isoformat()
+            if o.microsecond:
+                r = r[:12]
+            return r
+        elif isinstance(o, datetime.timedelta):
+            return get_duration_iso_string(o)
+        # a decimal, an UUID or a Django lazy string can only exist once its
+        # module is loaded, don't import the modules to check for them.
+        for module_name, class_name in STRING_CLASSES:
+            module = sys.modules.get(module_name)
+            if module is not None and isinstance(o, getattr(module, class_name)):
+                return str(o)
+        return super().default(o)
+
+
+def get_duration_iso_string(duration):
+    """Format a `datetime.timedelta` in ISO 8601 e.g. `P1DT02H03M04.000005S`."""
+    sign = ""
+    if duration < datetime.timedelta(0):
+        sign = "-"
+        duration *= -1
+    minutes, seconds = divmod(duration.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    microseconds = ".{:06d}".format(duration.microseconds) if duration.microseconds else ""
+    return "{}P{}DT{:02d}H{:02d}M{:02d}{}S".format(
+        sign, duration.days, hours, minutes, seconds, microseconds)
+
+
+class JSONSerializer:
+    """serializer based on the standard library `json` module."""
+
+    def __init__(self):
+        self._encoder = JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(self, obj):
+        """encode `obj` as JSON bytes."""
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        """decode JSON `data` given as bytes or str."""
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """serializer based on `orjson`, several times faster than `json`.
+
+    Raises
+    ------
+    ImportError
+        when orjson is not installed.
+    """
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            raise ImportError(
+                "OrjsonSerializer requires orjson, install it with "
+                "`pip install saleor-gql-loader[fast]`.")
+        self._orjson = orjson
+        self._default = JSONEncoder().default
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj):
+        """encode `obj` as JSON bytes."""
+        return self._orjson.dumps(obj, default=self._default, option=self._options)
+
+    def loads(self, data):
+        """decode JSON `data` given as bytes or str."""
+        return self._orjson.loads(data)
+
+
+def get_serializer():
+    """Get the fastest serializer available.
+
+    Returns
+    -------
+    serializer : JSONSerializer or OrjsonSerializer
+        the `orjson` based serializer when orjson is installed, the `json`
+        based one otherwise.
+    """
+    try:
+        return OrjsonSerializer()
+    except ImportError:
+        return JSONSerializer()
+
+
+@lru_cache(maxsize=None)
+def get_default_serializer():
+    """Get the serializer shared by the loaders, see `get_serializer`."""
+    return get_serializer()
@@ -0,0 +1,339 @@
+"""Module to split the load of a catalog file across processes and machines.
+
+Notes
+-----
+A single process saturates a core encoding and decoding JSON and mapping the
+rows long before Saleor is saturated. `run_shards` splits the rows of a file
+(see `saleor_gql_loader.pipeline`) in shards by a stable hash of their shard
+key and loads each shard in its own process, with its own loader and pool of
+connections:
+
+- the rows of the shared entities (`SHARED_ENTITIES` e.g. categories and
+  product types) are referenced by many others, they are loaded first by the
+  calling process and their ids given to every shard.
+- every other row is sharded by the shard key of the rows it references,
+  shared rows aside, or by its own key: a product, its variants and its
+  images are loaded by the same shard in the order of the file. The
+  references must thus point to rows above in the file, and all the
+  references of a row must point to rows of the same shard: a row
+  referencing rows of different shards couldn't resolve them, the file is
+  rejected before anything is loaded.
+
+To spread a load across machines each one is given the same file, the same
+`shard_count` and its own `shard_index`: the hash of a shard key picks the
+machine, then the process. Only the machine of shard 0 loads the shared
+rows, a journal is then required to give their ids to the other machines:
+load the shared rows first (see `shared_only`), then give each machine a copy
+of the journal. The other machines fail before loading anything when a shared
+row is missing from their journal.
+
+At the end the ids created, the results of the rows and the metrics of the
+shards are merged. When a journal is given each process records its shard
+in its own journal next to it, named after the shard, resuming the load
+requires the same number of shards and processes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .journal import Journal
+from .pipeline import find_references, get_journal_key, read_rows, run_pipeline
+
+SHARED_ENTITIES = (
+    "warehouse", "shipping_zone", "attribute", "attribute_value", "product_type",
+    "category",
+)
+
+
+def get_shard_hash(shard_key):
+    """Get a hash of `shard_key` stable across processes and machines.
+
+    Notes
+    -----
+    The builtin `hash` of a str is salted per process, it can't decide the
+    shard of a row.
+
+    Returns
+    -------
+    hash : int
+        a 64 bits integer.
+    """
+    digest = hashlib.sha1(shard_key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def iter_shard_keys(rows):
+    """Get the shard key of each row.
+
+    Parameters
+    ----------
+    rows : iterable
+        the rows describing the catalog, see `saleor_gql_loader.pipeline`.
+
+    Yields
+    ------
+    row : dict
+        a row.
+    shard_key : str
+        the shard key of the row, None for the rows of the shared entities.
+
+    Raises
+    ------
+    Exception
+        when a row references rows of different shard keys.
+    """
+    shard_keys = {}
+    for index, row in enumerate(rows):
+        if row.get("entity") in SHARED_ENTITIES:
+            yield row, None
+            continue
+
+        key = row.get("key")
+        arguments = {k: v for k, v in row.items() if k not in ("entity", "key")}
+        referenced = {shard_keys[reference] for reference in find_references(arguments)
+                      if reference in shard_keys}
+        if len(referenced) > 1:
+            raise Exception(
+                "the row '{}' references rows of different shards, all the "
+                "references of a row must lead to the same shard.".format(
+                    get_journal_key(row, index)))
+        shard_key = next(iter(referenced), None)
+        if shard_key is None:
+            shard_key = "#{}".format(index) if key is None else key
+        if key is not None:
+            shard_keys[key] = shard_key
+        yield row, shard_key
+
+
+def iter_shard(rows, shard_index=0, shard_count=1, process=0, processes=1):
+    """Get the rows of a shard.
+
+    Parameters
+    ----------
+    rows : iterable
+        the rows describing the catalog, see `saleor_gql_loader.pipeline`.
+    shard_index : int, optional
+        index of the machine among `shard_count`, by default 0.
+    shard_count : int, optional
+        number of machines sharing the load, by default 1.
+    process : int, optional
+        index of the process among the `processes` of the machine, by
+        default 0.
+    processes : int, optional
+        number of processes of the machine, by default 1.
+
+    Yields
+    ------
+    row : dict
+        each row of the shard, the rows of the shared entities excluded.
+    """
+    for row, shard_key in iter_shard_keys(rows):
+        if shard_key is None:
+            continue
+        remainder, machine = divmod(get_shard_hash(shard_key), shard_count)
+        if machine == shard_index and remainder % processes == process:
+            yield row
+
+
+def iter_shared(rows):
+    """Get the rows of the shared entities, see `SHARED_ENTITIES`."""
+    for row, shard_key in iter_shard_keys(rows):
+        if shard_key is None:
+            yield row
+
+
+def get_shared_ids(path, journal_path):
+    """Get the ids of the shared rows of the file at `path` from a journal.
+
+    Parameters
+    ----------
+    path : str
+        path of the CSV or JSON lines file.
+    journal_path : str
+        path of the journal in which shard 0 recorded the shared rows.
+
+    Returns
+    -------
+    ids : dict
+        the id of the entities recorded in the journal by external key.
+
+    Raises
+    ------
+    Exception
+        when a shared row is not recorded in the journal.
+    """
+    with Journal(journal_path) as journal:
+        for index, row in enumerate(iter_shared(read_rows(path))):
+            key = get_journal_key(row, index)
+            if key not in journal:
+                raise Exception(
+                    "the shared row '{}' is not in the journal, load the shared "
+                    "rows with shard 0 first and copy its journal.".format(key))
+        return journal.ids()
+
+
+def _load(create_loader, close_loader, rows, output_path, ids, journal_path, workers):
+    """load `rows` with a new loader, return the stats, the ids created and
+    the metrics of the loader."""
+    from .scheduler import run_graph
+
+    created_ids = dict(ids)
+    journal = Journal(journal_path) if journal_path else None
+    loader = create_loader()
+    try:
+        with open(output_path, "w", encoding="utf-8") as output:
+            if workers:
+                stats = run_graph(loader, rows, workers, output, created_ids, journal)
+            else:
+                stats = run_pipeline(loader, rows, output, created_ids, journal)
+    finally:
+        if close_loader is None:
+            loader.close()
+        else:
+            close_loader(loader)
+        if journal is not None:
+            journal.close()
+
+    created_ids = {k: v for k, v in created_ids.items() if ids.get(k) != v}
+    return stats, created_ids, loader.metrics
+
+
+def _load_shard(create_loader, close_loader, path, shard_index, shard_count, process, processes,
+                output_path, ids, journal_path, workers):
+    """load a shard of the file at `path` in a worker process."""
+    rows = iter_shard(read_rows(path), shard_index, shard_count, process, processes)
+    if journal_path:
+        journal_path = "{}.shard-{}-{}".format(journal_path, shard_index, process)
+    return _load(create_loader, close_loader, rows, output_path, ids, journal_path,
+                 workers)
+
+
+def run_shards(create_loader, path, processes=None, shard_index=0, shard_count=1,
+               output=None, ids=None, errors=None, journal_path=None, workers=None,
+               metrics=None, close_loader=None, shared_only=False):
+    """Load a catalog file with several processes, each loading a shard of it.
+
+    Notes
+    -----
+    ```python
+    from functools import partial
+
+    create_loader = partial(ETLDataLoader, auth_token, pool_size=20)
+    stats = run_shards(create_loader, "catalog.jsonl", processes=8, workers=20)
+    ```
+
+    Parameters
+    ----------
+    create_loader : callable
+        called without arguments in each process to create its loader, e.g.
+        a `functools.partial` of `ETLDataLoader`. It must be picklable.
+    path : str
+        path of the CSV or JSON lines file to load, read by every process. Its
+        shard keys are checked before anything is loaded.
+    processes : int, optional
+        number of processes loading the shards of this machine, by default
+        the number of CPUs.
+    shard_index : int, optional
+        index of this machine among `shard_count`, by default 0.
+    shard_count : int, optional
+        number of machines sharing the load, by default 1.
+    output : file, optional
+        a text file in which a JSON line is written for each row with its
+        `entity`, `key` and either the `id` created or the `error`, the rows
+        of each shard being written together once all are loaded.
+    ids : dict, optional
+        the id of the entities already created by external key, updated with
+        the entities created by every shard.
+    errors : list, optional
+        receives the result of each row that failed, as written to `output`.
+    journal_path : str, optional
+        path of the journal recording the shared rows created, the rows of
+        each shard are recorded in `<journal_path>.shard-<index>-<process>`.
+        It is required when `shard_count` is above 1, the shards other than
+        0 then read the shared rows from it instead of loading them.
+    workers : int, optional
+        load the rows of each shard concurrently with this number of threads
+        following their references, see `scheduler.run_graph`, by default
+        the rows are loaded one by one.
+    metrics : metrics.Metrics, optional
+        receives the metrics of the loader of every process.
+    close_loader : callable, optional
+        called with each loader once its rows are loaded, by default its
+        `close` method is called. It must be picklable.
+    shared_only : bool, optional
+        only load the shared rows, e.g. to record them in a journal copied
+        to every machine, by default False.
+
+    Returns
+    -------
+    stats : dict
+        the number of rows `created`, `failed` and `skipped` by all shards.
+
+    Raises
+    ------
+    Exception
+        when `shard_count` is above 1 without journal, when a row references
+        rows of different shards or when a shared row is missing from the
+        journal of a shard other than 0.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if ids is None:
+        ids = {}
+    if shard_count > 1 and not journal_path:
+        raise Exception("a journal is required to share the ids of the shared rows "
+                        "between machines.")
+
+    for _ in iter_shard_keys(read_rows(path)):
+        pass
+
+    directory = tempfile.mkdtemp(prefix="saleor-gql-loader-")
+    try:
+        results = []
+        output_paths = []
+        if shard_index == 0:
+            output_paths.append(os.path.join(directory, "shared.jsonl"))
+            results.append(_load(create_loader, close_loader,
+                                 iter_shared(read_rows(path)), output_paths[0], ids,
+                                 journal_path, None))
+            ids.update(results[0][1])
+        else:
+            ids.update(get_shared_ids(path, journal_path))
+
+        if not shared_only:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = []
+                for process in range(processes):
+                    output_paths.append(
+                        os.path.join(directory, "shard-{}.jsonl".format(process)))
+                    futures.append(executor.submit(
+                        _load_shard, create_loader, close_loader, path, shard_index,
+                        shard_count, process, processes, output_paths[-1], ids,
+                        journal_path, workers))
+                results.extend(future.result() for future in futures)
+
+        stats = {"created": 0, "failed": 0, "skipped": 0}
+        for shard_stats, shard_ids, shard_metrics in results:
+            for name in stats:
+                stats[name] += shard_stats[name]
+            ids.update(shard_ids)
+            if metrics is not None and shard_metrics is not None:
+                metrics.merge(shard_metrics)
+
+        for output_path in output_paths:
+            with open(output_path, encoding="utf-8") as f:
+                for line in f:
+                    if output is not None:
+                        output.write(line)
+                    if errors is not None and '"error"' in line:
+                        result = json.loads(line)
+                        if "error" in result:
+                            errors.append(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return stats
@@ -0,0 +1,396 @@
+"""Module to synchronize Saleor with a catalog file, sending only the changes.
+
+Notes
+-----
+Loading a whole catalog again every night rewrites every entity while only a
+few of them changed. `run_sync` fingerprints each row of the catalog (see
+`saleor_gql_loader.pipeline`), hashing its entity and its arguments once its
+references are resolved, and compares the fingerprint to the one recorded by
+the previous run in a local `FingerprintIndex`:
+
+- a row whose key is not in the index is created with `create_<entity>`.
+- a row whose fingerprint changed is updated with `update_<entity>`, the
+  images are deleted and uploaded again. The fingerprint of an image covers
+  the content of its file, an image replaced at the same path is changed.
+- a row whose entity changed deletes the entity recorded under its key and
+  creates the new one.
+- a row whose fingerprint didn't change is skipped without any request.
+- an entity of the index whose key is not in the catalog anymore is deleted,
+  with the bulk delete mutation of its entity when Saleor has one. The
+  entities are deleted by kind in `DELETE_ORDER`, e.g. the variants before
+  their product, and the most recently created first.
+
+Every row must have a key. A changed row whose entity has no update method
+fails, as well as a removed row whose entity has no delete method.
+
+The arguments missing from the update input of an entity are only sent on
+creation (see `CREATE_ONLY_ARGUMENTS`): the `values` of an attribute aren't
+synced, load them as `attribute_value` rows to add values to an existing
+attribute.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from itertools import groupby
+
+from . import operations
+from .bulk import iter_chunks
+from .pipeline import prepare_row
+from .serialization import JSONEncoder
+from .utils import hash_file
+
+CREATE_ONLY_ARGUMENTS = {
+    "warehouse": ("shippingZones",),
+    "attribute": ("inputType", "values"),
+    "attribute_value": ("attribute_id",),
+    "product": ("product_type_id", "stocks"),
+    "product_variant": ("product_id", "stocks"),
+    "customer_account": ("sendPasswordEmail", "redirectUrl"),
+}
+
+REPLACED_ENTITIES = ("product_image",)
+
+FILE_ARGUMENTS = {
+    "product_image": ("file_path",),
+}
+
+DELETE_ORDER = (
+    "product_image", "product_variant", "product", "customer_account",
+    "product_type", "category", "attribute_value", "attribute", "shipping_zone",
+    "warehouse",
+)
+
+
+def get_fingerprint(entity, kwargs):
+    """Get a hash of the `kwargs` creating an `entity`, stable across runs.
+
+    Parameters
+    ----------
+    entity : str
+        the name of the entity e.g. "product".
+    kwargs : dict
+        the keyword arguments of the `create_<entity>` method.
+
+    Returns
+    -------
+    fingerprint : str
+        the SHA-256 of the entity, of the arguments serialized with sorted
+        keys and of the content of the files they point to (see
+        `FILE_ARGUMENTS`), as an hexadecimal string.
+    """
+    contents = {name: hash_file(kwargs[name])
+                for name in FILE_ARGUMENTS.get(entity, ()) if kwargs.get(name)}
+    document = json.dumps([entity, kwargs, contents], cls=JSONEncoder, sort_keys=True,
+                          separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+class FingerprintIndex:
+    """local SQLite index of the fingerprint of each entity loaded by external key.
+
+    Notes
+    -----
+    The index can be shared between threads and used as a context manager to
+    close its database when done:
+
+    ```python
+    with FingerprintIndex("catalog.fingerprints") as index:
+        stats = run_sync(etl_data_loader, read_rows("catalog.jsonl"), index)
+    ```
+
+    Attributes
+    ----------
+    path : str
+        path of the SQLite database of the index.
+    """
+
+    def __init__(self, path):
+        """open the index stored at `path`, creating it if needed.
+
+        Parameters
+        ----------
+        path : str
+            path of the SQLite database of the index.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "key TEXT PRIMARY KEY, entity TEXT, id TEXT NOT NULL, "
+                "fingerprint TEXT NOT NULL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+    def close(self):
+        """close the database of the index."""
+        self._connection.close()
+
+    def get(self, key):
+        """get the entity loaded with the external `key`.
+
+        Returns
+        -------
+        entry : tuple
+            the name, the Saleor id and the fingerprint of the entity, None if
+            it was not loaded.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT entity, id, fingerprint FROM fingerprints WHERE key = ?",
+                (key,)).fetchone()
+
+    def record(self, key, entity, id, fingerprint):
+        """record the fingerprint of the entity loaded with the external `key`.
+
+        Notes
+        -----
+        An entity updated keeps its position in the order of creation.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO fingerprints (key, entity, id, fingerprint) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "entity = excluded.entity, id = excluded.id, "
+                "fingerprint = excluded.fingerprint",
+                (key, entity, id, fingerprint))
+
+    def remove(self, key):
+        """remove the entity loaded with the external `key` from the index."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM fingerprints WHERE key = ?", (key,))
+
+    def ids(self):
+        """get the Saleor id of every entity indexed by external key."""
+        with self._lock:
+            return dict(self._connection.execute("SELECT key, id FROM fingerprints"))
+
+    def entries(self):
+        """get the key, name and id of every entity, the most recently created first."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT key, entity, id FROM fingerprints ORDER BY rowid DESC").fetchall()
+
+
+def get_delete_rank(entity):
+    """Get the rank of an `entity` in `DELETE_ORDER`, the dependent entities
+    being deleted before the entities they depend on."""
+    try:
+        return DELETE_ORDER.index(entity)
+    except ValueError:
+        return len(DELETE_ORDER)
+
+
+def update_entity(loader, entity, id, kwargs):
+    """Update an entity with the arguments of its `create_<entity>` method.
+
+    Notes
+    -----
+    The entities that can't be updated in place (see `REPLACED_ENTITIES`) are
+    deleted and created again.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to update the entity.
+    entity : str
+        the name of the entity e.g. "product".
+    id : str
+        the Saleor id of the entity.
+    kwargs : dict
+        the keyword arguments of the `create_<entity>` method, those only
+        used on creation (see `CREATE_ONLY_ARGUMENTS`) are not sent.
+
+    Returns
+    -------
+    id : str
+        the id of the entity updated, a new one when it was replaced.
+
+    Raises
+    ------
+    Exception
+        when the entity has no update method or the update failed.
+    """
+    if entity in REPLACED_ENTITIES:
+        getattr(loader, "delete_{}".format(entity))(id)
+        return getattr(loader, "create_{}".format(entity))(**kwargs)
+
+    method = getattr(loader, "update_{}".format(entity), None)
+    if method is None:
+        raise Exception("'{}' entities can't be updated.".format(entity))
+    kwargs = {name: value for name, value in kwargs.items()
+              if name not in CREATE_ONLY_ARGUMENTS.get(entity, ())}
+    method(id, **kwargs)
+    return id
+
+
+def delete_entities(loader, entity, ids, chunk_size=500):
+    """Delete entities of the same kind, in bulk when Saleor allows it.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to delete the entities.
+    entity : str
+        the name of the entities e.g. "product".
+    ids : list
+        the Saleor ids of the entities.
+    chunk_size : int, optional
+        maximum number of ids deleted in a single request, by default 500.
+
+    Yields
+    ------
+    id : str
+        the id of each entity.
+    error : Exception
+        the error raised deleting the entity, None when it was deleted.
+    """
+    if entity in operations.BULK_DELETE_MUTATIONS:
+        for _, chunk in iter_chunks(ids, chunk_size):
+            try:
+                loader.bulk_delete(entity, chunk)
+            except Exception as error:
+                for id in chunk:
+                    yield id, error
+            else:
+                for id in chunk:
+                    yield id, None
+        return
+
+    method = getattr(loader, "delete_{}".format(entity), None)
+    for id in ids:
+        try:
+            if method is None:
+                raise Exception("'{}' entities can't be deleted.".format(entity))
+            method(id)
+        except Exception as error:
+            yield id, error
+        else:
+            yield id, None
+
+
+def _delete_entry(loader, index, ids, key, entry):
+    """delete the entity recorded under `key` and forget it, so that it is
+    created again by the next sync if its creation fails."""
+    _, error = next(delete_entities(loader, entry[0], [entry[1]]))
+    if error is not None:
+        raise error
+    index.remove(key)
+    ids.pop(key, None)
+
+
+def run_sync(loader, rows, index, output=None, ids=None, delete=True):
+    """Create, update and delete entities so that Saleor matches the `rows`.
+
+    Notes
+    -----
+    The rows are streamed as in `pipeline.run_pipeline`, only their keys are
+    kept in memory to find the entities removed from the catalog. A failing
+    row doesn't stop the sync and its entity is never deleted.
+
+    Parameters
+    ----------
+    loader : ETLDataLoader
+        the loader used to send the changes.
+    rows : iterable
+        the rows describing the whole catalog, see `saleor_gql_loader.pipeline`.
+    index : FingerprintIndex
+        the fingerprints recorded by the previous sync, updated with the
+        changes.
+    output : file, optional
+        a text file in which a JSON line is written for each entity with its
+        `entity`, `key`, `action` ("created", "updated", "unchanged" or
+        "deleted") and either its `id` or the `error`.
+    ids : dict, optional
+        the id of the entities already created by external key, updated with
+        the entities of the index and created by the sync.
+    delete : bool, optional
+        whether to delete the entities of the index missing from the rows, by
+        default True.
+
+    Returns
+    -------
+    stats : dict
+        the number of entities `created`, `updated`, `unchanged`, `deleted`
+        and `failed`.
+    """
+    if ids is None:
+        ids = {}
+    ids.update(index.ids())
+
+    stats = {"created": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+    seen = set()
+
+    def write(result):
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+
+    for row in rows:
+        key = row.get("key")
+        entity = row.get("entity")
+        result = {"entity": entity, "key": key}
+        try:
+            if key is None:
+                raise Exception("rows must have a key to be synced.")
+            seen.add(key)
+            method, kwargs = prepare_row(loader, row, ids)
+            fingerprint = get_fingerprint(entity, kwargs)
+            entry = index.get(key)
+            if entry is None:
+                result.update(action="created", id=method(**kwargs))
+            elif entry[0] != entity:
+                _delete_entry(loader, index, ids, key, entry)
+                stats["deleted"] += 1
+                write({"entity": entry[0], "key": key, "action": "deleted",
+                       "id": entry[1]})
+                result.update(action="created", id=method(**kwargs))
+            elif entry[2] == fingerprint:
+                result.update(action="unchanged", id=entry[1])
+            elif entity in REPLACED_ENTITIES:
+                _delete_entry(loader, index, ids, key, entry)
+                result.update(action="updated", id=method(**kwargs))
+            else:
+                result.update(action="updated", id=update_entity(
+                    loader, entity, entry[1], kwargs))
+        except Exception as error:
+            result["error"] = str(error)
+            stats["failed"] += 1
+        else:
+            ids[key] = result["id"]
+            if result["action"] != "unchanged":
+                index.record(key, entity, result["id"], fingerprint)
+            stats[result["action"]] += 1
+        write(result)
+
+    if delete:
+        removed = sorted(
+            (entry for entry in index.entries() if entry[0] not in seen),
+            key=lambda entry: get_delete_rank(entry[1]))
+        for entity, entries in groupby(removed, key=lambda entry: entry[1]):
+            entries = list(entries)
+            deleted = delete_entities(loader, entity, [id for _, _, id in entries])
+            for (key, _, id), (_, error) in zip(entries, deleted):
+                result = {"entity": entity, "key": key, "action": "deleted", "id": id}
+                if error is None:
+                    index.remove(key)
+                    ids.pop(key, None)
+                    stats["deleted"] += 1
+                else:
+                    result["error"] = str(error)
+                    stats["failed"] += 1
+                write(result)
+
+    return stats
@@ -4,32 +4,90 @@ Notes
 -----
 The function defined here must be context and implementation independant, for
 easy reusability
+
+requests, requests_toolbelt and mimetypes are imported by the functions using
+them rather than by the module, which is imported by `operations`, to keep the
+package fast to import.
 """
-import requests
-import json
+import hashlib
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from requests_toolbelt import MultipartEncoder
-from django.core.serializers.json import DjangoJSONEncoder
+
+from .retry import RETRY_STATUSES, get_retry_after
+from .serialization import get_default_serializer
 
 GQL_DEFAULT_ENDPOINT = "http://localhost:8000/graphql/"
 
 
+def get_session(pool_size=10, max_retries=0):
+    """Create a `requests.Session` keeping alive a pool of connections.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        maximum number of connections kept alive per host, should be at least
+        the number of threads sharing the session, default is 10.
+    max_retries : int, optional
+        number of retries on connection failures (DNS lookup, refused
+        connections, ...), default is 0.
+
+    Returns
+    -------
+    session : requests.Session
+        a session on which every request reuses the pooled connections.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=max_retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def graphql_request(query, variables={}, headers={},
-                    endpoint=GQL_DEFAULT_ENDPOINT):
+                    endpoint=GQL_DEFAULT_ENDPOINT, session=None, timeout=None,
+                    extensions=None, retry=None, rate_limiter=None,
+                    concurrency_limiter=None, on_response=None, serializer=None):
     """Execute the graphQL `query` provided on the `endpoint`.
 
     Parameters
     ----------
     query : str
-        docstring representing a graphQL query.
+        docstring representing a graphQL query, can be None when the query is
+        identified by a persisted query hash in `extensions`.
     variables : dict, optional
         dictionary corresponding to the input(s) of the `query` must be
-        serializable by requests into a JSON object.
+        serializable by the `serializer` into a JSON object.
     headers : dict, optional
         headers added to the request (important for authentication).
     endpoint : str, optional
         the graphQL endpoint url that will be queried, default is
         `GQL_DEFAULT_ENDPOINT`.
+    session : requests.Session, optional
+        session used to send the request, reusing its pooled connections. When
+        not provided a new connection is opened for the request.
+    timeout : float, optional
+        seconds to wait for the server before giving up, default is None (wait
+        forever).
+    extensions : dict, optional
+        extensions of the request e.g. the `persistedQuery` hash.
+    retry : retry.RetryPolicy, optional
+        policy retrying the request when the endpoint is overloaded, default
+        is None (no retry).
+    rate_limiter : retry.RateLimiter, optional
+        limiter spacing out the requests, default is None (no limit).
+    concurrency_limiter : concurrency.ConcurrencyLimiter, optional
+        limiter of the requests in flight shared between threads, default is
+        None (no limit).
+    on_response : callable, optional
+        called after each try, see `send_with_retry`.
+    serializer : serialization.JSONSerializer, optional
+        serializer encoding the body and decoding the response, default is
+        `serialization.get_default_serializer()`.
 
     Returns
     -------
@@ -39,26 +97,36 @@ def graphql_request(query, variables={}, headers={},
     Raises
     ------
     Exception
-        when `response.status_code` is not 200.
-    """
-    response = requests.post(
-        endpoint,
-        headers=headers,
-        json={
-            'query': query,
-            'variables': variables
-        }
-    )
+        when `response.status_code` is not 200 or the response is not JSON.
+    """
+    import requests
 
-    parsed_response = json.loads(response.text)
-    if response.status_code != 200:
-        raise Exception("{message}\n extensions: {extensions}".format(
-            **parsed_response["errors"][0]))
-    else:
-        return parsed_response
+    serializer = get_default_serializer() if serializer is None else serializer
+    body = {'variables': variables}
+    if query is not None:
+        body['query'] = query
+    if extensions is not None:
+        body['extensions'] = extensions
 
+    data = serializer.dumps(body)
+    base_headers = {
+        "Content-Type": "application/json",
+    }
+    override_dict(base_headers, headers)
+
+    post = requests.post if session is None else session.post
+    response = send_with_retry(
+        lambda: post(endpoint, headers=base_headers, data=data, timeout=timeout),
+        retry, rate_limiter, concurrency_limiter, on_response)
 
-def graphql_multipart_request(body, headers, endpoint=GQL_DEFAULT_ENDPOINT):
+    return parse_response(response, serializer)
+
+
+def graphql_multipart_request(body, headers, endpoint=GQL_DEFAULT_ENDPOINT,
+                              session=None, timeout=90, progress=None,
+                              retry=None, rate_limiter=None,
+                              concurrency_limiter=None, on_response=None,
+                              serializer=None):
     """Execute a multipart graphQL query with `body` provided on the `endpoint`.
 
     Parameters
@@ -70,6 +138,28 @@ def graphql_multipart_request(body, headers, endpoint=GQL_DEFAULT_ENDPOINT):
     endpoint : str, optional
         the graphQL endpoint url that will be queried, default is
         `GQL_DEFAULT_ENDPOINT`.
+    session : requests.Session, optional
+        session used to send the request, reusing its pooled connections. When
+        not provided a new connection is opened for the request.
+    timeout : float, optional
+        seconds to wait for the server before giving up, default is 90.
+    progress : callable, optional
+        called with the number of bytes sent and the total size of the body
+        each time a chunk of the body is streamed to the endpoint.
+    retry : retry.RetryPolicy, optional
+        policy retrying the request when the endpoint is overloaded, the files
+        of the body are then streamed again from their start. Default is None
+        (no retry).
+    rate_limiter : retry.RateLimiter, optional
+        limiter spacing out the requests, default is None (no limit).
+    concurrency_limiter : concurrency.ConcurrencyLimiter, optional
+        limiter of the requests in flight shared between threads, default is
+        None (no limit).
+    on_response : callable, optional
+        called after each try, see `send_with_retry`.
+    serializer : serialization.JSONSerializer, optional
+        serializer decoding the response, default is
+        `serialization.get_default_serializer()`.
 
     Returns
     -------
@@ -79,24 +169,175 @@ def graphql_multipart_request(body, headers, endpoint=GQL_DEFAULT_ENDPOINT):
     Raises
     ------
     Exception
-        when `response.status_code` is not 200.
+        when `response.status_code` is not 200 or the response is not JSON.
     """
-    bodyEncoder = MultipartEncoder(body)
-    base_headers = {
-        "Content-Type": bodyEncoder.content_type,
-    }
-    override_dict(base_headers, headers)
+    import requests
+    from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+
+    post = requests.post if session is None else session.post
+
+    def send():
+        for value in body.values():
+            if isinstance(value, tuple):
+                value[1].seek(0)
+        bodyEncoder = MultipartEncoder(body)
+        if progress is not None:
+            bodyEncoder = MultipartEncoderMonitor(
+                bodyEncoder, lambda monitor: progress(monitor.bytes_read, monitor.len))
+        base_headers = {
+            "Content-Type": bodyEncoder.content_type,
+        }
+        override_dict(base_headers, headers)
+        return post(endpoint, data=bodyEncoder, headers=base_headers,
+                    timeout=timeout)
+
+    response = send_with_retry(
+        send, retry, rate_limiter, concurrency_limiter, on_response)
+
+    return parse_response(response, serializer)
+
+
+def send_with_retry(send, retry=None, rate_limiter=None, concurrency_limiter=None,
+                    on_response=None):
+    """Send a request, retrying it while the endpoint is overloaded.
 
-    response = requests.post(endpoint, data=bodyEncoder, headers=base_headers, timeout=90)
+    Parameters
+    ----------
+    send : callable
+        sends the request and returns the `requests.Response`, called again
+        for each retry.
+    retry : retry.RetryPolicy, optional
+        policy deciding whether and when to send the request again, default is
+        None (no retry).
+    rate_limiter : retry.RateLimiter, optional
+        limiter waited before each try and informed of its outcome, default is
+        None (no limit).
+    concurrency_limiter : concurrency.ConcurrencyLimiter, optional
+        limiter holding a slot during each try and informed of its outcome,
+        the slot is released while waiting to retry. Default is None (no
+        limit).
+    on_response : callable, optional
+        called after each try with the `requests.Response` (None when the
+        request raised), the seconds it took and the number of the try
+        starting at 1, e.g. to record metrics.
+
+    Returns
+    -------
+    response : requests.Response
+        the response of the last try.
+    """
+    limiters = [limiter for limiter in (concurrency_limiter, rate_limiter)
+                if limiter is not None]
+    attempt = 0
+    while True:
+        attempt += 1
+        for limiter in limiters:
+            limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = send()
+        except Exception:
+            latency = time.monotonic() - start
+            for limiter in limiters:
+                limiter.record(latency, True)
+            if on_response is not None:
+                on_response(None, latency, attempt)
+            raise
+        latency = time.monotonic() - start
+        for limiter in limiters:
+            limiter.record(latency, response.status_code in RETRY_STATUSES)
+        if on_response is not None:
+            on_response(response, latency, attempt)
+
+        if retry is None or not retry.should_retry(response.status_code, attempt):
+            return response
+        response.close()
+        time.sleep(retry.get_delay(attempt, get_retry_after(response.headers)))
+
+
+def parse_response(response, serializer=None):
+    """Parse the JSON body of a graphQL response and check its HTTP status.
+
+    Parameters
+    ----------
+    response : requests.Response
+        the response of the endpoint.
+    serializer : serialization.JSONSerializer, optional
+        serializer decoding the body straight from its bytes, default is
+        `serialization.get_default_serializer()`.
+
+    Returns
+    -------
+    response : dict
+        a dictionary corresponding to the parsed JSON graphQL response.
+
+    Raises
+    ------
+    Exception
+        when `response.status_code` is not 200 or the body is not JSON (e.g.
+        the HTML error page of a proxy).
+    """
+    try:
+        parsed_response = (
+            get_default_serializer() if serializer is None else serializer
+        ).loads(response.content)
+    except ValueError:
+        raise Exception("{} {}: {}".format(
+            response.status_code, response.reason, response.text[:200].strip()))
+    return handle_response(response.status_code, parsed_response)
+
+
+def handle_response(status_code, parsed_response):
+    """Check the HTTP status of a parsed graphQL response.
+
+    Parameters
+    ----------
+    status_code : int
+        the HTTP status code of the response.
+    parsed_response : dict
+        a dictionary corresponding to the parsed JSON graphQL response.
+
+    Returns
+    -------
+    response : dict
+        the `parsed_response` when `status_code` is 200.
 
-    parsed_response = json.loads(response.text)
-    if response.status_code != 200:
-        raise Exception("{message}\n extensions: {extensions}".format(
-            **parsed_response["errors"][0]))
+    Raises
+    ------
+    Exception
+        when `status_code` is not 200.
+    """
+    if status_code != 200:
+        errors = parsed_response.get("errors") if isinstance(parsed_response, dict) else None
+        if not errors:
+            raise Exception("{}: {}".format(status_code, parsed_response))
+        raise Exception("{}\n extensions: {}".format(
+            errors[0].get("message"), errors[0].get("extensions")))
     else:
         return parsed_response
 
 
+def compact_query(query):
+    """Collapse the whitespace of a graphQL `query` to send it compactly.
+
+    Notes
+    -----
+    The query must not contain string literals, values are expected to be
+    passed as variables.
+
+    Parameters
+    ----------
+    query : str
+        docstring representing a graphQL query.
+
+    Returns
+    -------
+    query : str
+        the same query on a single line with single spaces.
+    """
+    return " ".join(query.split())
+
+
 def override_dict(a, overrides):
     """Override a dict with another one **only first non nested keys**.
 
@@ -178,6 +419,11 @@ def get_operations(product_id):
 def get_payload(product_id, file_path):
     """Get ProductImageCreate operations
 
+    Notes
+    -----
+    The image is opened and must be closed by the caller once sent, prefer
+    `open_multipart_payload` which closes it.
+
     Parameters
     ----------
     product_id : str
@@ -188,10 +434,122 @@ def get_payload(product_id, file_path):
     query : str
     variables: dict
     """
-    return {
-        "operations": json.dumps(
-            get_operations(product_id), cls=DjangoJSONEncoder
-        ),
-        "map": json.dumps({'0': ["variables.image"]}, cls=DjangoJSONEncoder),
-        "0": (Path(file_path).name, open(file_path, 'rb'), 'image/png')
+    operations = get_operations(product_id)
+    return get_multipart_payload(
+        operations["query"], operations["variables"], {"image": file_path})
+
+
+def get_multipart_payload(query, variables, files, serializer=None):
+    """Get the multipart body of a graphQL query uploading files.
+
+    Notes
+    -----
+    The body follows the graphQL multipart request specification: the files
+    are sent as separate parts and mapped to their variable in the query. The
+    files are opened, not read, so that they are streamed when the body is
+    sent, they must be closed by the caller, prefer `open_multipart_payload`
+    which closes them.
+
+    Parameters
+    ----------
+    query : str
+        docstring representing a graphQL query.
+    variables : dict
+        dictionary corresponding to the input(s) of the `query`.
+    files : dict
+        path of the file to upload for each variable of type Upload given as a
+        dotted path inside `variables` e.g. `input.image`.
+    serializer : serialization.JSONSerializer, optional
+        serializer encoding the query and the map of the files, default is
+        `serialization.get_default_serializer()`.
+
+    Returns
+    -------
+    body : dict
+        the fields of the multipart body to be sent by
+        `graphql_multipart_request`.
+    """
+    serializer = get_default_serializer() if serializer is None else serializer
+    file_map = {
+        str(i): ["variables.{}".format(path)] for i, path in enumerate(files)}
+    body = {
+        "operations": serializer.dumps({"query": query, "variables": variables}),
+        "map": serializer.dumps(file_map),
     }
+    try:
+        for i, file_path in enumerate(files.values()):
+            body[str(i)] = (Path(file_path).name, open(file_path, 'rb'),
+                            get_mime_type(file_path))
+    except OSError:
+        close_multipart_payload(body)
+        raise
+    return body
+
+
+def close_multipart_payload(body):
+    """Close the files opened by `get_multipart_payload`."""
+    for value in body.values():
+        if isinstance(value, tuple):
+            value[1].close()
+
+
+@contextmanager
+def open_multipart_payload(query, variables, files, serializer=None):
+    """Open the multipart body of a graphQL query uploading files.
+
+    Notes
+    -----
+    Same as `get_multipart_payload` but the files are closed when leaving the
+    `with` block:
+
+    ```python
+    with open_multipart_payload(query, variables, files) as body:
+        response = graphql_multipart_request(body, headers)
+    ```
+    """
+    body = get_multipart_payload(query, variables, files, serializer)
+    try:
+        yield body
+    finally:
+        close_multipart_payload(body)
+
+
+def get_mime_type(file_path):
+    """Guess the MIME type of a file from its extension.
+
+    Parameters
+    ----------
+    file_path : str
+        path of the file.
+
+    Returns
+    -------
+    mime_type : str
+        the MIME type of the file e.g. `image/jpeg`, `application/octet-stream`
+        when it can't be guessed.
+    """
+    import mimetypes
+
+    return mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """Compute the sha256 hash of a file content, reading it by chunks.
+
+    Parameters
+    ----------
+    file_path : str
+        path of the file.
+    chunk_size : int, optional
+        number of bytes read at once, default is 1 MiB.
+
+    Returns
+    -------
+    hash : str
+        the hexadecimal sha256 digest of the file content.
+    """
+    content_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
@@ -10,7 +10,13 @@ setup(
     url='https://github.com/grll/saleor-gql-loader',
     download_url='https://github.com/grll/saleor-gql-loader/archive/0.0.5.tar.gz',
     keywords=['graphql', 'saleor', 'loader'],
-    install_requires=['requests', 'Django', 'requests-toolbelt'],
+    install_requires=['requests', 'requests-toolbelt'],
+    extras_require={
+        'async': ['aiohttp'],
+        'images': ['Pillow'],
+        'fast': ['orjson'],
+        'django': ['Django'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+
+from mock_server import MockSaleor, MockSaleorServer  # noqa: E402
+
+from saleor_gql_loader import ETLDataLoader  # noqa: E402
+
+__all__ = ["FakeLoader", "MockSaleor", "MockSaleorServer"]
+
+
+class FakeLoader(ETLDataLoader):
+    """loader answering its queries with the mock Saleor of the benchmarks
+    instead of sending them.
+
+    Attributes
+    ----------
+    sent : list
+        the name and the variables of each query sent.
+    fail : set
+        the names of the queries failing as if the endpoint was unreachable.
+    """
+
+    def __init__(self, fail=(), **kwargs):
+        super().__init__("token", **kwargs)
+        self.saleor = MockSaleor()
+        self.sent = []
+        self.fail = set(fail)
+
+    def _send(self, query, variables, files=None, progress=None, name="query"):
+        self.sent.append((name, variables))
+        if name in self.fail:
+            raise Exception("{} failed.".format(name))
+        return self.saleor.execute({"query": query, "variables": variables})
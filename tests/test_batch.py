@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakes import FakeLoader
+
+from saleor_gql_loader.images import ImageIndex
+
+
+class ErrorLoader(FakeLoader):
+    """loader answering with the data and the errors of `response`."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+    def _send(self, query, variables, files=None, progress=None, name="query"):
+        self.sent.append((name, variables))
+        return self.response
+
+
+class TestMutationBatch(unittest.TestCase):
+
+    def test_results_are_demultiplexed_by_alias(self):
+        loader = FakeLoader()
+        with loader.batch(batch_size=10) as batch:
+            results = [batch.create_category(name=str(i)) for i in range(3)]
+
+        self.assertEqual([name for name, _ in loader.sent], ["batch"])
+        ids = [result.result() for result in results]
+        self.assertEqual(len(set(ids)), 3)
+        variables = loader.sent[0][1]
+        self.assertEqual([variables["m{}_input".format(i)]["name"] for i in range(3)],
+                         ["0", "1", "2"])
+
+    def test_error_is_attached_to_its_alias_only(self):
+        loader = ErrorLoader({
+            "data": {"m0": {"category": {"id": "Q2F0ZWdvcnk6MQ=="}, "productErrors": []},
+                     "m1": None},
+            "errors": [{"message": "m1 failed", "path": ["m1"]}],
+        })
+        with loader.batch() as batch:
+            first = batch.create_category(name="first")
+            second = batch.create_category(name="second")
+
+        self.assertIsNone(first.error())
+        self.assertEqual(first.result(), "Q2F0ZWdvcnk6MQ==")
+        self.assertEqual(str(second.error()), "m1 failed")
+
+    def test_error_without_path_is_attached_to_every_failed_alias(self):
+        loader = ErrorLoader({
+            "data": {"m0": None, "m1": None},
+            "errors": [{"message": "m0 failed", "path": ["m0"]},
+                       {"message": "the database is down"}],
+        })
+        with loader.batch() as batch:
+            first = batch.create_category(name="first")
+            second = batch.create_category(name="second")
+
+        self.assertEqual(str(first.error()), "m0 failed\nthe database is down")
+        self.assertEqual(str(second.error()), "the database is down")
+
+    def test_payload_errors_only_fail_their_mutation(self):
+        loader = ErrorLoader({
+            "data": {
+                "m0": {"category": {"id": "Q2F0ZWdvcnk6MQ=="}, "productErrors": []},
+                "m1": {"category": None, "productErrors": [
+                    {"field": "slug", "message": "already exists", "code": "UNIQUE"}]},
+            },
+        })
+        with loader.batch() as batch:
+            first = batch.create_category(name="first")
+            second = batch.create_category(name="first")
+
+        self.assertEqual(first.result(), "Q2F0ZWdvcnk6MQ==")
+        self.assertIsNotNone(second.error())
+
+    def test_images_go_through_the_image_index(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_path = os.path.join(directory, "image.png")
+        with open(file_path, "wb") as f:
+            f.write(b"image")
+        loader = FakeLoader(image_index=ImageIndex())
+
+        with loader.batch() as batch:
+            uploaded = batch.create_product_image("UHJvZHVjdDox", file_path)
+        with loader.batch() as batch:
+            skipped = batch.create_product_image("UHJvZHVjdDox", file_path)
+
+        self.assertEqual(len(loader.sent), 1)
+        self.assertTrue(skipped.done)
+        self.assertEqual(skipped.result(), uploaded.result())
+        self.assertEqual(loader.image_index.stats["skipped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from fakes import MockSaleorServer
+
+from saleor_gql_loader import ETLDataLoader
+from saleor_gql_loader.concurrency import ConcurrencyLimiter
+from saleor_gql_loader.retry import RetryPolicy
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_threads_beyond_the_limit_wait(self):
+        limiter = ConcurrencyLimiter(initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+
+        self.assertFalse(acquired.wait(0.05))
+        limiter.record(0.01)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_coroutines_beyond_the_limit_wait(self):
+        limiter = ConcurrencyLimiter(initial=2, max_limit=2)
+        peak = 0
+
+        async def query():
+            nonlocal peak
+            await limiter.acquire_async()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            limiter.record(0.01)
+
+        async def load():
+            await asyncio.gather(*[query() for _ in range(10)])
+
+        asyncio.run(load())
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_limit_adapts_to_the_outcome(self):
+        limiter = ConcurrencyLimiter(initial=2, max_limit=3, decrease=0.5)
+        for _ in range(2):
+            limiter.acquire()
+        for _ in range(2):
+            limiter.record(0.01)
+        self.assertEqual(limiter.limit, 3)
+
+        for _ in range(3):
+            limiter.acquire()
+        for throttled in (True, False, False):
+            limiter.record(0.01, throttled)
+        self.assertEqual(limiter.limit, 1)
+
+
+class TestLoaderConcurrencyAccounting(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockSaleorServer(latency=0.01).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # track the highest number of requests answered at once.
+        saleor, handle = self.server.saleor, self.server.saleor.handle
+        lock, self.in_flight, self.peak = threading.Lock(), 0, 0
+
+        def tracked_handle(document):
+            with lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+            try:
+                return handle(document)
+            finally:
+                with lock:
+                    self.in_flight -= 1
+
+        saleor.handle = tracked_handle
+
+    def test_sync_loader_gives_every_slot_back(self):
+        limiter = ConcurrencyLimiter(initial=2, max_limit=4)
+        with ETLDataLoader("token", self.server.url, pool_size=4,
+                           concurrency_limiter=limiter) as loader:
+            result = loader.bulk("create_category", [{"name": str(i)} for i in range(20)],
+                                 max_workers=4)
+
+        self.assertEqual(result.errors, {})
+        self.assertEqual(len(result.ids), 20)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertLessEqual(self.peak, 4)
+
+    def test_sync_loader_gives_the_slot_of_a_throttled_query_back(self):
+        self.server.saleor.error_rate = 1.0
+        limiter = ConcurrencyLimiter(initial=1)
+        with ETLDataLoader("token", self.server.url, retry=RetryPolicy(attempts=2, backoff=0),
+                           concurrency_limiter=limiter) as loader:
+            with self.assertRaises(Exception):
+                loader.create_category(name="shirts")
+
+        self.assertEqual(limiter.in_flight, 0)
+
+    @unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+    def test_async_loader_gives_every_slot_back(self):
+        from saleor_gql_loader import AsyncETLDataLoader
+
+        limiter = ConcurrencyLimiter(initial=2, max_limit=4)
+
+        async def load():
+            async with AsyncETLDataLoader("token", self.server.url, max_in_flight=8,
+                                          concurrency_limiter=limiter) as loader:
+                return await asyncio.gather(*[
+                    loader.create_category(name=str(i)) for i in range(20)])
+
+        self.assertEqual(len(asyncio.run(load())), 20)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertLessEqual(self.peak, 4)
+
+    @unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+    def test_async_loader_gives_the_slot_of_a_cancelled_query_back(self):
+        from saleor_gql_loader import AsyncETLDataLoader
+
+        self.server.saleor.latency = 1.0
+        limiter = ConcurrencyLimiter(initial=1)
+
+        async def load():
+            async with AsyncETLDataLoader("token", self.server.url,
+                                          concurrency_limiter=limiter) as loader:
+                task = asyncio.ensure_future(loader.create_category(name="shirts"))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        start = time.monotonic()
+        asyncio.run(load())
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import asyncio
+import time
+import unittest
+from email.utils import formatdate
+from unittest import mock
+
+from fakes import MockSaleorServer
+
+from saleor_gql_loader import ETLDataLoader
+from saleor_gql_loader.metrics import Metrics
+from saleor_gql_loader.retry import RateLimiter, RetryPolicy, get_retry_after
+from saleor_gql_loader.utils import send_with_retry
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+UNREACHABLE_URL = "http://127.0.0.1:9/graphql/"
+
+
+class FakeResponse:
+    """response of `send_with_retry` with a status and headers only."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class RecordingLimiter:
+    """limiter recording the tries it is told about."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.throttled = []
+
+    def acquire(self):
+        self.acquired += 1
+
+    async def acquire_async(self):
+        self.acquired += 1
+
+    def record(self, latency, throttled=False):
+        self.throttled.append(throttled)
+
+
+class TestRetry(unittest.TestCase):
+
+    def send_all(self, responses, retry, **kwargs):
+        responses = iter(responses)
+        with mock.patch("saleor_gql_loader.utils.time.sleep") as sleep:
+            response = send_with_retry(lambda: next(responses), retry, **kwargs)
+        return response, [call.args[0] for call in sleep.call_args_list]
+
+    def test_retry_after_is_waited(self):
+        retry = RetryPolicy(attempts=3, backoff=0.01, jitter=False)
+        first = FakeResponse(503, {"Retry-After": "2"})
+        response, delays = self.send_all([first, FakeResponse(200)], retry)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(delays, [2.0])
+        self.assertTrue(first.closed)
+
+    def test_backoff_doubles_without_retry_after(self):
+        retry = RetryPolicy(attempts=3, backoff=0.5, jitter=False)
+        response, delays = self.send_all(
+            [FakeResponse(429), FakeResponse(502), FakeResponse(503)], retry)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(delays, [0.5, 1.0])
+
+    def test_other_statuses_are_not_retried(self):
+        response, delays = self.send_all([FakeResponse(500)], RetryPolicy())
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(delays, [])
+
+    def test_retry_after_http_date(self):
+        delay = get_retry_after({"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+        self.assertTrue(25 < delay <= 30)
+        self.assertIsNone(get_retry_after({"Retry-After": "soon"}))
+        self.assertIsNone(get_retry_after({}))
+
+    def test_limiters_are_told_about_every_try(self):
+        limiter = RecordingLimiter()
+        responses = [FakeResponse(503), FakeResponse(200)]
+        self.send_all(responses, RetryPolicy(jitter=False), rate_limiter=limiter)
+
+        self.assertEqual(limiter.acquired, 2)
+        self.assertEqual(limiter.throttled, [True, False])
+
+    def test_limiters_are_told_about_failed_tries(self):
+        limiter = RecordingLimiter()
+
+        def send():
+            raise ConnectionError("unreachable")
+
+        with self.assertRaises(ConnectionError):
+            send_with_retry(send, RetryPolicy(), rate_limiter=limiter)
+        self.assertEqual(limiter.throttled, [True])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_queries_are_spaced_out(self):
+        limiter = RateLimiter(rate=100)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+
+    def test_rate_adapts_to_the_outcome(self):
+        limiter = RateLimiter(rate=10, min_rate=1, max_rate=12)
+        for _ in range(100):
+            limiter.record(0.01)
+        self.assertEqual(limiter.rate, 12)
+
+        limiter.record(0.01, throttled=True)
+        self.assertEqual(limiter.rate, 6)
+        limiter.record(0.01, throttled=True)
+        self.assertEqual(limiter.rate, 6)
+
+
+class TestLoaderLimiterAccounting(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockSaleorServer(error_rate=1.0).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_sync_loader_retries_throttled_queries(self):
+        limiter, metrics = RecordingLimiter(), Metrics()
+        with ETLDataLoader("token", self.server.url, retry=RetryPolicy(attempts=3, backoff=0),
+                           rate_limiter=limiter, metrics=metrics) as loader:
+            with self.assertRaises(Exception):
+                loader.create_category(name="shirts")
+
+        self.assertEqual(self.server.saleor.requests, 3)
+        self.assertEqual(limiter.acquired, 3)
+        self.assertEqual(limiter.throttled, [True] * 3)
+        self.assertEqual(metrics.operations["categoryCreate"].retries, 2)
+
+    def test_sync_loader_records_unreachable_endpoint(self):
+        limiter, metrics = RecordingLimiter(), Metrics()
+        with ETLDataLoader("token", UNREACHABLE_URL, max_retries=0, rate_limiter=limiter,
+                           metrics=metrics) as loader:
+            with self.assertRaises(Exception):
+                loader.create_category(name="shirts")
+
+        self.assertEqual(limiter.throttled, [True])
+        self.assertEqual(metrics.operations["categoryCreate"].http_errors, 1)
+
+    @unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+    def test_async_loader_retries_throttled_queries(self):
+        from saleor_gql_loader import AsyncETLDataLoader
+
+        limiter, metrics = RecordingLimiter(), Metrics()
+
+        async def load():
+            async with AsyncETLDataLoader(
+                    "token", self.server.url, retry=RetryPolicy(attempts=3, backoff=0),
+                    rate_limiter=limiter, metrics=metrics) as loader:
+                await loader.create_category(name="shirts")
+
+        with self.assertRaises(Exception):
+            asyncio.run(load())
+        self.assertEqual(limiter.acquired, 3)
+        self.assertEqual(limiter.throttled, [True] * 3)
+        self.assertEqual(metrics.operations["categoryCreate"].retries, 2)
+
+    @unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+    def test_async_loader_records_unreachable_endpoint(self):
+        from saleor_gql_loader import AsyncETLDataLoader
+
+        limiter, metrics = RecordingLimiter(), Metrics()
+
+        async def load():
+            async with AsyncETLDataLoader("token", UNREACHABLE_URL, rate_limiter=limiter,
+                                          metrics=metrics) as loader:
+                await loader.create_category(name="shirts")
+
+        with self.assertRaises(Exception):
+            asyncio.run(load())
+        self.assertEqual(limiter.throttled, [True])
+        self.assertEqual(metrics.operations["categoryCreate"].http_errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
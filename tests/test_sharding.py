@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakes import FakeLoader
+
+from saleor_gql_loader.sharding import (
+    get_shared_ids, iter_shard, iter_shard_keys, iter_shared, run_shards)
+
+
+def get_rows(count=20):
+    rows = [
+        {"entity": "category", "key": "shirts", "name": "shirts"},
+        {"entity": "product_type", "key": "type", "name": "type"},
+    ]
+    for i in range(count):
+        rows.append({"entity": "product", "key": "p{}".format(i),
+                     "product_type_id": "@type", "category": "@shirts"})
+        rows.append({"entity": "product_variant", "key": "v{}".format(i),
+                     "product_id": "@p{}".format(i), "sku": "s{}".format(i)})
+    return rows
+
+
+class TestShardKeys(unittest.TestCase):
+
+    def test_rows_follow_the_rows_they_reference(self):
+        rows = get_rows(2) + [{"entity": "product_variant", "product_id": "@v1"}]
+        shard_keys = [shard_key for _, shard_key in iter_shard_keys(rows)]
+
+        self.assertEqual(shard_keys, [None, None, "p0", "p0", "p1", "p1", "p1"])
+
+    def test_rows_without_reference_use_their_key_or_index(self):
+        rows = [{"entity": "customer_account", "email": "a@example.com"},
+                {"entity": "customer_account", "key": "b"}]
+        shard_keys = [shard_key for _, shard_key in iter_shard_keys(rows)]
+
+        self.assertEqual(shard_keys, ["#0", "b"])
+
+    def test_rows_referencing_several_shards_are_rejected(self):
+        rows = get_rows(2) + [{"entity": "product_image", "product_id": "@p0",
+                               "other": "@v1"}]
+        with self.assertRaisesRegex(Exception, "#6"):
+            list(iter_shard_keys(rows))
+
+    def test_shards_partition_the_rows(self):
+        rows = get_rows()
+        shards = {}
+        for shard_index in range(2):
+            for process in range(3):
+                shards[shard_index, process] = list(
+                    iter_shard(rows, shard_index, 2, process, 3))
+
+        keys = [row["key"] for shard in shards.values() for row in shard]
+        self.assertEqual(sorted(keys), sorted(row["key"] for row in rows[2:]))
+        for shard in shards.values():
+            products = {row["key"] for row in shard if row["entity"] == "product"}
+            variants = {row["product_id"][1:] for row in shard
+                        if row["entity"] == "product_variant"}
+            self.assertEqual(products, variants)
+        self.assertEqual([row["key"] for row in iter_shared(rows)], ["shirts", "type"])
+
+
+class TestRunShards(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "catalog.jsonl")
+        with open(self.path, "w") as f:
+            for row in get_rows():
+                f.write(json.dumps(row) + "\n")
+        self.journal_path = os.path.join(self.directory, "journal")
+
+    def test_machines_require_a_journal(self):
+        with self.assertRaisesRegex(Exception, "journal"):
+            run_shards(FakeLoader, self.path, processes=1, shard_index=1, shard_count=2)
+
+    def test_shared_rows_are_read_from_the_journal_of_shard_0(self):
+        with self.assertRaisesRegex(Exception, "shirts"):
+            get_shared_ids(self.path, self.journal_path)
+        with self.assertRaisesRegex(Exception, "shirts"):
+            run_shards(FakeLoader, self.path, processes=1, shard_index=1, shard_count=2,
+                       journal_path=self.journal_path)
+
+        stats = run_shards(FakeLoader, self.path, shard_count=2,
+                           journal_path=self.journal_path, shared_only=True)
+        self.assertEqual(stats["created"], 2)
+
+        ids = {}
+        stats = [run_shards(FakeLoader, self.path, processes=2, shard_index=shard_index,
+                            shard_count=2, ids=ids, journal_path=self.journal_path)
+                 for shard_index in (1, 0)]
+        self.assertEqual(stats[0]["skipped"], 0)
+        self.assertEqual(stats[1]["skipped"], 2)
+        self.assertEqual(sum(stat["created"] for stat in stats), 40)
+        self.assertEqual(sum(stat["failed"] for stat in stats), 0)
+        self.assertEqual(len(ids), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fakes import FakeLoader
+
+from saleor_gql_loader.sync import FingerprintIndex, run_sync
+
+ATTRIBUTE_UPDATE_INPUT = (
+    "name", "slug", "removeValues", "addValues", "valueRequired", "isVariantOnly",
+    "visibleInStorefront", "filterableInStorefront", "filterableInDashboard",
+    "storefrontSearchPosition", "availableInGrid",
+)
+
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = FingerprintIndex(os.path.join(self.directory, "fingerprints"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def get_sent(self, loader, name):
+        return [variables for sent_name, variables in loader.sent if sent_name == name]
+
+    def test_changed_attribute_is_updated_with_its_update_input(self):
+        loader = FakeLoader()
+        row = {"entity": "attribute", "key": "color", "name": "color",
+               "inputType": "DROPDOWN", "values": [{"name": "red"}]}
+        ids = {}
+        run_sync(loader, [row], self.index, ids=ids)
+
+        stats = run_sync(loader, [dict(row, name="colour")], self.index)
+
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(stats["failed"], 0)
+        update, = self.get_sent(loader, "attributeUpdate")
+        self.assertEqual(update["id"], ids["color"])
+        self.assertEqual(update["input"], {"name": "colour"})
+        self.assertTrue(set(update["input"]) <= set(ATTRIBUTE_UPDATE_INPUT))
+
+    def test_attribute_value_is_updated_and_deleted_by_its_own_id(self):
+        loader = FakeLoader()
+        attribute = {"entity": "attribute", "key": "color", "name": "color"}
+        value = {"entity": "attribute_value", "key": "red", "attribute_id": "@color",
+                 "name": "red"}
+        ids = {}
+        run_sync(loader, [attribute, value], self.index, ids=ids)
+        self.assertNotEqual(ids["red"], ids["color"])
+
+        stats = run_sync(loader, [attribute, dict(value, name="rouge")], self.index)
+        self.assertEqual(stats["updated"], 1)
+        update, = self.get_sent(loader, "attributeValueUpdate")
+        self.assertEqual(update["id"], ids["red"])
+        self.assertEqual(update["input"], {"name": "rouge"})
+
+        stats = run_sync(loader, [attribute], self.index)
+        self.assertEqual(stats["deleted"], 1)
+        delete, = self.get_sent(loader, "attributeValueBulkDelete")
+        self.assertEqual(delete["ids"], [ids["red"]])
+        self.assertIsNone(self.index.get("red"))
+        self.assertIsNotNone(self.index.get("color"))
+
+    def test_replaced_image_is_uploaded_again_after_a_failed_upload(self):
+        file_path = os.path.join(self.directory, "image.png")
+        with open(file_path, "wb") as f:
+            f.write(b"first")
+        rows = [
+            {"entity": "product_type", "key": "type", "name": "type"},
+            {"entity": "product", "key": "shirt", "product_type_id": "@type"},
+            {"entity": "product_image", "key": "image", "product_id": "@shirt",
+             "file_path": file_path},
+        ]
+        run_sync(FakeLoader(), rows, self.index)
+        with open(file_path, "wb") as f:
+            f.write(b"second")
+
+        stats = run_sync(FakeLoader(fail=["productImageCreate"]), rows, self.index)
+        self.assertEqual(stats["failed"], 1)
+        self.assertIsNone(self.index.get("image"))
+
+        loader = FakeLoader()
+        stats = run_sync(loader, rows, self.index)
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(len(self.get_sent(loader, "productImageCreate")), 1)
+        self.assertEqual(self.get_sent(loader, "productImageBulkDelete"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()